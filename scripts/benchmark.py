@@ -0,0 +1,328 @@
+import contextlib
+import functools
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from deepseek_fin_qa.answering import process_data
+from deepseek_fin_qa.log import LOG, setup_logger
+from deepseek_fin_qa.models.base import ReasoningOutputParser
+from deepseek_fin_qa.schemas.qa import Answer, FinQADataset
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.cache import open_cache
+from deepseek_fin_qa.utils.evaluation import (
+    compile_program,
+    evaluate_program,
+    get_execution_match,
+    list_to_markdown_table,
+)
+from deepseek_fin_qa.utils.records import iter_answered_records
+from deepseek_fin_qa.utils.scoring import tally_records, tally_scores
+
+OPERATIONS = ["add", "subtract", "multiply", "divide"]
+
+
+@dataclass
+class BenchmarkResult:
+    """Best time of a benchmark over several rounds.
+
+    `peak_bytes` is the peak memory allocated by a single call, when measured.
+    """
+
+    items: int
+    seconds: float
+    peak_bytes: int | None = None
+
+    @property
+    def per_second(self) -> float:
+        """Return the throughput in items per second."""
+        return self.items / self.seconds if self.seconds else float("inf")
+
+
+def random_program(rng: random.Random, depth: int) -> str:
+    """Return a random nested program of the four arithmetic operations."""
+    if depth == 0:
+        return f"{rng.uniform(1, 10000):.2f}"
+    left = random_program(rng, rng.randrange(depth))
+    right = random_program(rng, rng.randrange(depth))
+    return f"{rng.choice(OPERATIONS)}({left}, {right})"
+
+
+def make_raw_dataset(n_questions: int, turns: int = 4, seed: int = 0) -> list[dict]:
+    """Create a synthetic dataset in the ConvFinQA format.
+
+    Every document has a few paragraphs of text, a 6x5 table and `turns`
+    questions with nested programs, like the real data.
+    """
+    rng = random.Random(seed)  # noqa: S311
+    records = []
+    for i in range(-(-n_questions // turns)):
+        record = {
+            "id": f"doc-{i}",
+            "pre_text": [
+                f"In {2010 + j} revenue grew by {rng.uniform(1, 20):.1f}% to "
+                f"${rng.uniform(100, 9000):.1f} million." * 4
+                for j in range(3)
+            ],
+            "post_text": ["All amounts are in millions of dollars."],
+            "table_ori": [["", "2019", "2020", "2021", "2022"]]
+            + [
+                [f"item {row}"] + [f"{rng.uniform(-500, 5000):.1f}" for _ in range(4)]
+                for row in range(5)
+            ],
+        }
+        for turn in range(min(turns, n_questions - i * turns)):
+            program = random_program(rng, rng.randrange(1, 4))
+            output = evaluate_program(program)
+            record[f"qa_{turn}"] = {
+                "question": f"What is the change in item {turn} in 2021?",
+                "answer": f"{output:.2f}" if isinstance(output, float) else output,
+                "program_re": program,
+            }
+        records.append(record)
+    return records
+
+
+def make_responses(raw: list[dict]) -> list[str]:
+    """Create a reasoning model response for every question."""
+    return [
+        "<think>\nLet me compute this step by step. "
+        * 20
+        + f'\n</think>\n```json\n{{"value": "{qa["answer"]}", '
+        f'"program": "{qa["program_re"]}"}}\n```'
+        for record in raw
+        for key, qa in record.items()
+        if key.startswith("qa")
+    ]
+
+
+@contextlib.contextmanager
+def fake_backend(path: Path) -> Iterator[None]:
+    """Answer with the zero-latency fake model and a cache inside `path`."""
+    cwd, backend = Path.cwd(), settings.backend
+    os.chdir(path)
+    settings.backend = "fake"
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+        settings.backend = backend
+
+
+def measure(
+    func: Callable[[], object],
+    items: int,
+    rounds: int,
+    setup: Callable[[], object] | None = None,
+    min_seconds: float = 0.2,
+) -> BenchmarkResult:
+    """Return the best time of running `func` over several rounds.
+
+    Short benchmarks are repeated within every round until they take at least
+    `min_seconds`, so that timer noise does not trigger false regressions.
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        repeats = elapsed = 0
+        while repeats == 0 or elapsed < min_seconds:
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            elapsed += time.perf_counter() - start
+            repeats += 1
+        best = min(best, elapsed / repeats)
+    return BenchmarkResult(items=items, seconds=best)
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """Return the peak memory allocated while running `func`, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(
+    n_questions: int, tmp_dir: Path, rounds: int = 3
+) -> dict[str, BenchmarkResult]:
+    """Run every benchmark on a synthetic dataset with `n_questions` questions.
+
+    Args:
+        n_questions (int): Number of questions in the dataset.
+        tmp_dir (Path): Directory for the dataset, cache and output files.
+        rounds (int, optional): Number of rounds, the best one is kept.
+            Defaults to 3.
+
+    Returns:
+        dict[str, BenchmarkResult]: The results per benchmark.
+
+    """
+    raw = make_raw_dataset(n_questions)
+    src = tmp_dir / "dataset.json"
+    src.write_text(json.dumps(raw))
+
+    qas = [qa for record in raw for key, qa in record.items() if key.startswith("qa")]
+    programs = [qa["program_re"] for qa in qas]
+    answers = [qa["answer"] for qa in qas]
+    responses = make_responses(raw)
+    tables = [record["table_ori"] for record in raw]
+    parser = ReasoningOutputParser(Answer)
+    n = len(qas)
+
+    cache = open_cache(tmp_dir / "cache" / "model", "sqlite")
+    queries = [f"query-{i}" for i in range(n)]
+
+    results = {
+        "evaluate_program": measure(
+            lambda: [evaluate_program(program) for program in programs],
+            n,
+            rounds,
+            setup=compile_program.cache_clear,
+        ),
+        "get_execution_match": measure(
+            lambda: [get_execution_match(answer, answer) for answer in answers],
+            n,
+            rounds,
+        ),
+        "parse": measure(
+            lambda: [parser.parse(response) for response in responses], n, rounds
+        ),
+        "list_to_markdown_table": measure(
+            lambda: [list_to_markdown_table(table) for table in tables],
+            len(tables),
+            rounds,
+        ),
+        "from_file": measure(lambda: FinQADataset.from_file(str(src)), n, rounds),
+        "cache_set": measure(
+            lambda: [cache.set(query, query) for query in queries], n, rounds
+        ),
+        "cache_get": measure(
+            lambda: [cache.get(query) for query in queries], n, rounds
+        ),
+    }
+    cache.close()
+
+    run_dir = tmp_dir / "process_data"
+    run_dir.mkdir()
+    output = run_dir / "output.jsonl"
+    with fake_backend(run_dir):
+        results["process_data"] = measure(
+            lambda: process_data(str(src), str(output)), n, 1, min_seconds=0
+        )
+
+    # Loading and scoring the answers as pydantic models and as plain records
+    def load_models() -> list:
+        return list(FinQADataset.iter_answered(str(output)))
+
+    def load_records() -> list:
+        return list(iter_answered_records(output))
+
+    for name, load, tally in [
+        ("models", load_models, tally_scores),
+        ("records", load_records, tally_records),
+    ]:
+        results[f"load_answered_{name}"] = measure(load, n, rounds)
+        results[f"load_answered_{name}"].peak_bytes = peak_memory(load)
+        loaded = load()
+        results[f"tally_{name}"] = measure(functools.partial(tally, loaded), n, rounds)
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, BenchmarkResult]],
+    baseline: dict[str, dict[str, dict]],
+    threshold: float,
+) -> list[str]:
+    """Return the benchmarks that are slower than the baseline by `threshold`."""
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            if (previous := baseline.get(size, {}).get(name)) is None:
+                continue
+            expected = BenchmarkResult(**previous).per_second
+            if result.per_second < expected * (1 - threshold):
+                regressions.append(
+                    f"{name} at {size} questions: {result.per_second:,.0f}/s, "
+                    f"baseline {expected:,.0f}/s"
+                )
+    return regressions
+
+
+def benchmark(
+    questions: Annotated[
+        list[int] | None, typer.Option(help="Dataset sizes in questions.")
+    ] = None,
+    rounds: Annotated[int, typer.Option(help="Rounds per benchmark.")] = 3,
+    out: Annotated[
+        str | None, typer.Option(help="Path to write the results to.")
+    ] = None,
+    baseline: Annotated[
+        str | None, typer.Option(help="Results to compare against.")
+    ] = None,
+    threshold: Annotated[
+        float, typer.Option(help="Allowed throughput drop against the baseline.")
+    ] = 0.2,
+) -> None:
+    """Benchmark the evaluation, parsing, loading and caching hot paths.
+
+    Args:
+        questions (list[int] | None): Dataset sizes in questions, defaults to
+            1k, 10k and 100k.
+        rounds (int): Number of rounds per benchmark, the best one is kept.
+        out (str | None): Path to write the results to as JSON.
+        baseline (str | None): Results of a previous run to compare against.
+        threshold (float): Allowed relative throughput drop, larger drops fail.
+
+    """
+    results = {}
+    for n_questions in questions or [1_000, 10_000, 100_000]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results[str(n_questions)] = run_benchmarks(
+                n_questions, Path(tmp_dir), rounds
+            )
+        for name, result in results[str(n_questions)].items():
+            memory = (
+                f", peak {result.peak_bytes / 2**20:,.1f} MB"
+                if result.peak_bytes is not None
+                else ""
+            )
+            LOG.info(
+                f"{n_questions} questions, {name}: {result.per_second:,.0f}/s "
+                f"({result.seconds:.3f}s{memory})"
+            )
+
+    if out:
+        with Path(out).open("w") as f:
+            json.dump(
+                {
+                    size: {name: asdict(result) for name, result in benchmarks.items()}
+                    for size, benchmarks in results.items()
+                },
+                f,
+                indent=2,
+            )
+
+    if baseline:
+        with Path(baseline).open() as f:
+            regressions = find_regressions(results, json.load(f), threshold)
+        for regression in regressions:
+            LOG.error(f"Regression: {regression}")
+        if regressions:
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    setup_logger()
+    typer.run(benchmark)
@@ -0,0 +1,50 @@
+from typing import Annotated
+
+import typer
+
+from deepseek_fin_qa.log import LOG, setup_logger
+from deepseek_fin_qa.schemas.qa import FinQA, FinQADataset
+from deepseek_fin_qa.utils.evaluation import TABLE_FORMATS
+from deepseek_fin_qa.utils.tokens import count_tokens
+
+
+def count_context_tokens(fin_qas: list[FinQA]) -> dict[str, int]:
+    """Return the estimated tokens of the contexts in every table format."""
+    return {
+        table_format: sum(
+            count_tokens(fin_qa.render_context(table_format)) for fin_qa in fin_qas
+        )
+        for table_format in TABLE_FORMATS
+    }
+
+
+def context_tokens(
+    src: str,
+    limit: Annotated[
+        int | None, typer.Option(help="Maximum number of documents to count.")
+    ] = None,
+) -> None:
+    """Compare the context tokens of a dataset for every table format.
+
+    Args:
+        src (str): Path to the dataset file.
+        limit (int | None): Maximum number of documents to count.
+
+    """
+    fin_qas = list(FinQADataset.iter_file(src, limit=limit))
+    if not fin_qas:
+        LOG.warning("No documents to count.")
+        return
+
+    tokens = count_context_tokens(fin_qas)
+    for table_format, n_tokens in tokens.items():
+        LOG.info(
+            f"{table_format}: {n_tokens} tokens, "
+            f"{n_tokens / len(fin_qas):.0f} per document, "
+            f"{n_tokens / tokens['markdown'] - 1:+.1%} against markdown"
+        )
+
+
+if __name__ == "__main__":
+    setup_logger()
+    typer.run(context_tokens)
@@ -0,0 +1,181 @@
+import multiprocessing
+import time
+from pathlib import Path
+from typing import Annotated
+
+import tqdm
+import typer
+
+from deepseek_fin_qa.answering import (
+    aanswer_dataset,
+    answer_dataset,
+    log_summary,
+    parse_shard,
+    score_output,
+)
+from deepseek_fin_qa.log import LOG, setup_logger
+from deepseek_fin_qa.models import MODEL_BACKENDS
+from deepseek_fin_qa.schemas.qa import FinQADataset
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.concurrency import iterate_async
+from deepseek_fin_qa.utils.io import JSONLWriter
+from deepseek_fin_qa.utils.workqueue import WorkQueue
+
+# Seconds between checks of the progress of the workers
+POLL_INTERVAL = 1.0
+
+# Runs a task with failed documents is attempted in, the last attempt completes
+# it without the failed documents
+MAX_TASK_ATTEMPTS = 3
+
+
+def run_worker(
+    work_dir: str, base_url: str, backend: str, model_name: str, concurrency: int
+) -> None:
+    """Answer tasks from the queue with a model at the base URL until none is left.
+
+    Runs in its own process, the backend and model are passed explicitly as the
+    settings of the coordinator may have been changed after they were loaded.
+    """
+    setup_logger()
+    settings.base_url = base_url
+    model = MODEL_BACKENDS[backend](model_name=model_name)
+    queue = WorkQueue(work_dir)
+
+    while (task := queue.claim()) is not None:
+        LOG.debug(f"Worker for {base_url} claimed task {task}")
+        fin_qas = list(queue.read(task))
+        if concurrency > 1:
+            results = iterate_async(aanswer_dataset(model, fin_qas, concurrency))
+        else:
+            results = answer_dataset(model, fin_qas)
+
+        failed = []
+        with queue.writer(task) as writer:
+            for fin_qa, answered in zip(fin_qas, results, strict=True):
+                if answered is None:
+                    failed.append(fin_qa.id)
+                else:
+                    writer.write(answered)
+        if failed and queue.attempts(task) + 1 < MAX_TASK_ATTEMPTS:
+            # Left claimed, so the next run requeues the whole task
+            LOG.warning(f"{len(failed)} documents of task {task} failed, leaving it.")
+            queue.abandon(task)
+            continue
+        if failed:
+            LOG.warning(
+                f"Dropping the failed documents {failed} of task {task} after "
+                f"{MAX_TASK_ATTEMPTS} attempts."
+            )
+        queue.complete(task)
+
+    LOG.info(f"Worker for {base_url} finished.")
+    log_summary(model)
+
+
+def merge(queue: WorkQueue, out: str) -> None:
+    """Merge the answers of the completed tasks into one output file."""
+    if Path(out).suffix == ".jsonl":
+        with JSONLWriter(out) as writer:
+            for fin_qa in queue.iter_answered():
+                writer.write(fin_qa)
+        return
+
+    answered_dataset = FinQADataset(finqa_list=list(queue.iter_answered()))
+    with Path(out).open("w") as f:
+        f.write(answered_dataset.model_dump_json())
+
+
+def distribute(  # noqa: PLR0913
+    src: str,
+    out: str,
+    *,
+    base_url: Annotated[
+        list[str],
+        typer.Option(help="Base URL of a worker, repeat a URL for more workers."),
+    ],
+    work_dir: Annotated[
+        str | None,
+        typer.Option(help="Directory of the task queue, defaults to <out>.queue."),
+    ] = None,
+    task_size: Annotated[int, typer.Option(help="Number of documents per task.")] = 8,
+    concurrency: Annotated[
+        int, typer.Option(help="Documents answered concurrently by every worker.")
+    ] = 1,
+    limit: Annotated[
+        int | None, typer.Option(help="Maximum number of documents to answer.")
+    ] = None,
+    offset: Annotated[int, typer.Option(help="Number of documents to skip.")] = 0,
+    shard: Annotated[
+        str | None, typer.Option(help="Only answer shard i of n, given as i/n.")
+    ] = None,
+) -> None:
+    """Answer a dataset with worker processes, each bound to its own model server.
+
+    The documents are split into small tasks in a queue on disk. Every worker
+    takes the next task as soon as it is done with the previous one, so faster
+    servers answer more documents. An interrupted run is resumed by running the
+    same command again, the finished tasks are kept in the queue directory.
+
+    Args:
+        src (str): Path to the dataset file.
+        out (str): Path to the merged output file, .json or .jsonl.
+        base_url (list[str]): Base URLs of the model servers, one worker each.
+        work_dir (str | None): Directory of the task queue.
+        task_size (int): Number of documents per task.
+        concurrency (int): Number of documents answered concurrently by every
+            worker. Values above 1 use the async chat API of the model.
+        limit (int | None): Maximum number of documents to answer.
+        offset (int): Number of documents to skip.
+        shard (str | None): Only answer every n-th document starting at i,
+            given as "i/n".
+
+    """
+    queue = WorkQueue(work_dir or f"{out}.queue")
+    if queue.exists():
+        requeued = queue.requeue_claimed()
+        LOG.info(
+            f"Resuming, {len(queue.completed())} tasks done, "
+            f"{queue.remaining()} left of which {requeued} were requeued."
+        )
+    else:
+        dataset = FinQADataset.iter_file(
+            src, limit=limit, offset=offset, shard=parse_shard(shard) if shard else None
+        )
+        LOG.info(f"Created {queue.create(dataset, task_size)} tasks.")
+
+    # Spawn fresh workers, forking a process with running threads is not safe
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=run_worker,
+            args=(str(queue.path), url, settings.backend, settings.model, concurrency),
+        )
+        for url in base_url
+    ]
+    for worker in workers:
+        worker.start()
+
+    with tqdm.tqdm(total=len(queue.completed()) + queue.remaining()) as progress:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(POLL_INTERVAL)
+            progress.update(len(queue.completed()) - progress.n)
+        progress.update(len(queue.completed()) - progress.n)
+
+    for url, worker in zip(base_url, workers, strict=True):
+        worker.join()
+        if worker.exitcode:
+            LOG.error(f"Worker for {url} failed with exit code {worker.exitcode}.")
+    if remaining := queue.remaining():
+        LOG.warning(
+            f"{remaining} tasks were not finished, run again to resume them. "
+            "Merging the finished tasks."
+        )
+
+    merge(queue, out)
+    LOG.info(f"Score: {score_output(out)}")
+
+
+if __name__ == "__main__":
+    setup_logger()
+    typer.run(distribute)
@@ -0,0 +1,48 @@
+from typing import Annotated
+
+import typer
+
+from deepseek_fin_qa.log import LOG, setup_logger
+from deepseek_fin_qa.models import MODEL_BACKENDS
+from deepseek_fin_qa.schemas.qa import FinQADataset
+from deepseek_fin_qa.settings import settings
+
+
+def rekey_cache(
+    src: str,
+    cache: Annotated[str, typer.Option(help="The cache directory.")] = ".cache",
+    context_mode: Annotated[
+        str | None, typer.Option(help="Context mode the cache was created with.")
+    ] = None,
+) -> None:
+    """Move the cached responses of a dataset to the canonical cache keys.
+
+    The cached conversations of every document are replayed with the current
+    prompts, so it should be run before the prompts change. Responses that are not
+    re-keyed are only moved on their first lookup with `CACHE_LEGACY_LOOKUP`.
+
+    Args:
+        src (str): Path to the dataset the cache was created for.
+        cache (str): The cache directory.
+        context_mode (str | None): Context mode the cache was created with,
+            defaults to the `CONTEXT_MODE` setting.
+
+    """
+    model = MODEL_BACKENDS[settings.backend](model_name=settings.model, cache=cache)
+    if context_mode is not None:
+        if context_mode not in {"every_turn", "once"}:
+            msg = f"Invalid context mode {context_mode!r}."
+            raise typer.BadParameter(msg)
+        model.context_mode = context_mode
+
+    turns = found = 0
+    for fin_qa in FinQADataset.iter_file(src):
+        turns += len(fin_qa)
+        found += model.replay_cached(fin_qa)
+
+    LOG.info(f"Found {found} of {turns} turns in the cache of {model.model_name}.")
+
+
+if __name__ == "__main__":
+    setup_logger()
+    typer.run(rekey_cache)
@@ -0,0 +1,103 @@
+import json
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from deepseek_fin_qa.log import LOG, setup_logger
+from deepseek_fin_qa.utils.io import split_file
+from deepseek_fin_qa.utils.records import iter_answered_records
+from deepseek_fin_qa.utils.scoring import ScoreTally, tally_records
+
+type ScoreTask = tuple[str, int, int | None]
+
+
+def score_task(task: ScoreTask) -> tuple[str, ScoreTally]:
+    """Score a whole output file or a byte range of a JSONL output file."""
+    path, start, end = task
+    return path, tally_records(iter_answered_records(path, start, end))
+
+
+def score_files(
+    paths: list[str], workers: int | None = None, chunk_size: int = 1 << 23
+) -> dict[str, ScoreTally]:
+    """Rescore answered output files in parallel.
+
+    JSONL files are split into byte ranges, so that a single large file is also
+    scored on all cores.
+
+    Args:
+        paths (list[str]): Paths to the output files of `process_data`.
+        workers (int | None, optional): Number of worker processes. Defaults to
+            the number of CPUs.
+        chunk_size (int, optional): Size of the JSONL byte ranges. Defaults to 8 MB.
+
+    Returns:
+        dict[str, ScoreTally]: The score tallies per file.
+
+    """
+    tasks: list[ScoreTask] = []
+    for path in paths:
+        if Path(path).suffix == ".jsonl":
+            tasks.extend(
+                (path, start, end) for start, end in split_file(path, chunk_size)
+            )
+        else:
+            tasks.append((path, 0, None))
+
+    tallies: defaultdict[str, ScoreTally] = defaultdict(ScoreTally)
+    # Spawn fresh workers, forking a process with running threads is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        for path, tally in pool.map(score_task, tasks):
+            tallies[path].update(tally)
+
+    return {path: tallies[path] for path in paths}
+
+
+def score(
+    paths: list[str],
+    out: Annotated[
+        str | None, typer.Option(help="Path to write the JSON score report to.")
+    ] = None,
+    workers: Annotated[
+        int | None, typer.Option(help="Number of worker processes.")
+    ] = None,
+) -> None:
+    """Rescore answered datasets without running any model.
+
+    Args:
+        paths (list[str]): Paths to the output files of `process_data`.
+        out (str | None): Path to write the JSON score report to.
+        workers (int | None): Number of worker processes, defaults to all CPUs.
+
+    """
+    tallies = score_files(paths, workers)
+
+    total = ScoreTally()
+    for path, tally in tallies.items():
+        total.update(tally)
+        LOG.info(f"{path}: {tally.total.accuracy} (n={tally.total.n})")
+        for turn, turn_tally in sorted(tally.turns.items()):
+            LOG.info(f"  turn {turn}: {turn_tally.accuracy} (n={turn_tally.n})")
+
+    if len(tallies) > 1:
+        LOG.info(f"Total: {total.total.accuracy} (n={total.total.n})")
+
+    if out:
+        report = {
+            "files": {
+                path: tally.report.model_dump() for path, tally in tallies.items()
+            },
+            "total": total.report.model_dump(exclude={"documents"}),
+        }
+        with Path(out).open("w") as f:
+            json.dump(report, f)
+
+
+if __name__ == "__main__":
+    setup_logger()
+    typer.run(score)
@@ -0,0 +1,494 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import re
+import time
+import typing
+from collections import defaultdict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, Any
+
+import tqdm
+import typer
+
+from deepseek_fin_qa.log import LOG, setup_logger
+from deepseek_fin_qa.models import MODEL_BACKENDS
+from deepseek_fin_qa.schemas.metrics import Accuracy
+from deepseek_fin_qa.schemas.qa import FinQA, FinQADataset
+from deepseek_fin_qa.settings import Settings, settings
+from deepseek_fin_qa.utils.concurrency import REQUEST_WINDOW, ordered_map
+from deepseek_fin_qa.utils.io import JSONLWriter
+from deepseek_fin_qa.utils.scoring import score_batch
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.models.base import BaseModelWrapper
+    from deepseek_fin_qa.utils.ratelimit import RateLimiter
+
+# Backends that keep one model loaded at a time, runs of different models are not
+# interleaved on them, as every switch would reload the model
+MODEL_SWITCHING_BACKENDS = {"ollama"}
+
+# Concurrent requests per backend when not given
+DEFAULT_CONCURRENCY = 4
+
+VARIANTS = typing.get_args(Settings.model_fields["context_mode"].annotation)
+TABLE_FORMATS = typing.get_args(Settings.model_fields["table_format"].annotation)
+PROMPT_ORDERS = typing.get_args(Settings.model_fields["prompt_order"].annotation)
+
+
+@dataclass(frozen=True)
+class SweepRun:
+    """A single run of a sweep: a model of a backend with a prompt variant."""
+
+    backend: str
+    model: str
+    variant: str
+    table_format: str = "markdown"
+    samples: int = 1
+    prompt_order: str = "question_first"
+
+    @property
+    def name(self) -> str:
+        """Return a name of the run that is safe to use in file names."""
+        name = f"{self.backend}-{self.model}-{self.variant}-{self.table_format}"
+        if self.samples > 1:
+            name += f"-n{self.samples}"
+        if self.prompt_order != "question_first":
+            name += f"-{self.prompt_order}"
+        return re.sub(r"[^\w.-]+", "-", name)
+
+
+@dataclass
+class SweepResult:
+    """Accuracy, latency and token usage of a finished run."""
+
+    run: SweepRun
+    accuracy: Accuracy
+    questions: int
+    answered: int
+    correct: int
+    seconds: float
+    metrics: dict[str, Any]
+    cost: float | None = None
+
+    @property
+    def correct_per_minute(self) -> float:
+        """Return the correct answers per minute of wall time."""
+        return self.correct / self.seconds * 60 if self.seconds else 0.0
+
+    @property
+    def tokens(self) -> int:
+        """Return the prompt and completion tokens of the chat requests."""
+        return self.metrics["prompt_tokens"] + self.metrics["completion_tokens"]
+
+    def row(self) -> list[str]:
+        """Return the row of the run in the comparison table."""
+        latency = self.metrics["latency_quantiles"]
+        return [
+            self.run.backend,
+            self.run.model,
+            self.run.variant,
+            self.run.table_format,
+            self.run.prompt_order,
+            str(self.run.samples),
+            f"{self.accuracy.execution:.2%}",
+            f"{self.accuracy.program:.2%}",
+            f"{self.answered}/{self.questions}",
+            f"{latency['0.5']:.1f}s",
+            f"{latency['0.9']:.1f}s",
+            f"{self.seconds:.0f}s",
+            f"{self.tokens:,}",
+            f"{self.tokens / self.correct:,.0f}" if self.correct else "-",
+            f"{self.correct_per_minute:.1f}",
+            f"${self.cost:.4f}" if self.cost is not None else "-",
+        ]
+
+
+TABLE_HEADER = [
+    "Backend",
+    "Model",
+    "Variant",
+    "Table",
+    "Prompt",
+    "Samples",
+    "Exe Acc",
+    "Prog Acc",
+    "Answered",
+    "Median latency",
+    "p90 latency",
+    "Wall time",
+    "Tokens",
+    "Tokens per correct",
+    "Correct per minute",
+    "Cost",
+]
+
+
+def parse_assignments(values: list[str] | None, option: str) -> dict[str, str]:
+    """Parse options given as "key=value" into a dictionary."""
+    assignments = {}
+    for value in values or []:
+        key, sep, assigned = value.partition("=")
+        if not sep or not key:
+            msg = f"Invalid {option} {value!r}, expected key=value."
+            raise typer.BadParameter(msg)
+        assignments[key] = assigned
+    return assignments
+
+
+def parse_runs(
+    models: list[str],
+    variants: list[str] | None,
+    table_formats: list[str] | None = None,
+    samples: list[int] | None = None,
+    prompt_orders: list[str] | None = None,
+) -> list[SweepRun]:
+    """Return the runs of the matrix of models and prompt settings."""
+    runs = []
+    for model in models:
+        backend, sep, model_name = model.partition(":")
+        if not sep or backend not in MODEL_BACKENDS:
+            msg = (
+                f"Invalid model {model!r}, expected one of {list(MODEL_BACKENDS)}:name."
+            )
+            raise typer.BadParameter(msg)
+        for variant, table_format, n_samples, prompt_order in itertools.product(
+            variants or [settings.context_mode],
+            table_formats or [settings.table_format],
+            samples or [settings.samples],
+            prompt_orders or [settings.prompt_order],
+        ):
+            if variant not in VARIANTS:
+                msg = f"Invalid variant {variant!r}, expected one of {VARIANTS}."
+                raise typer.BadParameter(msg)
+            if table_format not in TABLE_FORMATS:
+                msg = (
+                    f"Invalid table format {table_format!r}, "
+                    f"expected one of {TABLE_FORMATS}."
+                )
+                raise typer.BadParameter(msg)
+            if n_samples < 1:
+                msg = f"Invalid number of samples {n_samples}, expected at least 1."
+                raise typer.BadParameter(msg)
+            if prompt_order not in PROMPT_ORDERS:
+                msg = (
+                    f"Invalid prompt order {prompt_order!r}, "
+                    f"expected one of {PROMPT_ORDERS}."
+                )
+                raise typer.BadParameter(msg)
+            runs.append(
+                SweepRun(
+                    backend, model_name, variant, table_format, n_samples, prompt_order
+                )
+            )
+    return runs
+
+
+def parse_price(price: str) -> tuple[float, float]:
+    """Parse a price given as "input/output" in dollars per million tokens."""
+    try:
+        prompt, completion = map(float, price.split("/"))
+    except ValueError:
+        msg = f"Invalid price {price!r}, expected input/output."
+        raise typer.BadParameter(msg) from None
+    return prompt, completion
+
+
+@contextlib.contextmanager
+def override_settings(**values: Any) -> Iterator[None]:  # noqa: ANN401
+    """Temporarily override settings, e.g. while a model is created."""
+    previous = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+def create_model(run: SweepRun, base_urls: dict[str, str]) -> "BaseModelWrapper":
+    """Create the model of a run, with the base URL of its backend."""
+    with override_settings(
+        backend=run.backend,
+        model=run.model,
+        base_url=base_urls.get(run.backend, settings.base_url),
+        samples=run.samples,
+    ):
+        model = MODEL_BACKENDS[run.backend](model_name=run.model)
+    model.context_mode = run.variant
+    model.table_format = run.table_format
+    model.prompt_order = run.prompt_order
+    return model
+
+
+async def answer_run(  # noqa: PLR0913
+    model: "BaseModelWrapper",
+    dataset: list[FinQA],
+    semaphore: asyncio.Semaphore,
+    concurrency: int,
+    *,
+    out: Path,
+    progress: tqdm.tqdm,
+) -> tuple[list[FinQA], float]:
+    """Answer the shared dataset with a model, within the limit of its backend.
+
+    The shared documents are not modified, the answers are attached to copies.
+    """
+
+    async def answer(fin_qa: FinQA) -> FinQA | None:
+        async with semaphore:
+            try:
+                answers = await model.aanswer_questions(fin_qa)
+            except Exception as ex:  # noqa: BLE001
+                LOG.warning(ex)
+                return None
+            finally:
+                progress.update()
+        return fin_qa.model_copy(
+            update={
+                "qa_list": [
+                    qa.model_copy(update={"llm_answer": answer})
+                    for qa, answer in zip(fin_qa, answers, strict=False)
+                ]
+            }
+        )
+
+    start = time.perf_counter()
+    answered = []
+    with JSONLWriter(out) as writer:
+        async for fin_qa in ordered_map(
+            answer,
+            dataset,
+            concurrency,
+            window=max(REQUEST_WINDOW, concurrency),
+            order=model.request_order,
+        ):
+            if fin_qa is not None:
+                writer.write(fin_qa)
+                answered.append(fin_qa)
+    return answered, time.perf_counter() - start
+
+
+async def run_sweep(
+    runs: list[SweepRun],
+    dataset: list[FinQA],
+    out_dir: Path,
+    concurrency: dict[str, int],
+    base_urls: dict[str, str] | None = None,
+) -> list[SweepResult]:
+    """Answer the dataset with every run of a sweep concurrently.
+
+    Every backend has its own limit of concurrent requests, shared by all of its
+    runs. Runs of different models on a backend that keeps one model loaded are
+    done one after another.
+
+    Args:
+        runs (list[SweepRun]): The runs of the sweep.
+        dataset (list[FinQA]): The dataset, shared by all runs.
+        out_dir (Path): Directory for the answers and metrics of every run.
+        concurrency (dict[str, int]): Concurrent requests per backend.
+        base_urls (dict[str, str] | None, optional): Base URLs per backend.
+            Defaults to the base URL of the settings.
+
+    Returns:
+        list[SweepResult]: The results in the order of the runs.
+
+    """
+    limits = {
+        run.backend: concurrency.get(run.backend, DEFAULT_CONCURRENCY) for run in runs
+    }
+    semaphores = {
+        backend: asyncio.Semaphore(limit) for backend, limit in limits.items()
+    }
+    rate_limiters: dict[tuple[str, str], RateLimiter] = {}
+    n_questions = sum(len(fin_qa) for fin_qa in dataset)
+    results: dict[SweepRun, SweepResult] = {}
+    progress = tqdm.tqdm(total=len(runs) * len(dataset))
+
+    async def run_one(run: SweepRun) -> None:
+        model = create_model(run, base_urls or {})
+        if (limiter := getattr(model, "limiter", None)) is not None:
+            # The rate limits apply to the model, whatever the prompt variant
+            model.limiter = rate_limiters.setdefault((run.backend, run.model), limiter)
+        answered, seconds = await answer_run(
+            model,
+            dataset,
+            semaphores[run.backend],
+            limits[run.backend],
+            out=out_dir / f"{run.name}.jsonl",
+            progress=progress,
+        )
+        model.metrics.write(out_dir / f"{run.name}.metrics.json")
+        scores = score_batch([qa for fin_qa in answered for qa in fin_qa])
+        results[run] = SweepResult(
+            run=run,
+            accuracy=scores.accuracy,
+            questions=n_questions,
+            answered=int(scores.answered.sum()),
+            correct=int(scores.execution[scores.answered].sum()),
+            seconds=seconds,
+            metrics=model.metrics.summary(),
+        )
+        LOG.info(f"{run.name}: {results[run].accuracy}")
+
+    async def run_models(backend: str, models: dict[str, list[SweepRun]]) -> None:
+        if backend in MODEL_SWITCHING_BACKENDS:
+            for group in models.values():
+                await asyncio.gather(*map(run_one, group))
+        else:
+            await asyncio.gather(
+                *(asyncio.gather(*map(run_one, group)) for group in models.values())
+            )
+
+    by_backend: defaultdict[str, dict[str, list[SweepRun]]] = defaultdict(dict)
+    for run in runs:
+        by_backend[run.backend].setdefault(run.model, []).append(run)
+    try:
+        await asyncio.gather(*(run_models(*item) for item in by_backend.items()))
+    finally:
+        progress.close()
+    return [results[run] for run in runs]
+
+
+def format_table(results: list[SweepResult]) -> str:
+    """Return the comparison of the runs as a Markdown table."""
+    rows = [TABLE_HEADER, ["---"] * len(TABLE_HEADER)]
+    rows += [result.row() for result in results]
+    return "\n".join(f"| {' | '.join(row)} |" for row in rows) + "\n"
+
+
+def sweep(  # noqa: PLR0913
+    src: str,
+    out_dir: str,
+    *,
+    model: Annotated[
+        list[str], typer.Option(help="Model to run, as backend:name. Repeatable.")
+    ],
+    variant: Annotated[
+        list[str] | None,
+        typer.Option(help=f"Prompt variant, one of {VARIANTS}. Repeatable."),
+    ] = None,
+    table_format: Annotated[
+        list[str] | None,
+        typer.Option(help=f"Table format, one of {TABLE_FORMATS}. Repeatable."),
+    ] = None,
+    samples: Annotated[
+        list[int] | None,
+        typer.Option(help="Samples voted on per question. Repeatable."),
+    ] = None,
+    prompt_order: Annotated[
+        list[str] | None,
+        typer.Option(help=f"Prompt order, one of {PROMPT_ORDERS}. Repeatable."),
+    ] = None,
+    concurrency: Annotated[
+        list[str] | None,
+        typer.Option(help="Concurrent requests of a backend, as backend=N."),
+    ] = None,
+    base_url: Annotated[
+        list[str] | None, typer.Option(help="Base URL of a backend, as backend=URL.")
+    ] = None,
+    price: Annotated[
+        list[str] | None,
+        typer.Option(help="Price of a model per million tokens, as name=input/output."),
+    ] = None,
+    limit: Annotated[
+        int | None, typer.Option(help="Maximum number of documents to answer.")
+    ] = None,
+    offset: Annotated[int, typer.Option(help="Number of documents to skip.")] = 0,
+) -> None:
+    """Compare models and prompt variants on the same dataset.
+
+    Every combination of model, variant, table format, number of samples and
+    prompt order is run concurrently on
+    one copy of the dataset. The answers and metrics of every run and a comparison
+    of the accuracy, latency and cost of the runs are written to the output
+    directory.
+
+    Args:
+        src (str): Path to the dataset file.
+        out_dir (str): Directory to write the results to.
+        model (list[str]): Models to run, as "backend:name".
+        variant (list[str] | None): Prompt variants to run every model with,
+            defaults to the configured context mode.
+        table_format (list[str] | None): Table formats of the context to run
+            every model with, defaults to the configured table format.
+        samples (list[int] | None): Numbers of samples to vote on per question to
+            run every model with, defaults to the configured number of samples.
+        prompt_order (list[str] | None): Orders of the question and the context
+            in the prompt to run every model with, defaults to the configured
+            prompt order.
+        concurrency (list[str] | None): Concurrent requests per backend, as
+            "backend=N", defaults to 4.
+        base_url (list[str] | None): Base URLs per backend, as "backend=URL".
+        price (list[str] | None): Prices in dollars per million prompt and
+            completion tokens, as "name=input/output".
+        limit (int | None): Maximum number of documents to answer.
+        offset (int): Number of documents to skip.
+
+    """
+    runs = parse_runs(model, variant, table_format, samples, prompt_order)
+    limits = {
+        backend: int(value)
+        for backend, value in parse_assignments(concurrency, "concurrency").items()
+    }
+    prices = {
+        name: parse_price(value)
+        for name, value in parse_assignments(price, "price").items()
+    }
+
+    dataset = list(FinQADataset.iter_file(src, limit=limit, offset=offset))
+    LOG.info(f"Running {len(runs)} runs on {len(dataset)} documents.")
+
+    path = Path(out_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    results = asyncio.run(
+        run_sweep(runs, dataset, path, limits, parse_assignments(base_url, "base URL"))
+    )
+
+    for result in results:
+        if (model_price := prices.get(result.run.model)) is not None:
+            result.cost = (
+                result.metrics["prompt_tokens"] * model_price[0]
+                + result.metrics["completion_tokens"] * model_price[1]
+            ) / 1e6
+
+    table = format_table(results)
+    (path / "sweep.md").write_text(table)
+    (path / "sweep.json").write_text(
+        json.dumps(
+            [
+                {
+                    "name": result.run.name,
+                    "backend": result.run.backend,
+                    "model": result.run.model,
+                    "variant": result.run.variant,
+                    "table_format": result.run.table_format,
+                    "samples": result.run.samples,
+                    "prompt_order": result.run.prompt_order,
+                    "accuracy": result.accuracy.model_dump(),
+                    "questions": result.questions,
+                    "answered": result.answered,
+                    "correct": result.correct,
+                    "seconds": result.seconds,
+                    "correct_per_minute": result.correct_per_minute,
+                    "tokens_per_correct": (
+                        result.tokens / result.correct if result.correct else None
+                    ),
+                    "cost": result.cost,
+                    "metrics": result.metrics,
+                }
+                for result in results
+            ],
+            indent=2,
+        )
+    )
+    LOG.info(f"Comparison:\n{table}")
+
+
+if __name__ == "__main__":
+    setup_logger()
+    typer.run(sweep)
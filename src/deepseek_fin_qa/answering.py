@@ -0,0 +1,269 @@
+import itertools
+from collections.abc import AsyncIterator, Iterable, Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated
+
+import tqdm
+import typer
+
+from deepseek_fin_qa.log import LOG
+from deepseek_fin_qa.models import MODEL_BACKENDS
+from deepseek_fin_qa.schemas.qa import Answer, FinQA, FinQADataset
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.concurrency import (
+    REQUEST_WINDOW,
+    iterate_async,
+    ordered_map,
+)
+from deepseek_fin_qa.utils.io import JSONLWriter, iter_jsonl
+from deepseek_fin_qa.utils.records import iter_answered_records
+from deepseek_fin_qa.utils.results import Results
+from deepseek_fin_qa.utils.scoring import tally_records
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.models.base import BaseModelWrapper
+    from deepseek_fin_qa.schemas.metrics import Accuracy
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parse a shard given as "i/n" into a tuple of index and count."""
+    try:
+        index, count = map(int, shard.split("/"))
+    except ValueError:
+        msg = f"Invalid shard {shard!r}, expected i/n."
+        raise typer.BadParameter(msg) from None
+
+    if not 0 <= index < count:
+        msg = f"Invalid shard {shard!r}, expected 0 <= i < n."
+        raise typer.BadParameter(msg)
+    return index, count
+
+
+def score_output(path: str) -> "Accuracy":
+    """Score an answered output file as records, without loading the documents."""
+    return tally_records(iter_answered_records(path)).total.accuracy
+
+
+def set_answers(fin_qa: FinQA, answers: list[Answer | None]) -> None:
+    """Attach the LLM answers to the questions of a FinQA document."""
+    for qa, answer in zip(fin_qa, answers, strict=False):
+        LOG.debug(f"Question: {qa.question}")
+        LOG.debug(f"Target answer: {qa.target_answer}")
+        LOG.debug(f"LLM answer: {answer}")
+        qa.llm_answer = answer
+        LOG.debug(f"Match: {qa.score}")
+
+
+def answer_fin_qa(model: "BaseModelWrapper", fin_qa: FinQA) -> FinQA | None:
+    """Answer a FinQA document, returning None if it failed."""
+    try:
+        set_answers(fin_qa, model.answer_questions(fin_qa))
+    except Exception as ex:  # noqa: BLE001
+        LOG.warning(ex)
+        return None
+    return fin_qa
+
+
+async def aanswer_fin_qa(model: "BaseModelWrapper", fin_qa: FinQA) -> FinQA | None:
+    """Answer a FinQA document asynchronously, returning None if it failed."""
+    try:
+        set_answers(fin_qa, await model.aanswer_questions(fin_qa))
+    except Exception as ex:  # noqa: BLE001
+        LOG.warning(ex)
+        return None
+    return fin_qa
+
+
+def answer_dataset(
+    model: "BaseModelWrapper", dataset: Iterable[FinQA], window: int = REQUEST_WINDOW
+) -> Iterator[FinQA | None]:
+    """Answer the documents of a dataset one at a time.
+
+    Within every window of documents, the documents are answered in the order
+    requested by the model. Every document is yielded, in the dataset order, as
+    soon as it and all documents before it are answered, so without reordering
+    each one is yielded right away.
+    """
+    for batch in itertools.batched(dataset, window):
+        results: dict[int, FinQA | None] = {}
+        done = 0
+        for i in model.request_order(list(batch)):
+            results[i] = answer_fin_qa(model, batch[i])
+            while done in results:
+                yield results.pop(done)
+                done += 1
+
+
+async def aanswer_dataset(
+    model: "BaseModelWrapper", dataset: Iterable[FinQA], concurrency: int
+) -> AsyncIterator[FinQA | None]:
+    """Answer the documents of a dataset concurrently, keeping the dataset order.
+
+    Within every window of documents, the requests are started in the order
+    requested by the model.
+    """
+    async for result in ordered_map(
+        lambda fin_qa: aanswer_fin_qa(model, fin_qa),
+        dataset,
+        concurrency,
+        window=max(REQUEST_WINDOW, concurrency),
+        order=model.request_order,
+    ):
+        yield result
+
+
+def with_progress[T](results: Iterable[T], model: "BaseModelWrapper") -> Iterator[T]:
+    """Show a progress bar with a live summary of the run metrics."""
+    progress = tqdm.tqdm(results)
+    for result in progress:
+        progress.set_postfix(model.metrics.postfix(), refresh=False)
+        yield result
+
+
+def log_summary(model: "BaseModelWrapper") -> None:
+    """Log the prompt usage, metrics and cache statistics of a finished run."""
+    LOG.info(
+        f"Prompt tokens: {model.usage.prompt_tokens} sent in "
+        f"{model.usage.requests} requests, "
+        f"{model.usage.full_context_prompt_tokens} with full context every turn "
+        f"({model.usage.savings:.1%} saved)"
+    )
+    if model.context_token_budget is not None:
+        LOG.info(
+            f"Context selection: kept {model.usage.selected_context_tokens} of "
+            f"{model.usage.context_tokens} context tokens "
+            f"({model.usage.context_retained:.1%} retained)"
+        )
+    summary = model.metrics.summary()
+    LOG.info(
+        f"Metrics: {summary['requests']} requests in {summary['chat_seconds']:.1f}s, "
+        f"{summary['tokens_per_second']:.1f} tokens/s, "
+        f"{summary['latency_quantiles']['0.5']:.1f}s median latency, "
+        f"{summary['parse_failure_rate']:.1%} parse failures"
+    )
+    if summary["deduplicated_requests"]:
+        LOG.info(
+            f"Deduplicated: {summary['deduplicated_requests']} requests shared the "
+            f"response of an identical request in flight, about "
+            f"{summary['deduplicated_tokens']} tokens saved"
+        )
+    if model.early_stop:
+        early_stop = summary["early_stop"]
+        LOG.info(
+            f"Early stops: {early_stop['answer']} after the answer, "
+            f"{early_stop['budget']} over the reasoning budget, about "
+            f"{early_stop['saved']['tokens']:.0f} tokens and "
+            f"{early_stop['saved']['seconds']:.1f}s saved"
+        )
+    if model.samples > 1:
+        voting = summary["voting"]
+        LOG.info(
+            f"Voting: {voting['questions']} questions answered with "
+            f"{voting['mean_samples']:.1f} samples on average out of {model.samples}, "
+            f"{voting['quorum']} reached a quorum of {model.quorum}"
+        )
+    if model.cache is not None:
+        stats = model.cache.stats
+        LOG.info(
+            f"Cache: {stats.hit_ratio:.1%} of {stats.lookups} lookups hit "
+            f"({stats.memory_hits} in memory), "
+            f"{stats.mean_lookup_seconds * 1000:.2f} ms mean backend lookup"
+        )
+
+
+def process_data(  # noqa: PLR0913
+    src: str,
+    out: str,
+    *,
+    concurrency: Annotated[
+        int, typer.Option(help="Number of documents answered concurrently.")
+    ] = 1,
+    resume: Annotated[
+        bool, typer.Option(help="Skip documents already present in a .jsonl output.")
+    ] = False,
+    limit: Annotated[
+        int | None, typer.Option(help="Maximum number of documents to answer.")
+    ] = None,
+    offset: Annotated[int, typer.Option(help="Number of documents to skip.")] = 0,
+    shard: Annotated[
+        str | None, typer.Option(help="Only answer shard i of n, given as i/n.")
+    ] = None,
+    metrics: Annotated[
+        str | None,
+        typer.Option(help="Path to write the run metrics to, .json or Prometheus."),
+    ] = None,
+) -> None:
+    """Answer questions from a dataset.
+
+    If the output path ends with `.jsonl`, every answered document is written as a
+    separate line as soon as it is finished, which allows resuming interrupted runs.
+    If it ends with `.npz`, only the answers, scores and measurements of every
+    question are written, see `Results`.
+
+    Args:
+        src (str): Path to the dataset file.
+        out (str): Path to the output file.
+        concurrency (int): Number of documents answered concurrently. Values
+            above 1 use the async chat API of the model.
+        resume (bool): Skip documents that are already in the output file.
+        limit (int | None): Maximum number of documents to answer.
+        offset (int): Number of documents to skip.
+        shard (str | None): Only answer every n-th document starting at i,
+            given as "i/n".
+        metrics (str | None): Path to write the latency, token, cache and parsing
+            metrics to, as JSON for a .json suffix or as Prometheus text otherwise.
+
+    """
+    streaming = Path(out).suffix == ".jsonl"
+    if resume and not streaming:
+        msg = "Resuming requires a .jsonl output file."
+        raise typer.BadParameter(msg)
+
+    # Prepare the dataset and model, the documents are loaded lazily
+    dataset = FinQADataset.iter_file(
+        src, limit=limit, offset=offset, shard=parse_shard(shard) if shard else None
+    )
+    model = MODEL_BACKENDS[settings.backend](model_name=settings.model)
+
+    if resume and Path(out).exists():
+        done = {data.get("id") for data in iter_jsonl(out)}
+        LOG.info(f"Resuming, skipping {len(done)} answered documents.")
+        dataset = (fin_qa for fin_qa in dataset if fin_qa.id not in done)
+
+    # Answer the questions
+    if concurrency > 1:
+        results = iterate_async(aanswer_dataset(model, dataset, concurrency))
+    else:
+        results = answer_dataset(model, dataset)
+    results = with_progress(results, model)
+
+    if streaming:
+        with JSONLWriter(out, append=resume) as writer:
+            for fin_qa in results:
+                if fin_qa is not None:
+                    writer.write(fin_qa)
+
+        score = score_output(out)
+    elif Path(out).suffix == ".npz":
+        # Only the per-question results, the documents are referenced by id
+        answered = (fin_qa for fin_qa in results if fin_qa is not None)
+        columns = Results.from_fin_qas(answered, model.metrics.turns, source=src)
+        columns.save(out)
+
+        score = columns.accuracy
+    else:
+        answered_dataset = FinQADataset(
+            finqa_list=[fin_qa for fin_qa in results if fin_qa is not None]
+        )
+
+        with Path(out).open("w") as f:
+            f.write(answered_dataset.model_dump_json())
+
+        score = answered_dataset.score
+
+    LOG.info(f"Score: {score}")
+    log_summary(model)
+    if metrics:
+        model.metrics.write(
+            metrics, labels={"backend": settings.backend, "model": settings.model}
+        )
@@ -3,9 +3,17 @@ from pathlib import Path
 
 import colorlog
 
+LOG_FILE = "logs/deepseek_fin_qa.log"
 
-def setup_logger(log_file: str) -> logging.Logger:
-    """Set up a logger with a file handler and a stream handler."""
+LOG = logging.getLogger("deepseek_fin_qa")
+
+
+def setup_logger(log_file: str = LOG_FILE) -> logging.Logger:
+    """Set up the root logger with a file handler and a stream handler.
+
+    Importing the package does not configure logging, the scripts call this
+    before running so that libraries can use the package without side effects.
+    """
     # Create the log file directory
     Path(log_file).parent.mkdir(parents=True, exist_ok=True)
 
@@ -43,6 +51,3 @@ def setup_logger(log_file: str) -> logging.Logger:
     logger.addHandler(stream_handler)
 
     return logger
-
-
-LOG = setup_logger("logs/deepseek_fin_qa.log")
@@ -0,0 +1,50 @@
+import importlib
+from collections.abc import Iterator, Mapping
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.models.base import BaseModelWrapper
+
+
+class BackendRegistry(Mapping[str, "type[BaseModelWrapper]"]):
+    """Model backends by name, imported on first use.
+
+    Every backend pulls in its llama-index integration, importing them lazily
+    keeps the packages of the unused backends, and llama-index itself for code
+    that does not query a model, off the import path.
+    """
+
+    def __init__(self, backends: dict[str, str]) -> None:
+        """Initialize the registry.
+
+        Args:
+            backends (dict[str, str]): The backends by name, given as
+                "module:class" import paths.
+
+        """
+        self.backends = backends
+        self.loaded: dict[str, type[BaseModelWrapper]] = {}
+
+    def __getitem__(self, name: str) -> "type[BaseModelWrapper]":
+        """Return the model wrapper class of a backend, importing it if needed."""
+        if name not in self.loaded:
+            module, _, cls = self.backends[name].partition(":")
+            self.loaded[name] = getattr(importlib.import_module(module), cls)
+        return self.loaded[name]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the backend names without importing them."""
+        return iter(self.backends)
+
+    def __len__(self) -> int:
+        """Return the number of backends."""
+        return len(self.backends)
+
+
+MODEL_BACKENDS = BackendRegistry(
+    {
+        "ollama": "deepseek_fin_qa.models.ollama:OllamaModel",
+        "groq": "deepseek_fin_qa.models.groq:GroqModel",
+        "fake": "deepseek_fin_qa.models.fake:FakeModel",
+    }
+)
@@ -1,27 +1,62 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from llama_index.core.llms import ChatMessage
+from llama_index.core.llms import ChatMessage, ChatResponse
 from llama_index.core.output_parsers import PydanticOutputParser
+from pydantic import ValidationError
 
 from deepseek_fin_qa.log import LOG
-from deepseek_fin_qa.prompts import FINQA_SYSTEM_PROMPT, FINQA_USER_PROMPT
-from deepseek_fin_qa.schemas.qa import Answer, FinQA
-from deepseek_fin_qa.utils.cache import ChatCache
+from deepseek_fin_qa.prompts import (
+    FINQA_ANSWER_NOW_PROMPT,
+    FINQA_FOLLOWUP_PROMPT,
+    FINQA_SYSTEM_PROMPT,
+    FINQA_USER_PROMPTS,
+)
+from deepseek_fin_qa.schemas.metrics import PromptUsage
+from deepseek_fin_qa.schemas.qa import QA, Answer, FinQA
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.cache import (
+    MemoryChatCache,
+    cache_key,
+    legacy_query,
+    open_cache,
+)
+from deepseek_fin_qa.utils.concurrency import SingleFlight
+from deepseek_fin_qa.utils.metrics import (
+    RunMetrics,
+    TurnMetrics,
+    reasoning_tokens,
+    reported_usage,
+)
+from deepseek_fin_qa.utils.parsing import JSONObjectExtractor, loads_lenient
+from deepseek_fin_qa.utils.selection import ContextSelection, select_context
+from deepseek_fin_qa.utils.tokens import count_tokens, estimate_tokens
+from deepseek_fin_qa.utils.voting import Ballot
 
 if TYPE_CHECKING:
+    from llama_index.core.base.llms.types import ChatResponseAsyncGen, ChatResponseGen
     from llama_index.core.llms.function_calling import FunctionCallingLLM
 
 
+def _role_contents(messages: list[ChatMessage]) -> list[tuple[str, str]]:
+    """Return the role and content of every message."""
+    return [(message.role.value, message.content or "") for message in messages]
+
+
 class ReasoningOutputParser(PydanticOutputParser):
     """Custom output parser for reasoning models."""
 
     def parse(self, text: str) -> Answer | None:
         """Parse the output text of a reasoning model.
 
-        Deepseek includes <think></think> tags in the output text. This method
-        tries to find the part of the output that includes the expected JSON and applies
-        the default parsing.
+        Deepseek includes <think></think> tags in the output text. The text is
+        scanned once for JSON objects and the last object after the reasoning that
+        validates is returned, objects inside the reasoning are only used if there
+        is none after it. Common malformations of the JSON are repaired.
 
         Args:
             text (str): The output text to parse.
@@ -30,18 +65,106 @@ class ReasoningOutputParser(PydanticOutputParser):
             Parsed output.
 
         """
-        if "```json" in text:
-            text = text[text.find("```json"):]
-        elif "{" in text:
-            text = text[text.rfind("{"):]
-        elif "</think>" in text:
-            text = text[text.find("</think>"):]
+        extractor = JSONObjectExtractor()
+        extractor.feed(text)
+        extractor.finish()
 
-        try:
-            return super().parse(text)
-        except ValueError:
-            LOG.warning(f"Failed to parse output: {text}")
-            return None
+        answer = self.parse_objects(extractor.objects) or self.parse_objects(
+            extractor.think_objects
+        )
+        if answer is None:
+            LOG.warning(f"Failed to parse output ending with: {text[-200:]!r}")
+            LOG.debug(f"Failed to parse output: {text}")
+        return answer
+
+    def parse_objects(self, objects: list[str]) -> Answer | None:
+        """Return the last of the JSON objects that is a valid output."""
+        for text in reversed(objects):
+            obj = loads_lenient(text)
+            if obj is None:
+                continue
+            try:
+                return self.output_cls.model_validate(obj)
+            except ValidationError:
+                # Numbers given for text fields, e.g. a program that is a constant
+                obj = {
+                    key: str(value) if isinstance(value, int | float) else value
+                    for key, value in obj.items()
+                }
+                try:
+                    return self.output_cls.model_validate(obj)
+                except ValidationError:
+                    continue
+        return None
+
+
+class EarlyStopDetector:
+    """Incremental detector of the point where a streamed response can be cut.
+
+    The streamed tokens are scanned for a JSON object after the closing </think>
+    tag that parses as an answer, and the tokens inside the <think> block are
+    counted against the budget. Responses without reasoning are not cut.
+    """
+
+    def __init__(
+        self, parser: ReasoningOutputParser, think_token_budget: int | None = None
+    ) -> None:
+        """Initialize the EarlyStopDetector.
+
+        Args:
+            parser (ReasoningOutputParser): The parser that validates the answer.
+            think_token_budget (int | None, optional): Maximum number of reasoning
+                tokens, None for no limit. Defaults to None.
+
+        """
+        self.parser = parser
+        self.think_token_budget = think_token_budget
+        self.extractor = JSONObjectExtractor()
+        self.text = ""
+        self.think_tokens = 0
+        self.reason: str | None = None
+        self.last: ChatResponse | None = None
+
+    def feed(self, chunk: ChatResponse) -> bool:
+        """Scan the next streamed chunk and return whether to stop generating."""
+        delta = chunk.delta or ""
+        self.text += delta
+        self.last = chunk
+
+        objects = self.extractor.feed(delta)
+        # Objects before </think> may be part of reasoning without an opening tag
+        if (
+            objects
+            and self.extractor.think_closed
+            and self.parser.parse_objects(objects) is not None
+        ):
+            self.reason = "answer"
+        elif self.extractor.in_think and self.think_token_budget is not None:
+            self.think_tokens += estimate_tokens(delta)
+            if self.think_tokens > self.think_token_budget:
+                self.reason = "budget"
+        return self.reason is not None
+
+    def answer_now(self, messages: list[ChatMessage]) -> list[ChatMessage]:
+        """Return the messages that force an answer after the cut reasoning."""
+        return [
+            *messages,
+            ChatMessage(role="assistant", content=f"{self.text}\n</think>"),
+            ChatMessage(role="user", content=FINQA_ANSWER_NOW_PROMPT),
+        ]
+
+    def response(self, follow_up: "EarlyStopDetector | None" = None) -> ChatResponse:
+        """Return the response, joined with the answer of a forced follow-up."""
+        if self.reason is None and self.last is not None:
+            return self.last  # Complete response, with the usage reported at the end
+
+        text = self.text
+        if follow_up is not None:
+            text += f"\n</think>\n{follow_up.text}"
+        return ChatResponse(
+            message=ChatMessage(role="assistant", content=text),
+            additional_kwargs={"early_stop": self.reason},
+        )
 
 
 class BaseModelWrapper:
@@ -57,13 +180,32 @@ class BaseModelWrapper:
         """
         self.model_name = model_name
         self.parser = ReasoningOutputParser(Answer)
+        self.context_mode = settings.context_mode
+        self.table_format = settings.table_format
+        self.prompt_order = settings.prompt_order
+        self.context_token_budget = settings.context_token_budget
+        self.usage = PromptUsage()
+        self.in_flight: SingleFlight[str, ChatResponse] = SingleFlight()
+        self.early_stop = settings.early_stop
+        self.think_token_budget = settings.think_token_budget
+        self.samples = settings.samples
+        self.quorum = settings.sample_quorum or self.samples // 2 + 1
+        self.cache_legacy_lookup = settings.cache_legacy_lookup
 
         if cache:
-            self.cache = ChatCache(
-                Path(cache) / f"{self.model_name}.json"
-            )  # Initialize cache
+            self.cache = MemoryChatCache(
+                open_cache(
+                    Path(cache) / self.model_name,
+                    settings.cache_backend,
+                    settings.cache_url,
+                ),
+                settings.cache_memory_bytes,
+            )  # Initialize cache with an in-memory front
         else:
             self.cache = None
+        self.metrics = RunMetrics(
+            cache_stats=self.cache.stats if self.cache is not None else None
+        )
 
         self.model: FunctionCallingLLM
 
@@ -85,35 +227,480 @@ class BaseModelWrapper:
         ]
 
         answers = []
-        for qa in fin_qa:
-            messages.append(
-                ChatMessage(
-                    role="user",
-                    content=FINQA_USER_PROMPT.format(
-                        question=qa.question,
-                        context=fin_qa.context,
-                    ),
-                )
-            )
+        for turn, qa in enumerate(fin_qa):
+            selection = self._select_context(fin_qa, turn)
+            messages.append(self._user_message(qa, selection))
+            self._record_usage(messages, fin_qa, turn, selection)
+
+            if self.samples > 1:
+                answers.append(self._vote(fin_qa, turn, messages))
+                continue
+
+            response = self._get_cached(messages)
+            chat = None
+            if response is None:
+                start = time.perf_counter()
+                chat_response = self._chat(messages)  # Get response from model
+                chat = (time.perf_counter() - start, chat_response)
+                response = str(chat_response)
+                self._set_cached(messages, response)
+
+            answers.append(self._add_response(messages, response))
+            self._record_turn(fin_qa, turn, messages, answers[-1], chat)
+        return answers
+
+    async def aanswer_questions(self, fin_qa: FinQA) -> list[Answer | None]:
+        """Answer a list of questions using the async chat API.
+
+        The turns of a conversation are still answered sequentially, as every
+        question depends on the previous answers, so concurrency comes from
+        answering several FinQA documents at the same time. Documents that send
+        identical requests at the same time, e.g. the same question about the same
+        filing, share a single request.
+
+        Args:
+            fin_qa (FinQA): The list of questions and context.
+
+        Returns:
+            list[Answer]: The list of answers.
 
-            response = None
-            if self.cache:
-                # Check if response is cached
-                response = self.cache.get(str(messages))
+        """
+        messages = [
+            ChatMessage(
+                role="system",
+                content=FINQA_SYSTEM_PROMPT,
+            ),
+        ]
 
+        answers = []
+        for turn, qa in enumerate(fin_qa):
+            selection = self._select_context(fin_qa, turn)
+            messages.append(self._user_message(qa, selection))
+            self._record_usage(messages, fin_qa, turn, selection)
+
+            if self.samples > 1:
+                answers.append(await self._avote(fin_qa, turn, messages))
+                continue
+
+            response = self._get_cached(messages)
+            chat = None
+            deduplicated = False
             if response is None:
-                response = self.model.chat(messages)  # Get response from model
-                if self.cache:
-                    self.cache.set(str(messages), str(
-                        response))  # Cache the response
-
-            # Parse the response
-            answers.append(self.parser.parse(str(response)))
-            messages.append(
-                ChatMessage(
-                    # Add assistant message to messages for next iteration
-                    role="assistant",
-                    content=str(response),
+                start = time.perf_counter()
+                # Identical requests of other documents in flight share one response
+                chat_response, deduplicated = await self.in_flight.run(
+                    self._cache_key(messages),
+                    functools.partial(self._achat, messages),
                 )
+                chat = (time.perf_counter() - start, chat_response)
+                response = str(chat_response)
+                if not deduplicated:
+                    self._set_cached(messages, response)
+
+            answers.append(self._add_response(messages, response))
+            self._record_turn(
+                fin_qa, turn, messages, answers[-1], chat, deduplicated=deduplicated
             )
         return answers
+
+    def _vote(
+        self, fin_qa: FinQA, turn: int, messages: list[ChatMessage]
+    ) -> Answer | None:
+        """Answer a question by a majority vote over concurrently drawn samples.
+
+        Samples are drawn in threads until a quorum of their answers agree, see
+        `Ballot`. The response of the winning sample continues the conversation.
+        """
+        ballot = Ballot(self.samples, self.quorum)
+        responses: dict[int, str] = {}
+        with ThreadPoolExecutor(self.samples) as executor:
+            pending: set[Future[tuple[int, str, Answer | None]]] = set()
+            while not ballot.done:
+                pending |= {
+                    executor.submit(self._sample, fin_qa, turn, messages, sample)
+                    for sample in ballot.launch(len(pending))
+                }
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    sample, responses[sample], answer = future.result()
+                    ballot.add(sample, answer)
+        return self._add_vote(messages, ballot, responses)
+
+    async def _avote(
+        self, fin_qa: FinQA, turn: int, messages: list[ChatMessage]
+    ) -> Answer | None:
+        """Answer a question by a majority vote over concurrently drawn samples."""
+        ballot = Ballot(self.samples, self.quorum)
+        responses: dict[int, str] = {}
+        pending: set[asyncio.Task[tuple[int, str, Answer | None]]] = set()
+        try:
+            while not ballot.done:
+                pending |= {
+                    asyncio.create_task(self._asample(fin_qa, turn, messages, sample))
+                    for sample in ballot.launch(len(pending))
+                }
+                finished, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in finished:
+                    sample, responses[sample], answer = task.result()
+                    ballot.add(sample, answer)
+        finally:
+            for task in pending:
+                task.cancel()
+        return self._add_vote(messages, ballot, responses)
+
+    def _sample(
+        self, fin_qa: FinQA, turn: int, messages: list[ChatMessage], sample: int
+    ) -> tuple[int, str, Answer | None]:
+        """Draw a sample of the response to a question, every sample is cached."""
+        response = self._get_cached(messages, sample)
+        chat = None
+        if response is None:
+            start = time.perf_counter()
+            chat_response = self._chat(messages)
+            chat = (time.perf_counter() - start, chat_response)
+            response = str(chat_response)
+            self._set_cached(messages, response, sample)
+
+        answer = self.parser.parse(response)
+        self._record_turn(
+            fin_qa,
+            turn,
+            [*messages, ChatMessage(role="assistant", content=response)],
+            answer,
+            chat,
+            sample=sample,
+        )
+        return sample, response, answer
+
+    async def _asample(
+        self, fin_qa: FinQA, turn: int, messages: list[ChatMessage], sample: int
+    ) -> tuple[int, str, Answer | None]:
+        """Draw a sample of the response to a question using the async API."""
+        response = self._get_cached(messages, sample)
+        chat = None
+        deduplicated = False
+        if response is None:
+            start = time.perf_counter()
+            chat_response, deduplicated = await self.in_flight.run(
+                self._cache_key(messages, sample),
+                functools.partial(self._achat, messages),
+            )
+            chat = (time.perf_counter() - start, chat_response)
+            response = str(chat_response)
+            if not deduplicated:
+                self._set_cached(messages, response, sample)
+
+        answer = self.parser.parse(response)
+        self._record_turn(
+            fin_qa,
+            turn,
+            [*messages, ChatMessage(role="assistant", content=response)],
+            answer,
+            chat,
+            deduplicated=deduplicated,
+            sample=sample,
+        )
+        return sample, response, answer
+
+    def _add_vote(
+        self, messages: list[ChatMessage], ballot: Ballot, responses: dict[int, str]
+    ) -> Answer | None:
+        """Add the response of the winning sample to the messages for the next turn.
+
+        Without any parsed answer, the response of the first sample is added.
+        """
+        self.metrics.record_vote(ballot.counted, quorum=ballot.votes >= ballot.quorum)
+        winner = ballot.winner
+        messages.append(
+            ChatMessage(
+                role="assistant",
+                content=responses[min(responses) if winner is None else winner],
+            )
+        )
+        return None if winner is None else ballot.answers[winner]
+
+    def request_order(self, fin_qas: list[FinQA]) -> list[int]:
+        """Return the order in which a batch of documents should be answered.
+
+        Backends can override this to schedule requests more efficiently, the
+        answers are still returned in the original order.
+        """
+        return list(range(len(fin_qas)))
+
+    def _chat(self, messages: list[ChatMessage]) -> ChatResponse:
+        """Send the messages to the model."""
+        if not self.early_stop:
+            return self.model.chat(messages)
+
+        detector = self._stream(self.model.stream_chat(messages))
+        follow_up = None
+        if detector.reason == "budget":
+            follow_up = self._stream(
+                self.model.stream_chat(detector.answer_now(messages))
+            )
+        return detector.response(follow_up)
+
+    async def _achat(self, messages: list[ChatMessage]) -> ChatResponse:
+        """Send the messages to the model using the async API."""
+        if not self.early_stop:
+            return await self.model.achat(messages)
+
+        detector = await self._astream(await self.model.astream_chat(messages))
+        follow_up = None
+        if detector.reason == "budget":
+            follow_up = await self._astream(
+                await self.model.astream_chat(detector.answer_now(messages))
+            )
+        return detector.response(follow_up)
+
+    def _stream(self, chunks: "ChatResponseGen") -> EarlyStopDetector:
+        """Consume a streamed response until it can be cut.
+
+        Closing the stream closes the connection, which stops the generation.
+        """
+        detector = EarlyStopDetector(self.parser, self.think_token_budget)
+        try:
+            for chunk in chunks:
+                if detector.feed(chunk):
+                    break
+        finally:
+            chunks.close()
+        return detector
+
+    async def _astream(self, chunks: "ChatResponseAsyncGen") -> EarlyStopDetector:
+        """Consume a streamed response until it can be cut, using the async API."""
+        detector = EarlyStopDetector(self.parser, self.think_token_budget)
+        try:
+            async for chunk in chunks:
+                if detector.feed(chunk):
+                    break
+        finally:
+            await chunks.aclose()
+        return detector
+
+    def _user_message(self, qa: QA, selection: ContextSelection | None) -> ChatMessage:
+        """Create the user message for a question.
+
+        Without a selected context, in the "once" context mode, the follow-up
+        questions refer back to the context of the first question.
+        """
+        if selection is None:
+            content = FINQA_FOLLOWUP_PROMPT.format(question=qa.question)
+        else:
+            content = FINQA_USER_PROMPTS[self.prompt_order].format(
+                question=qa.question,
+                context=selection.fin_qa.render_context(self.table_format),
+            )
+        return ChatMessage(role="user", content=content)
+
+    def _select_context(self, fin_qa: FinQA, turn: int) -> ContextSelection | None:
+        """Select the parts of the context most relevant to the question.
+
+        In the "once" context mode only the first question includes the context,
+        so it is selected for all questions of the conversation, and None is
+        returned for the follow-up questions. The selection is made once per turn
+        and shared by the user message and the usage estimate.
+        """
+        if self.context_mode == "once" and turn > 0:
+            return None
+        if self.context_token_budget is None:
+            return ContextSelection(fin_qa, 0, 0)
+        if self.context_mode == "once":
+            turn = len(fin_qa) - 1
+        return select_context(
+            fin_qa, turn, self.context_token_budget, self.table_format
+        )
+
+    def _record_usage(
+        self,
+        messages: list[ChatMessage],
+        fin_qa: FinQA,
+        turn: int,
+        selection: ContextSelection | None,
+    ) -> None:
+        """Estimate the prompt tokens of a request and of its full context variant."""
+        prompt_tokens = sum(count_tokens(message.content or "") for message in messages)
+
+        if self.context_token_budget is not None and selection is not None:
+            self.usage.context_tokens += selection.total_tokens
+            self.usage.selected_context_tokens += selection.tokens
+            LOG.debug(
+                f"Kept {selection.retained:.1%} of the context of {fin_qa.id} "
+                f"for question {turn}"
+            )
+
+        # Follow-up questions would include the whole context again
+        follow_ups = [message for message in messages if message.role == "user"][1:]
+        extra_tokens = len(follow_ups) * (
+            count_tokens(
+                FINQA_USER_PROMPTS[self.prompt_order].format(
+                    question="", context=fin_qa.render_context(self.table_format)
+                )
+            )
+            - count_tokens(FINQA_FOLLOWUP_PROMPT.format(question=""))
+        )
+
+        self.usage.requests += 1
+        self.usage.prompt_tokens += prompt_tokens
+        self.usage.full_context_prompt_tokens += prompt_tokens + (
+            extra_tokens if self.context_mode == "once" else 0
+        )
+
+    @property
+    def generation_params(self) -> dict[str, Any]:
+        """Return the generation parameters that are part of the cache key."""
+        return {}
+
+    def _cache_key(self, messages: list[ChatMessage], sample: int | None = None) -> str:
+        """Return the canonical cache key for the messages.
+
+        Every sample of a voted answer is cached under its own key.
+        """
+        params = self.generation_params
+        if sample is not None:
+            params = {**params, "sample": sample}
+        if self.early_stop:
+            # Responses cut short are not interchangeable with complete ones
+            params = {
+                **params,
+                "early_stop": True,
+                "think_token_budget": self.think_token_budget,
+            }
+        return cache_key(_role_contents(messages), self.model_name, params)
+
+    def _record_turn(  # noqa: PLR0913
+        self,
+        fin_qa: FinQA,
+        turn: int,
+        messages: list[ChatMessage],
+        answer: Answer | None,
+        chat: tuple[float, ChatResponse] | None,
+        *,
+        deduplicated: bool = False,
+        sample: int | None = None,
+    ) -> None:
+        """Record the measurements of an answered question.
+
+        Args:
+            fin_qa (FinQA): The answered document.
+            turn (int): The index of the question.
+            messages (list[ChatMessage]): The messages ending with the response.
+            answer (Answer | None): The parsed answer.
+            chat (tuple[float, ChatResponse] | None): The duration and the response
+                of the chat request, None if the response was cached.
+            deduplicated (bool, optional): Whether the response was shared with an
+                identical request in flight. Defaults to False.
+            sample (int | None, optional): The index of the sample of a voted
+                answer. Defaults to None.
+
+        """
+        response = messages[-1].content or ""
+        seconds, prompt_tokens, completion_tokens = 0.0, 0, 0
+        early_stop = None
+        if chat is not None:
+            seconds, chat_response = chat
+            early_stop = (getattr(chat_response, "additional_kwargs", None) or {}).get(
+                "early_stop"
+            )
+            prompt_tokens, completion_tokens = reported_usage(chat_response)
+            if prompt_tokens is None:
+                prompt_tokens = sum(
+                    count_tokens(message.content or "") for message in messages[:-1]
+                )
+            if completion_tokens is None:
+                completion_tokens = estimate_tokens(response)
+
+        self.metrics.record_turn(
+            TurnMetrics(
+                document=fin_qa.id,
+                turn=turn,
+                cached=chat is None,
+                seconds=seconds,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                reasoning_tokens=reasoning_tokens(response),
+                parsed=answer is not None,
+                early_stop=early_stop,
+                deduplicated=deduplicated,
+                sample=sample,
+            )
+        )
+
+    def _get_cached(
+        self,
+        messages: list[ChatMessage],
+        sample: int | None = None,
+        *,
+        legacy: bool | None = None,
+    ) -> str | None:
+        """Return the cached response for the messages, if any.
+
+        With `legacy`, which defaults to the `CACHE_LEGACY_LOOKUP` setting, a
+        response cached under the legacy key is moved to the canonical key on a
+        miss. The legacy key is looked up in the backend directly, so it does
+        not count as a second lookup in the cache statistics, which count the
+        lookup of the canonical key only.
+        """
+        if self.cache is None:
+            return None
+
+        key = self._cache_key(messages, sample)
+        response = self.cache.get_key(key)
+        if legacy is None:
+            legacy = self.cache_legacy_lookup
+        if response is None and sample is None and legacy:
+            response = self.cache.backend.get(legacy_query(_role_contents(messages)))
+            if response is not None:
+                self.cache.set_key(key, response)
+        return response
+
+    def _set_cached(
+        self, messages: list[ChatMessage], response: str, sample: int | None = None
+    ) -> None:
+        """Cache the response for the messages."""
+        if self.cache is not None:
+            self.cache.set_key(self._cache_key(messages, sample), response)
+
+    def replay_cached(self, fin_qa: FinQA) -> int:
+        """Replay a conversation from the cache without querying the model.
+
+        Every turn found in the cache is moved to its canonical key, which is how
+        existing caches are re-keyed.
+
+        Args:
+            fin_qa (FinQA): The list of questions and context.
+
+        Returns:
+            int: The number of leading turns found in the cache.
+
+        """
+        messages = [
+            ChatMessage(
+                role="system",
+                content=FINQA_SYSTEM_PROMPT,
+            ),
+        ]
+
+        for turn, qa in enumerate(fin_qa):
+            selection = self._select_context(fin_qa, turn)
+            messages.append(self._user_message(qa, selection))
+            response = self._get_cached(messages, legacy=True)
+            if response is None:
+                return turn
+            self._add_response(messages, response)
+        return len(fin_qa)
+
+    def _add_response(
+        self, messages: list[ChatMessage], response: str
+    ) -> Answer | None:
+        """Parse the response and add it to the messages for the next turn."""
+        messages.append(
+            ChatMessage(
+                # Add assistant message to messages for next iteration
+                role="assistant",
+                content=response,
+            )
+        )
+        return self.parser.parse(response)
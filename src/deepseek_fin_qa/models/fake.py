@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections.abc import Sequence
+from typing import Any
+
+from llama_index.core.llms import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    CompletionResponseGen,
+    CustomLLM,
+    LLMMetadata,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+
+from deepseek_fin_qa.models.base import BaseModelWrapper
+
+FAKE_RESPONSE = '<think>\nOkay.\n</think>\n{"value": "0.00", "program": "0"}'
+
+
+class FakeLLM(CustomLLM):
+    """Local stand-in LLM that answers with a fixed response after a delay."""
+
+    response: str = FAKE_RESPONSE
+    latency: float = 0.0
+
+    @classmethod
+    def class_name(cls) -> str:
+        """Return the class name."""
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        """Return the LLM metadata."""
+        return LLMMetadata(is_chat_model=True, model_name="fake")
+
+    @llm_completion_callback()
+    def complete(
+        self,
+        prompt: str,  # noqa: ARG002
+        formatted: bool = False,  # noqa: ARG002, FBT001, FBT002
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> CompletionResponse:
+        """Return the fixed response after blocking for the configured latency."""
+        time.sleep(self.latency)
+        return CompletionResponse(text=self.response)
+
+    @llm_completion_callback()
+    def stream_complete(
+        self,
+        prompt: str,  # noqa: ARG002
+        formatted: bool = False,  # noqa: ARG002, FBT001, FBT002
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> CompletionResponseGen:
+        """Stream the fixed response one character at a time."""
+
+        def gen() -> CompletionResponseGen:
+            time.sleep(self.latency)
+            text = ""
+            for char in self.response:
+                text += char
+                yield CompletionResponse(text=text, delta=char)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(
+        self,
+        messages: Sequence[ChatMessage],  # noqa: ARG002
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> ChatResponse:
+        """Return the fixed response after sleeping for the configured latency."""
+        await asyncio.sleep(self.latency)
+        return ChatResponse(
+            message=ChatMessage(role="assistant", content=self.response)
+        )
+
+
+class FakeModel(BaseModelWrapper):
+    """Wrapper class for the fake model, used for dry runs and tests."""
+
+    def __init__(
+        self,
+        model_name: str,
+        cache: str | None = ".cache",
+        latency: float = 0.0,
+    ) -> None:
+        """Initialize the FakeModel.
+
+        Args:
+            model_name (str): The name of the model.
+            cache (str | None, optional): The cache directory. Defaults to ".cache".
+            latency (float, optional): Seconds to wait per request. Defaults to 0.
+
+        """
+        super().__init__(model_name, cache)
+
+        self.model = FakeLLM(latency=latency)
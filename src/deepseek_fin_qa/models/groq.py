@@ -1,14 +1,135 @@
+import itertools
+from typing import Any
+
+import openai
+from llama_index.core.llms import ChatMessage, ChatResponse
 from llama_index.llms.groq import Groq
 
+from deepseek_fin_qa.log import LOG
 from deepseek_fin_qa.models.base import BaseModelWrapper
 from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.ratelimit import Backoff, RateLimiter, retry_after
+from deepseek_fin_qa.utils.tokens import count_tokens
+
+# Rate limits, server errors and dropped connections are worth retrying
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+)
 
 
 class GroqModel(BaseModelWrapper):
-    """Wrapper class for Groq model."""
+    """Wrapper class for Groq model.
+
+    Requests are spread out to stay within the requests-per-minute and
+    tokens-per-minute budgets. A failed request is retried with exponential
+    backoff, or after the delay requested by the server, so only the failed turn
+    is repeated instead of the whole conversation being lost.
+    """
 
     def __init__(self, model_name: str, cache: str | None = ".cache") -> None:
         """Initialize the GroqModel."""
         super().__init__(model_name, cache)
 
-        self.model = Groq(model=self.model_name, api_key=settings.api_key)
+        self.limiter = RateLimiter(
+            requests_per_minute=settings.requests_per_minute,
+            tokens_per_minute=settings.tokens_per_minute,
+        )
+        self.backoff = Backoff(
+            max_retries=settings.max_retries,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+        )
+
+        # The samples of a vote need to differ, otherwise keep the default
+        options = {}
+        if settings.samples > 1:
+            options["temperature"] = settings.sample_temperature
+
+        # Retries are handled here, so that they are paced by the rate limiter
+        self.model = Groq(
+            model=self.model_name,
+            api_key=settings.api_key,
+            api_base=settings.base_url or "https://api.groq.com/openai/v1",
+            timeout=settings.request_timeout,
+            max_retries=0,
+            **options,
+        )
+
+    @property
+    def generation_params(self) -> dict[str, Any]:
+        """Return the generation parameters that are part of the cache key."""
+        return {
+            "temperature": self.model.temperature,
+            "max_tokens": self.model.max_tokens,
+        }
+
+    def _chat(self, messages: list[ChatMessage]) -> ChatResponse:
+        """Send the messages to the model within the rate limits."""
+        tokens = self._request_tokens(messages)
+        for attempt in itertools.count():
+            self.limiter.acquire(tokens)
+            try:
+                response = super()._chat(messages)
+            except BaseException as error:
+                self._release_tokens(tokens)
+                if not isinstance(error, RETRYABLE_ERRORS):
+                    raise
+                self._backoff(error, attempt)
+            else:
+                self._correct_tokens(tokens, response)
+                return response
+        raise AssertionError  # pragma: no cover
+
+    async def _achat(self, messages: list[ChatMessage]) -> ChatResponse:
+        """Send the messages to the model within the rate limits."""
+        tokens = self._request_tokens(messages)
+        for attempt in itertools.count():
+            await self.limiter.aacquire(tokens)
+            try:
+                response = await super()._achat(messages)
+            except BaseException as error:
+                self._release_tokens(tokens)
+                if not isinstance(error, RETRYABLE_ERRORS):
+                    raise
+                self._backoff(error, attempt)
+            else:
+                self._correct_tokens(tokens, response)
+                return response
+        raise AssertionError  # pragma: no cover
+
+    @staticmethod
+    def _request_tokens(messages: list[ChatMessage]) -> int:
+        """Estimate the tokens a request counts against the token budget."""
+        return sum(count_tokens(message.content or "") for message in messages)
+
+    def _release_tokens(self, estimated: int) -> None:
+        """Return the tokens reserved for a failed attempt to the token budget.
+
+        Failed requests, including cancelled ones, are not charged for tokens.
+        Keeping their reservations would throttle below the real budget after
+        every retry.
+        """
+        self.limiter.correct(estimated, 0)
+
+    def _correct_tokens(self, estimated: int, response: ChatResponse) -> None:
+        """Charge the token budget with the usage reported by the server."""
+        if total_tokens := response.additional_kwargs.get("total_tokens"):
+            self.limiter.correct(estimated, total_tokens)
+
+    def _backoff(self, error: openai.OpenAIError, attempt: int) -> None:
+        """Pause the requests after a failed attempt, or give up."""
+        if attempt >= self.backoff.max_retries:
+            raise error
+
+        response = getattr(error, "response", None)
+        delay = self.backoff.delay(
+            attempt, retry_after(response.headers if response is not None else None)
+        )
+        LOG.warning(
+            f"Request failed ({type(error).__name__}), "
+            f"retrying in {delay:.1f}s (attempt {attempt + 1})"
+        )
+        # Other requests would most likely fail too, so hold them back as well
+        self.limiter.pause(delay)
@@ -1,19 +1,101 @@
+from typing import Any
+
+from llama_index.core.llms import ChatMessage, ChatResponse
 from llama_index.llms.ollama import Ollama
 
+from deepseek_fin_qa.log import LOG
 from deepseek_fin_qa.models.base import BaseModelWrapper
+from deepseek_fin_qa.schemas.qa import FinQA
 from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.tokens import count_tokens
+
+# Smallest context window, larger windows are powers of two multiples of it
+MIN_CONTEXT_WINDOW = 2048
+
+# Token estimates are approximate, leave some headroom for the real tokenizer
+PROMPT_TOKEN_MARGIN = 1.25
+
+# Room left for the response when the number of predicted tokens is not capped
+DEFAULT_RESPONSE_TOKENS = 4096
 
 
 class OllamaModel(BaseModelWrapper):
-    """Wrapper class for Ollama model."""
+    """Wrapper class for Ollama model.
+
+    The model is kept loaded between requests and the context window is sized to
+    fit the longest prompt seen so far. The window only ever grows, in powers of
+    two, as every change of `num_ctx` makes Ollama reload the model.
+    """
 
     def __init__(self, model_name: str, cache: str | None = ".cache") -> None:
         """Initialize the OllamaModel."""
         super().__init__(model_name, cache)
 
+        options = {}
+        if settings.num_predict:
+            options["num_predict"] = settings.num_predict
+
         self.model = Ollama(
             model=self.model_name,
-            request_timeout=120,
-            base_url=settings.base_url,
-            temperature=0,
+            request_timeout=settings.request_timeout,
+            base_url=settings.base_url or "http://localhost:11434",
+            # Greedy decoding, unless the samples of a vote need to differ
+            temperature=settings.sample_temperature if settings.samples > 1 else 0,
+            keep_alive=settings.keep_alive,
+            context_window=MIN_CONTEXT_WINDOW,
+            additional_kwargs=options,
+        )
+
+    @property
+    def generation_params(self) -> dict[str, Any]:
+        """Return the generation parameters that are part of the cache key."""
+        return {"temperature": self.model.temperature, **self.model.additional_kwargs}
+
+    def _fit_context_window(self, messages: list[ChatMessage]) -> None:
+        """Grow the context window to fit the prompt and the response."""
+        prompt_tokens = sum(count_tokens(message.content or "") for message in messages)
+        needed = int(prompt_tokens * PROMPT_TOKEN_MARGIN) + (
+            settings.num_predict or DEFAULT_RESPONSE_TOKENS
         )
+
+        context_window = MIN_CONTEXT_WINDOW
+        while context_window < needed:
+            context_window *= 2
+
+        if context_window > settings.max_context_window:
+            LOG.warning(
+                f"Prompt needs about {needed} tokens, more than the maximum context "
+                f"window of {settings.max_context_window}, it will be truncated."
+            )
+            context_window = settings.max_context_window
+
+        if context_window > self.model.context_window:
+            LOG.info(f"Growing the context window to {context_window} tokens.")
+            self.model.context_window = context_window
+
+    def _chat(self, messages: list[ChatMessage]) -> ChatResponse:
+        """Send the messages to the model."""
+        self._fit_context_window(messages)
+        return super()._chat(messages)
+
+    async def _achat(self, messages: list[ChatMessage]) -> ChatResponse:
+        """Send the messages to the model using the async API."""
+        self._fit_context_window(messages)
+        return await super()._achat(messages)
+
+    def request_order(self, fin_qas: list[FinQA]) -> list[int]:
+        """Order the documents so that consecutive prompts share long prefixes.
+
+        Sorting the first prompts of the conversations places the prompts with the
+        longest common prefixes next to each other, which lets Ollama reuse the
+        cached prompt evaluation of the previous request.
+        """
+        prefixes = [
+            self._user_message(
+                fin_qa.qa_list[0], self._select_context(fin_qa, 0)
+            ).content
+            if len(fin_qa)
+            else ""
+            for fin_qa in fin_qas
+        ]
+        return sorted(range(len(fin_qas)), key=prefixes.__getitem__)
@@ -63,3 +63,25 @@ FINQA_USER_PROMPT = """
 Calculate the answer for the following question {question}
 based on the following context: {context}
 """
+
+# Variant with the context first, requests about the same document then share
+# the whole context as a prompt prefix
+FINQA_CONTEXT_FIRST_PROMPT = """
+Use the following context: {context}
+Calculate the answer for the following question {question}
+"""
+
+# User prompts by prompt order, see the prompt order setting
+FINQA_USER_PROMPTS = {
+    "question_first": FINQA_USER_PROMPT,
+    "context_first": FINQA_CONTEXT_FIRST_PROMPT,
+}
+
+FINQA_FOLLOWUP_PROMPT = """
+Calculate the answer for the following question {question}
+based on the context above.
+"""
+
+FINQA_ANSWER_NOW_PROMPT = """
+Stop reasoning now and answer with the JSON object only.
+"""
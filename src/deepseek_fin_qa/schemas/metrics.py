@@ -13,3 +13,38 @@ class Accuracy(BaseModel):
 
     execution: float
     program: float
+
+
+class ScoreReport(BaseModel):
+    """Accuracy breakdown for answered FinQA data."""
+
+    accuracy: Accuracy
+    n: int
+    turns: dict[int, Accuracy]
+    documents: dict[str, Accuracy]
+
+
+class PromptUsage(BaseModel):
+    """Estimated prompt tokens sent to the model during a run."""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    full_context_prompt_tokens: int = 0
+
+    # Tokens of the contexts sent, before and after the context selection
+    context_tokens: int = 0
+    selected_context_tokens: int = 0
+
+    @property
+    def savings(self) -> float:
+        """Return the fraction of prompt tokens saved compared to full context."""
+        if self.full_context_prompt_tokens == 0:
+            return 0.0
+        return 1 - self.prompt_tokens / self.full_context_prompt_tokens
+
+    @property
+    def context_retained(self) -> float:
+        """Return the fraction of the context tokens kept by the context selection."""
+        if self.context_tokens == 0:
+            return 1.0
+        return self.selected_context_tokens / self.context_tokens
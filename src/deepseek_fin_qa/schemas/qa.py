@@ -1,18 +1,20 @@
-import json
-import math
-from collections.abc import Iterator
+import functools
+from collections.abc import Iterable, Iterator, Mapping
 from pathlib import Path
+from typing import Any
 
 from pydantic import BaseModel
 
 from deepseek_fin_qa.log import LOG
 from deepseek_fin_qa.schemas.metrics import Accuracy, Score
 from deepseek_fin_qa.utils.evaluation import (
-    evaluate_program,
-    get_execution_match,
-    get_program_output_match,
-    list_to_markdown_table,
+    TABLE_FORMATS,
+    program_output,
+    strip_program,
 )
+from deepseek_fin_qa.utils.io import iter_json_array, iter_jsonl
+from deepseek_fin_qa.utils.records import record_from_qa, records_from_fin_qas
+from deepseek_fin_qa.utils.scoring import BatchScore, score_records, tally_scores
 
 
 class Answer(BaseModel):
@@ -24,17 +26,12 @@ class Answer(BaseModel):
     @property
     def stripped_program(self) -> str:
         """Return the program without any special characters."""
-        program = self.program
-        program = program.replace(" ", "")
-        program = program.replace("const_m", "-")
-        program = program.replace("const_", "")
-        program = program.replace("$", "")
-        return program.replace("%", "")
+        return strip_program(self.program)
 
     @property
     def program_output(self) -> float:
-        """Evaluate the program and return the output."""
-        return evaluate_program(self.stripped_program)
+        """Evaluate the program and return the output, memoised by program."""
+        return program_output(self.program)
 
 
 class QA(BaseModel):
@@ -46,24 +43,22 @@ class QA(BaseModel):
 
     @property
     def score(self) -> Score:
-        """Calculate the score for the QA pair."""
+        """Calculate the score for the QA pair, as a record."""
         if self.llm_answer is None:
             LOG.warning("Score not available for QA pair without LLM answer.")
             return Score(execution=False, program=False)
 
-        return Score(
-            execution=get_execution_match(
-                str(self.target_answer.value), str(self.llm_answer.value)
-            ),
-            program=get_program_output_match(
-                self.target_answer.program_output, self.llm_answer.program_output
-            ),
-        )
+        return score_records([record_from_qa(self)]).scores[0]
+
+
+# Fields the rendered context is made of
+CONTEXT_FIELDS = frozenset({"pre_text", "post_text", "table"})
 
 
 class FinQA(BaseModel):
     """Financial QA data with a list of questions."""
 
+    id: str | None = None
     qa_list: list[QA]
 
     pre_text: str
@@ -81,13 +76,52 @@ class FinQA(BaseModel):
     @property
     def context(self) -> str:
         """Return the context of the QA data."""
-        return f"""
+        return self.render_context()
+
+    def __setattr__(self, name: str, value: object) -> None:
+        """Set an attribute, dropping the rendered contexts if the data changes."""
+        super().__setattr__(name, value)
+        if name in CONTEXT_FIELDS:
+            self.__dict__.pop("contexts", None)
+
+    def model_copy(
+        self, *, update: Mapping[str, Any] | None = None, deep: bool = False
+    ) -> "FinQA":
+        """Copy the FinQA data, dropping the rendered contexts if the data changes."""
+        copy = super().model_copy(update=update, deep=deep)
+        if update and not CONTEXT_FIELDS.isdisjoint(update):
+            copy.__dict__.pop("contexts", None)
+        return copy
+
+    @functools.cached_property
+    def contexts(self) -> dict[str, str]:
+        """Return the contexts rendered so far, by table format."""
+        return {}
+
+    def render_context(self, table_format: str = "markdown") -> str:
+        """Return the context of the QA data with the table in the given format.
+
+        The context is rendered once per document and table format, as it is sent
+        with every turn of the conversation.
+
+        Args:
+            table_format (str, optional): One of `TABLE_FORMATS`. Defaults to
+                "markdown".
+
+        Returns:
+            str: The context.
+
+        """
+        context = self.contexts.get(table_format)
+        if context is None:
+            context = self.contexts[table_format] = f"""
         {self.pre_text}
 
-        {list_to_markdown_table(self.table)}
+        {TABLE_FORMATS[table_format](self.table)}
 
         {self.post_text}
         """
+        return context
 
 
 class FinQADataset(BaseModel):
@@ -105,13 +139,50 @@ class FinQADataset(BaseModel):
 
     @classmethod
     def from_file(cls, file_path: str) -> "FinQADataset":
-        """Load a FinQA dataset from a JSON file."""
-        # Load JSON data from the file and parse it into a dictionary
-        with Path(file_path).open("r") as f:
-            data = json.load(f)
+        """Load a FinQA dataset from a JSON or JSONL file."""
+        return cls(finqa_list=list(cls.iter_file(file_path)))
+
+    @staticmethod
+    def iter_file(
+        file_path: str,
+        limit: int | None = None,
+        offset: int = 0,
+        shard: tuple[int, int] | None = None,
+    ) -> Iterator[FinQA]:
+        """Iterate lazily over the FinQA data of a dataset file.
+
+        The records are parsed one at a time from either a JSON array or a JSONL
+        file (based on the `.jsonl` suffix), so the memory use does not depend on
+        the size of the dataset.
+
+        Args:
+            file_path (str): Path to the dataset file.
+            limit (int | None, optional): Maximum number of FinQA data to yield.
+                Defaults to None.
+            offset (int, optional): Number of records to skip. Defaults to 0.
+            shard (tuple[int, int] | None, optional): Only yield every n-th record
+                starting at i, given as (i, n). Defaults to None.
+
+        Yields:
+            FinQA: The FinQA data, keyed by their position in the file if they
+                have no id.
+
+        """
+        records = (
+            iter_jsonl(file_path)
+            if Path(file_path).suffix == ".jsonl"
+            else iter_json_array(file_path)
+        )
+
+        n = 0
+        for i, fin_qa in enumerate(records):
+            if limit is not None and n >= limit:
+                break
+            if i < offset:
+                continue
+            if shard and (i - offset) % shard[1] != shard[0]:
+                continue
 
-        finqa_list = []
-        for fin_qa in data:
             # Create QA object for each data key starting with "qa"
             qa_list = [
                 QA(
@@ -126,29 +197,47 @@ class FinQADataset(BaseModel):
             ]
 
             # Combine QA objects into a FinQA object with context data
-            finqa_list.append(
-                FinQA(
-                    pre_text="\n".join(fin_qa["pre_text"]),
-                    post_text="\n".join(fin_qa["post_text"]),
-                    table=fin_qa["table_ori"],
-                    qa_list=qa_list,
-                )
+            yield FinQA(
+                id=fin_qa.get("id") or str(i),
+                pre_text="\n".join(fin_qa["pre_text"]),
+                post_text="\n".join(fin_qa["post_text"]),
+                table=fin_qa["table_ori"],
+                qa_list=qa_list,
             )
+            n += 1
 
-        return cls(finqa_list=finqa_list)
+    @staticmethod
+    def iter_answered(file_path: str) -> Iterator[FinQA]:
+        """Iterate over the answered FinQA data of an output file.
+
+        JSONL files are read lazily, JSON files written with `model_dump_json` are
+        loaded at once.
+        """
+        if Path(file_path).suffix != ".jsonl":
+            with Path(file_path).open("r") as f:
+                yield from FinQADataset.model_validate_json(f.read())
+            return
+
+        for data in iter_jsonl(file_path):
+            yield FinQA.model_validate(data)
 
     @property
     def score(self) -> Accuracy:
         """Calculate the mean accuracy of the answered FinQA dataset."""
-        execution_score = 0
-        program_score = 0
-        n = 0
+        return accuracy(self)
+
+    def score_batch(self) -> BatchScore:
+        """Score all QA pairs of the dataset at once, in iteration order."""
+        return score_records(list(records_from_fin_qas(self)))
+
 
-        for fin_qa in self:
-            for qa in fin_qa:
-                if qa.llm_answer:
-                    execution_score += qa.score.execution
-                    program_score += qa.score.program
-                    n += 1
+def accuracy(fin_qas: Iterable[FinQA], batch_size: int = 4096) -> Accuracy:
+    """Calculate the mean accuracy of answered FinQA data in a single pass.
 
-        return Accuracy(execution=execution_score / n, program=program_score / n)
+    The QA pairs are scored as records in batches, so the data can be streamed
+    from disk.
+    """
+    tally = tally_scores(fin_qas, batch_size).total
+    if tally.n == 0:
+        LOG.warning("Accuracy not available for a dataset without LLM answers.")
+    return tally.accuracy
@@ -1,3 +1,5 @@
+from typing import Literal
+
 import dotenv
 from pydantic_settings import BaseSettings
 
@@ -12,6 +14,51 @@ class Settings(BaseSettings):
 
     base_url: str | None = None
     api_key: str | None = None
+    request_timeout: float = 120
+
+    # Ollama model loading and request sizing
+    keep_alive: str = "30m"
+    num_predict: int | None = None
+    max_context_window: int = 32768
+
+    # Groq rate limits and retries, unset budgets are not enforced
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    max_retries: int = 6
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 60.0
+
+    # Stream responses and stop generating once the answer is complete, or force
+    # an answer when the reasoning exceeds the budget of tokens
+    early_stop: bool = False
+    think_token_budget: int | None = None
+
+    # Answer every question by a majority vote over up to this many samples drawn
+    # at the temperature, stopping as soon as a quorum (default majority) agrees
+    samples: int = 1
+    sample_quorum: int | None = None
+    sample_temperature: float = 0.6
+
+    cache_backend: str = "sqlite"
+    cache_url: str | None = None
+    cache_memory_bytes: int = 64 << 20
+    # Look up responses cached under the keys used before the canonical keys on a
+    # miss, costs a second backend lookup per miss, see scripts/rekey_cache.py
+    cache_legacy_lookup: bool = False
+
+    # Send the context with every question or only with the first one
+    context_mode: Literal["every_turn", "once"] = "every_turn"
+
+    # Keep only the sentences and table rows most relevant to the question, within
+    # this estimated number of tokens, unset to send the whole context
+    context_token_budget: int | None = None
+
+    # Ask the question before or after the context, the cached responses of one
+    # order are not found with the other
+    prompt_order: Literal["question_first", "context_first"] = "question_first"
+
+    # Rendering of the table in the context, see `TABLE_FORMATS`
+    table_format: Literal["markdown", "compact_markdown", "csv", "tsv"] = "markdown"
 
 
 settings = Settings()
@@ -1,25 +1,41 @@
+import contextlib
 import hashlib
 import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, BinaryIO
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
 
-class ChatCache:
-    """A class for caching chat queries and their corresponding values."""
+from deepseek_fin_qa.log import LOG
 
-    def __init__(self, path: Path) -> None:
-        """Initialize the ChatCache object.
+# Bump when the canonical query changes, keys of older versions are then missed
+CACHE_KEY_VERSION = 1
 
-        Args:
-            path (Path): The path to the cache file.
 
-        """
-        self.path = path
+class ChatCache(ABC):
+    """Base class for caching chat queries and their corresponding values.
 
-        if self.path.exists():
-            with self.path.open("r") as file:
-                self.cache = json.load(file)
-        else:
-            self.cache = {}
+    Queries are stored under the sha256 hash of their text, the storage itself is
+    implemented by the backends.
+    """
+
+    @staticmethod
+    def key(query: str) -> str:
+        """Return the cache key for a given query."""
+        return hashlib.sha256(query.encode()).hexdigest()
 
     def get(self, query: str) -> str | None:
         """Retrieve the cached value for a given query.
@@ -31,8 +47,7 @@ class ChatCache:
             str | None: The cached value if found, None otherwise.
 
         """
-        key = hashlib.sha256(query.encode()).hexdigest()
-        return self.cache.get(key)
+        return self.get_key(self.key(query))
 
     def set(self, query: str, value: str) -> None:
         """Set the cached value for a given query.
@@ -42,8 +57,684 @@ class ChatCache:
             value (str): The value to be cached.
 
         """
-        key = hashlib.sha256(query.encode()).hexdigest()
+        self.set_key(self.key(query), value)
+
+    @abstractmethod
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+
+    @abstractmethod
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
+
+    @abstractmethod
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+
+    def __len__(self) -> int:
+        """Return the number of cached values."""
+        return len(self.items())
+
+    def close(self) -> None:  # noqa: B027
+        """Release any resources held by the cache."""
+
+
+class FileChatCache(ChatCache):
+    """Base class for caches stored at a local path."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the FileChatCache object.
+
+        Args:
+            path (Path): The path to the cache file.
+
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+
+class JSONChatCache(FileChatCache):
+    """Legacy cache storing everything in a single JSON file.
+
+    The whole file is rewritten on every set, so it is only kept for reading old
+    caches and for small experiments.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the JSONChatCache object.
+
+        Args:
+            path (Path): The path to the cache file.
+
+        """
+        super().__init__(path)
+
+        if self.path.exists():
+            with self.path.open("r") as file:
+                self.cache = json.load(file)
+        else:
+            self.cache = {}
+
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+        return self.cache.get(key)
+
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
         self.cache[key] = value
 
         with self.path.open("w") as file:
             json.dump(self.cache, file)
+
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+        return list(self.cache.items())
+
+
+class JSONLChatCache(FileChatCache):
+    """Append-only cache storing one JSON record per line.
+
+    Every set appends a single line, so writes are O(1) and a crash can at most
+    lose the last, partially written record, which is terminated by the next set
+    and skipped on load. The file
+    is indexed lazily on the first lookup and records appended by other processes
+    are picked up on a cache miss. Use `compact` to drop overwritten records.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the JSONLChatCache object.
+
+        Args:
+            path (Path): The path to the cache file.
+
+        """
+        super().__init__(path)
+
+        self.cache: dict[str, str] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """Read the records appended since the last refresh."""
+        if not self.path.exists():
+            return
+
+        with self.path.open("rb") as file:
+            file.seek(self._offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # Record still being written
+                self._offset += len(line)
+                try:
+                    record = json.loads(line)
+                    self.cache[record["key"]] = record["value"]
+                except (ValueError, KeyError):
+                    LOG.warning(f"Skipping corrupted cache record in {self.path}")
+
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+        with self._lock:
+            if key not in self.cache:
+                self._refresh()
+            return self.cache.get(key)
+
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
+        line = json.dumps({"key": key, "value": value}) + "\n"
+
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                # Terminate a record truncated by a crash, so the two don't fuse
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    line = "\n" + line
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+            self.cache[key] = value
+
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+        with self._lock:
+            self._refresh()
+            return list(self.cache.items())
+
+    def compact(self) -> None:
+        """Rewrite the log keeping only the latest record for every key.
+
+        Should not be run while other processes are writing to the cache.
+        """
+        items = self.items()
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp_path.open("w") as file:
+            for key, value in items:
+                file.write(json.dumps({"key": key, "value": value}) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        tmp_path.replace(self.path)
+
+        with self._lock:
+            self._offset = self.path.stat().st_size
+
+
+class SQLiteChatCache(FileChatCache):
+    """Cache stored in an SQLite table in WAL mode.
+
+    Lookups are done on demand and every set is a single-row transaction, which
+    makes the cache safe to share between several writer processes.
+    """
+
+    def __init__(self, path: Path, timeout: float = 30) -> None:
+        """Initialize the SQLiteChatCache object.
+
+        Args:
+            path (Path): The path to the database file.
+            timeout (float, optional): Seconds to wait for a locked database.
+                Defaults to 30.
+
+        """
+        super().__init__(path)
+
+        self.timeout = timeout
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Return the database connection, opening it on first use."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,  # Autocommit every statement
+                check_same_thread=False,
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+        return self._connection
+
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+        with self._lock:
+            return self.connection.execute("SELECT key, value FROM cache").fetchall()
+
+    def __len__(self) -> int:
+        """Return the number of cached values."""
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class BlobChatCache(FileChatCache):
+    """Content-addressed cache storing every value in its own file.
+
+    The files are spread over 256 shard directories by the first characters of
+    their key. Every value is written to a temporary file and renamed into place,
+    so any number of processes, also on different hosts sharing the directory,
+    can read and write the cache at the same time.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the BlobChatCache object.
+
+        Args:
+            path (Path): The path to the cache directory.
+
+        """
+        super().__init__(path)
+        self.path.mkdir(exist_ok=True)
+
+    def _blob_path(self, key: str) -> Path:
+        """Return the path of the file storing the value of a key."""
+        digest = key.rpartition("-")[2]
+        return self.path / digest[:2] / key
+
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+        try:
+            return self._blob_path(key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
+        path = self._blob_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}")
+        tmp_path.write_text(value)
+        tmp_path.replace(path)
+
+    def _blob_paths(self) -> list[Path]:
+        """Return the paths of all stored values."""
+        if not self.path.exists():
+            return []
+        return [
+            path
+            for shard in self.path.iterdir()
+            if shard.is_dir()
+            for path in shard.iterdir()
+            if not path.name.startswith(".")
+        ]
+
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+        return [(path.name, path.read_text()) for path in self._blob_paths()]
+
+    def __len__(self) -> int:
+        """Return the number of cached values."""
+        return len(self._blob_paths())
+
+
+type RedisReply = str | int | list[RedisReply] | None
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server."""
+
+
+class RedisChatCache(ChatCache):
+    """Cache stored in a Redis compatible key-value server.
+
+    Speaks the Redis serialization protocol directly over a socket, so several
+    workers on different hosts can share one cache without extra dependencies.
+    The keys of all models share one namespace, as the model name is part of
+    every cache key.
+    """
+
+    def __init__(
+        self, url: str, namespace: str = "deepseek-fin-qa", timeout: float = 30
+    ) -> None:
+        """Initialize the RedisChatCache object.
+
+        Args:
+            url (str): Server URL, e.g. "redis://:password@localhost:6379/0".
+            namespace (str, optional): Prefix of the stored keys. Defaults to
+                "deepseek-fin-qa".
+            timeout (float, optional): Socket timeout in seconds. Defaults to 30.
+
+        """
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != "redis":
+            msg = f"Unsupported cache URL {url!r}, expected redis://host:port/db"
+            raise ValueError(msg)
+
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.namespace = namespace
+        self.timeout = timeout
+        self._file: BinaryIO | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> BinaryIO:
+        """Open the connection to the server, authenticating if needed."""
+        connection = socket.create_connection((self.host, self.port), self.timeout)
+        self._file = connection.makefile("rwb")
+        connection.close()  # The file keeps the socket open
+        if self.password:
+            self._execute("AUTH", self.password)
+        if self.db:
+            self._execute("SELECT", str(self.db))
+        return self._file
+
+    def _read_reply(self) -> RedisReply:
+        """Read a single reply from the server."""
+        assert self._file is not None  # noqa: S101
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            msg = "Connection to the cache server closed"
+            raise ConnectionError(msg)
+
+        kind, data = line[:1], line[1:-2]
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            raise RedisError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            if int(data) < 0:
+                return None
+            value = self._file.read(int(data) + 2)[:-2]
+            return value.decode()
+        if kind == b"*":
+            if int(data) < 0:
+                return None
+            return [self._read_reply() for _ in range(int(data))]
+
+        msg = f"Invalid reply from the cache server: {line!r}"
+        raise RedisError(msg)
+
+    def _execute(self, *args: str) -> RedisReply:
+        """Send a command and return its reply."""
+        file = self._file or self._connect()
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            encoded = arg.encode()
+            parts.append(b"$%d\r\n%b\r\n" % (len(encoded), encoded))
+        file.write(b"".join(parts))
+        file.flush()
+        return self._read_reply()
+
+    def _command(self, *args: str) -> RedisReply:
+        """Run a command, reconnecting once if the connection was lost."""
+        with self._lock:
+            try:
+                return self._execute(*args)
+            except (ConnectionError, OSError):
+                self._close()
+                return self._execute(*args)
+
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+        return self._command("GET", f"{self.namespace}:{key}")
+
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
+        self._command("SET", f"{self.namespace}:{key}", value)
+
+    def _keys(self) -> list[str]:
+        """Return all stored keys of the namespace."""
+        keys: list[str] = []
+        cursor = "0"
+        while True:
+            cursor, batch = self._command(
+                "SCAN", cursor, "MATCH", f"{self.namespace}:*", "COUNT", "1000"
+            )
+            keys.extend(batch)
+            if cursor == "0":
+                return keys
+
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+        keys = self._keys()
+        values = self._command("MGET", *keys) if keys else []
+        prefix = len(self.namespace) + 1
+        return [
+            (key[prefix:], value)
+            for key, value in zip(keys, values, strict=True)
+            if value is not None
+        ]
+
+    def __len__(self) -> int:
+        """Return the number of cached values."""
+        return len(self._keys())
+
+    def _close(self) -> None:
+        if self._file is not None:
+            with contextlib.suppress(OSError):
+                self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        """Close the connection to the server."""
+        with self._lock:
+            self._close()
+
+
+@dataclass
+class CacheStats:
+    """Lookup counters of a cache."""
+
+    memory_hits: int = 0
+    hits: int = 0
+    misses: int = 0
+    lookup_seconds: float = 0.0
+
+    @property
+    def lookups(self) -> int:
+        """Return the number of lookups."""
+        return self.memory_hits + self.hits + self.misses
+
+    @property
+    def hit_ratio(self) -> float:
+        """Return the fraction of lookups found in the cache."""
+        return (self.memory_hits + self.hits) / self.lookups if self.lookups else 0.0
+
+    @property
+    def mean_lookup_seconds(self) -> float:
+        """Return the mean latency of the lookups that reached the backend."""
+        backend_lookups = self.hits + self.misses
+        return self.lookup_seconds / backend_lookups if backend_lookups else 0.0
+
+
+class MemoryChatCache(ChatCache):
+    """In-process LRU front for another cache.
+
+    Recently used values are kept in memory up to a total size, the least
+    recently used ones are evicted first. Lookups are counted in `stats`.
+    """
+
+    def __init__(self, backend: ChatCache, max_bytes: int = 64 << 20) -> None:
+        """Initialize the MemoryChatCache object.
+
+        Args:
+            backend (ChatCache): The cache behind the memory front.
+            max_bytes (int, optional): Maximum size of the values kept in memory.
+                Defaults to 64 MB.
+
+        """
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._values: OrderedDict[str, str] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        return len(key) + len(value.encode())
+
+    def _remember(self, key: str, value: str) -> None:
+        """Keep a value in memory, evicting the least recently used ones."""
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._values:
+                self._size -= self._entry_size(key, self._values.pop(key))
+            self._values[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                old_key, old_value = self._values.popitem(last=False)
+                self._size -= self._entry_size(old_key, old_value)
+
+    def get_key(self, key: str) -> str | None:
+        """Retrieve the cached value for a given cache key."""
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+                self.stats.memory_hits += 1
+                return value
+
+        start = time.perf_counter()
+        value = self.backend.get_key(key)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.stats.lookup_seconds += elapsed
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set_key(self, key: str, value: str) -> None:
+        """Set the cached value for a given cache key."""
+        self.backend.set_key(key, value)
+        self._remember(key, value)
+
+    def items(self) -> list[tuple[str, str]]:
+        """Return all cached key-value pairs."""
+        return self.backend.items()
+
+    def __len__(self) -> int:
+        """Return the number of cached values."""
+        return len(self.backend)
+
+    def close(self) -> None:
+        """Release the resources held by the backend."""
+        self.backend.close()
+
+
+CACHE_BACKENDS: dict[str, tuple[type[ChatCache], str]] = {
+    "json": (JSONChatCache, ".json"),
+    "jsonl": (JSONLChatCache, ".jsonl"),
+    "sqlite": (SQLiteChatCache, ".sqlite"),
+    "blob": (BlobChatCache, ".blobs"),
+}
+
+
+def migrate_cache(src: ChatCache, dst: ChatCache) -> int:
+    """Copy all entries from one cache into another.
+
+    Args:
+        src (ChatCache): The cache to copy from.
+        dst (ChatCache): The cache to copy to.
+
+    Returns:
+        int: The number of copied entries.
+
+    """
+    n = 0
+    for key, value in src.items():
+        dst.set_key(key, value)
+        n += 1
+    return n
+
+
+def open_cache(
+    path: Path, backend: str = "sqlite", url: str | None = None
+) -> ChatCache:
+    """Open a chat cache, migrating an existing JSON cache on first use.
+
+    Args:
+        path (Path): The path to the cache without the file suffix.
+        backend (str, optional): The name of the cache backend, one of
+            `CACHE_BACKENDS` or "redis". Defaults to "sqlite".
+        url (str | None, optional): The server URL of the "redis" backend.
+            Defaults to a local server.
+
+    Returns:
+        ChatCache: The opened cache.
+
+    """
+    if backend == "redis":
+        return RedisChatCache(url or "redis://localhost:6379/0")
+
+    cache_cls, suffix = CACHE_BACKENDS[backend]
+    cache_path = Path(f"{path}{suffix}")
+    legacy_path = Path(f"{path}.json")
+
+    if (
+        cache_cls is not JSONChatCache
+        and legacy_path.exists()
+        and not cache_path.exists()
+    ):
+        # Write into a temporary file so that an interrupted migration is retried
+        tmp_path = Path(f"{path}.migrating-{os.getpid()}{suffix}")
+        tmp_cache = cache_cls(tmp_path)
+        n = migrate_cache(JSONChatCache(legacy_path), tmp_cache)
+        tmp_cache.close()
+        tmp_path.replace(cache_path)
+        LOG.info(f"Migrated {n} cached responses from {legacy_path} to {cache_path}")
+
+    return cache_cls(cache_path)
+
+
+def normalise_whitespace(text: str) -> str:
+    """Collapse all runs of whitespace into single spaces."""
+    return " ".join(text.split())
+
+
+def canonical_query(
+    messages: Iterable[tuple[str, str]],
+    model: str,
+    params: dict[str, Any] | None = None,
+) -> str:
+    """Return the canonical text of a chat request, see `cache_key`."""
+    return json.dumps(
+        {
+            "version": CACHE_KEY_VERSION,
+            "model": model,
+            "params": params or {},
+            "messages": [
+                [role, normalise_whitespace(content)] for role, content in messages
+            ],
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def cache_key(
+    messages: Iterable[tuple[str, str]],
+    model: str,
+    params: dict[str, Any] | None = None,
+) -> str:
+    """Return the versioned cache key of a chat request.
+
+    The key only depends on the roles and contents of the messages, with the
+    whitespace normalised, the model name and the generation parameters. It does
+    not change with library upgrades or with the indentation of the prompts.
+
+    Args:
+        messages (Iterable[tuple[str, str]]): The role and content of every message.
+        model (str): The name of the model.
+        params (dict[str, Any] | None, optional): Generation parameters that
+            change the response. Defaults to None.
+
+    Returns:
+        str: The cache key.
+
+    """
+    query = canonical_query(messages, model, params)
+    return f"v{CACHE_KEY_VERSION}-{ChatCache.key(query)}"
+
+
+def legacy_query(messages: Iterable[tuple[str, str]]) -> str:
+    """Return the query that responses were cached under before `cache_key`.
+
+    This is the repr of a list of llama-index 0.12 chat messages, rebuilt from
+    the roles and contents, so old caches can be read after library upgrades.
+    """
+    reprs = [
+        f"ChatMessage(role=<MessageRole.{role.upper()}: {role!r}>, "
+        f"additional_kwargs={{}}, blocks=[TextBlock(block_type='text', "
+        f"text={content!r})])"
+        for role, content in messages
+    ]
+    return f"[{', '.join(reprs)}]"
@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+
+# Number of documents the model can reorder its requests within
+REQUEST_WINDOW = 64
+
+
+async def ordered_map[T, R](
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    concurrency: int,
+    window: int | None = None,
+    order: Callable[[list[T]], list[int]] | None = None,
+) -> AsyncIterator[R]:
+    """Apply an async function to items concurrently, yielding results in order.
+
+    At most `concurrency` calls run at the same time and at most `window` items
+    are read ahead of the oldest unfinished one, so the memory use stays bounded
+    even for lazily loaded inputs.
+
+    With an `order`, the items are read in consecutive windows and the calls of
+    every window are started in the order it returns for the window, e.g.
+    `BaseModelWrapper.request_order`. The next window is read while the results
+    of the current one are yielded, so up to two windows are scheduled. The
+    results keep the input order.
+
+    Args:
+        func (Callable): The async function to apply.
+        items (Iterable): The items to process.
+        concurrency (int): The maximum number of concurrent calls.
+        window (int | None, optional): The maximum number of scheduled items.
+            Defaults to 4 times the concurrency.
+        order (Callable | None, optional): Returns the indices of a window of
+            items in the order to start them. Defaults to the input order.
+
+    Yields:
+        The results in the order of the input items.
+
+    """
+    if concurrency < 1:
+        msg = f"Concurrency must be at least 1, got {concurrency}"
+        raise ValueError(msg)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    window = max(window or 4 * concurrency, concurrency)
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await func(item)
+
+    if order is not None:
+        async for result in _map_windows(run, items, window, order):
+            yield result
+        return
+
+    pending: deque[asyncio.Task[R]] = deque()
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            pending.append(asyncio.create_task(run(item)))
+            if len(pending) >= window:
+                yield await pending.popleft()
+
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _map_windows[T, R](
+    run: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    window: int,
+    order: Callable[[list[T]], list[int]],
+) -> AsyncIterator[R]:
+    """Start the calls of every window in the given order, see `ordered_map`.
+
+    The calls of the next window are created while the results of the current
+    one are yielded, so the window boundaries do not hold back the calls.
+    """
+    pending: deque[list[asyncio.Task[R]]] = deque()
+    try:
+        for batch in itertools.batched(items, window):
+            # The tasks acquire the semaphore in the order they are created
+            tasks = {i: asyncio.create_task(run(batch[i])) for i in order(list(batch))}
+            pending.append([tasks[i] for i in range(len(batch))])
+            if len(pending) > 1:
+                for task in pending[0]:
+                    yield await task
+                pending.popleft()
+
+        while pending:
+            for task in pending[0]:
+                yield await task
+            pending.popleft()
+    finally:
+        for tasks in pending:
+            for task in tasks:
+                task.cancel()
+
+
+def iterate_async[R](iterator: AsyncIterator[R]) -> Iterator[R]:
+    """Consume an async iterator from synchronous code.
+
+    The iterator runs on a private event loop, which only runs while the next item
+    is awaited, so background tasks make progress between the yielded items.
+
+    Args:
+        iterator (AsyncIterator): The async iterator to consume.
+
+    Yields:
+        The items of the async iterator.
+
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(iterator))
+            except StopAsyncIteration:
+                break
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            loop.run_until_complete(aclose())
+        loop.close()
+
+
+class SingleFlight[K, R]:
+    """Coalesce concurrent calls with the same key into a single call.
+
+    The first call with a key runs, calls with the same key made while it is in
+    flight wait for its result instead of running again. Nothing is kept once the
+    call finished, so later calls run again.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the SingleFlight."""
+        self._calls: dict[K, asyncio.Future[R]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of calls in flight."""
+        return len(self._calls)
+
+    async def run(self, key: K, func: Callable[[], Awaitable[R]]) -> tuple[R, bool]:
+        """Run the call for a key, or wait for the one in flight.
+
+        Args:
+            key (K): The key of the call.
+            func (Callable): The async function to call.
+
+        Returns:
+            tuple[R, bool]: The result, and whether it was shared with the call
+                already in flight.
+
+        """
+        if (future := self._calls.get(key)) is not None:
+            # Shielded, so that a cancelled follower does not cancel the call
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as ex:
+            future.set_exception(ex)
+            future.exception()  # Retrieved, even if nobody waits for it
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result, False
@@ -1,15 +1,36 @@
+import csv
+import functools
+import io
 import math
+import operator
 import re
+from collections.abc import Callable
 from math import ceil, floor
 from typing import Literal
 
 from deepseek_fin_qa.log import LOG
 
+NUMBER_REGEX = re.compile(r"[-+]?\d*\.?\d+")
+TOKEN_REGEX = re.compile(r"(-?(?:\d+\.?\d*|\.\d+))|([a-z]+)|([(),])")
+LEGACY_OP_REGEX = re.compile(
+    r"(add|subtract|multiply|divide|greater|exp)\(([-\d.]+,[-\d.]+)\)"
+)
+
+OPERATIONS: dict[str, Callable[[float, float], float]] = {
+    "add": operator.add,
+    "subtract": operator.sub,
+    "multiply": operator.mul,
+    "divide": operator.truediv,
+    "exp": operator.pow,
+}
+
+# A program is either a number or an operation applied to two sub-programs
+type Program = float | tuple[str, Program, Program]
+
 
 def str_to_float(value: str) -> float:
     """Convert a string to a float using regex matching."""
-    num_regex = re.compile(r"[-+]?\d*\.?\d+")
-    match = num_regex.search(value)
+    match = NUMBER_REGEX.search(value)
 
     if match:
         return float(match.group())
@@ -18,13 +39,125 @@ def str_to_float(value: str) -> float:
     return math.nan
 
 
+def strip_program(program: str) -> str:
+    """Return the program without any special characters."""
+    program = program.replace(" ", "")
+    program = program.replace("const_m", "-")
+    program = program.replace("const_", "")
+    program = program.replace("$", "")
+    return program.replace("%", "")
+
+
+class _UnsupportedProgramError(ValueError):
+    """Program that can not be compiled and needs the fallback evaluation."""
+
+
+def _parse_program(tokens: list[tuple[str, str, str]], pos: int) -> tuple[Program, int]:
+    """Parse the program starting at a token position.
+
+    Returns:
+        The parsed program and the position of the next token.
+
+    """
+    number, name, _ = tokens[pos]
+    if number:
+        return float(number), pos + 1
+
+    if name not in OPERATIONS and name != "greater":
+        raise _UnsupportedProgramError(name)
+
+    # The operation is followed by two arguments in parentheses
+    if tokens[pos + 1][2] != "(":
+        raise _UnsupportedProgramError(name)
+    left, pos = _parse_program(tokens, pos + 2)
+    if tokens[pos][2] != ",":
+        raise _UnsupportedProgramError(name)
+    right, pos = _parse_program(tokens, pos + 1)
+    if tokens[pos][2] != ")":
+        raise _UnsupportedProgramError(name)
+
+    # Comparisons are only supported as the outermost operation
+    if isinstance(left, tuple) and left[0] == "greater":
+        raise _UnsupportedProgramError(name)
+    if isinstance(right, tuple) and right[0] == "greater":
+        raise _UnsupportedProgramError(name)
+
+    return (name, left, right), pos + 1
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def compile_program(code: str) -> Program | None:
+    """Parse a program into a tree, returning None if it is not well-formed.
+
+    The results are memoised, as the same programs are evaluated on every score.
+    """
+    tokens = []
+    end = 0
+    for match in TOKEN_REGEX.finditer(code):
+        if match.start() != end:
+            return None  # Unknown characters between tokens
+        tokens.append(match.groups(""))
+        end = match.end()
+    if not tokens or end != len(code):
+        return None
+
+    try:
+        program, pos = _parse_program(tokens, 0)
+    except (_UnsupportedProgramError, IndexError):
+        return None
+    return program if pos == len(tokens) else None
+
+
+def _run_program(program: Program) -> float:
+    """Evaluate a compiled program."""
+    if isinstance(program, float):
+        return program
+
+    operation, left, right = program
+    result = OPERATIONS[operation](_run_program(left), _run_program(right))
+    if isinstance(result, complex):
+        raise _UnsupportedProgramError(operation)
+    return result
+
+
 def evaluate_program(code: str) -> float | str:
     """Safe evaluation of a mathematical expression."""
+    program = compile_program(code)
+
+    if program is not None:
+        try:
+            if isinstance(program, tuple) and program[0] == "greater":
+                # Some operations expect a string result
+                _, left, right = program
+                return "yes" if _run_program(left) > _run_program(right) else "no"
+            return _run_program(program)
+        except _UnsupportedProgramError:
+            pass
+
+    return _evaluate_program_legacy(code)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def program_output(program: str) -> float | str:
+    """Evaluate an answer program, memoised by program, see `evaluate_program`.
+
+    Programs that fail to evaluate, e.g. dividing by zero, output NaN, which
+    matches no other output, so they only fail their own question.
+    """
+    try:
+        return evaluate_program(strip_program(program))
+    except (ZeroDivisionError, OverflowError):
+        return math.nan
+
+
+def _evaluate_program_legacy(code: str) -> float | str:
+    """Evaluate a program by repeatedly rewriting its innermost operation.
+
+    Used for programs that are not well-formed, e.g. with trailing text, which are
+    evaluated on a best-effort basis.
+    """
     # Find operation that can be evaluated
-    op_regex = re.compile(
-        r"(add|subtract|multiply|divide|greater|exp)\(([-\d.]+,[-\d.]+)\)"
-    )
-    match = op_regex.search(code)
+    match = LEGACY_OP_REGEX.search(code)
 
     while match:
         # Parse operation and operands
@@ -50,7 +183,7 @@ def evaluate_program(code: str) -> float | str:
 
         # Replace operation with result and move to next operation
         code = code.replace(match.group(), str(result))
-        match = op_regex.search(code)
+        match = LEGACY_OP_REGEX.search(code)
 
     return str_to_float(code)
 
@@ -64,13 +197,59 @@ def list_to_markdown_table(data: list[list[str]]) -> str:
     headers = data[0]  # First row as headers
     rows = data[1:]  # Remaining data
 
-    # Create Markdown table format
-    markdown = "| " + " | ".join(headers) + " |\n"
-    markdown += "| " + " | ".join(["---"] * len(headers)) + " |\n"
-    for row in rows:
-        markdown += "| " + " | ".join(map(str, row)) + " |\n"
+    # Create Markdown table format, joined once instead of growing a string
+    lines = [
+        "| " + " | ".join(headers) + " |",
+        "| " + " | ".join(["---"] * len(headers)) + " |",
+    ]
+    lines += ["| " + " | ".join(map(str, row)) + " |" for row in rows]
+    return "\n".join(lines) + "\n"
+
+
+def _clean_rows(data: list[list[str]]) -> list[list[str]]:
+    """Collapse the whitespace of every cell and pad the rows to the header."""
+    width = len(data[0])
+    return [
+        [" ".join(str(cell).split()) for cell in row] + [""] * (width - len(row))
+        for row in data
+    ]
+
+
+def list_to_compact_markdown_table(data: list[list[str]]) -> str:
+    """Convert a list of lists into a Markdown table without padding."""
+    if not data:
+        return ""
+
+    headers, *rows = _clean_rows(data)
+    lines = ["|" + "|".join(headers) + "|", "|" + "|".join(["-"] * len(headers)) + "|"]
+    lines += ["|" + "|".join(row) + "|" for row in rows]
+    return "\n".join(lines) + "\n"
+
+
+def list_to_csv_table(data: list[list[str]], delimiter: str = ",") -> str:
+    """Convert a list of lists into CSV, or TSV with a tab delimiter."""
+    if not data:
+        return ""
+
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=delimiter, lineterminator="\n").writerows(
+        _clean_rows(data)
+    )
+    return buffer.getvalue()
+
+
+def list_to_tsv_table(data: list[list[str]]) -> str:
+    """Convert a list of lists into tab separated values."""
+    return list_to_csv_table(data, delimiter="\t")
 
-    return markdown
+
+# Table renderings of the context, selectable with the table format setting
+TABLE_FORMATS: dict[str, Callable[[list[list[str]]], str]] = {
+    "markdown": list_to_markdown_table,
+    "compact_markdown": list_to_compact_markdown_table,
+    "csv": list_to_csv_table,
+    "tsv": list_to_tsv_table,
+}
 
 
 def float_round(
@@ -93,13 +272,11 @@ def get_execution_match(target_value: str, llm_value: str) -> bool:
         llm_value = llm_value.strip("-")
 
     # Strip punctuation and spaces from both values
-    target_value = target_value.replace(
-        "%", "").replace(",", "").replace(" ", "")
+    target_value = target_value.replace("%", "").replace(",", "").replace(" ", "")
     llm_value = llm_value.replace("%", "").replace(",", "").replace(" ", "")
 
     # Round the llm value to match the target value's precision
-    target_rounding = len(target_value.split(
-        ".")[1]) if "." in target_value else 0
+    target_rounding = len(target_value.split(".")[1]) if "." in target_value else 0
 
     llm_value_f = str_to_float(llm_value)
     target_value_f = str_to_float(target_value)
@@ -109,12 +286,9 @@ def get_execution_match(target_value: str, llm_value: str) -> bool:
 
     # The rounding in dataset is not consistent
     # so we need to check multiple rounding options
-    return (
-        math.isclose(target_value_f, float_round(
-            llm_value_f, target_rounding, ceil))
-        or math.isclose(target_value_f,
-                        float_round(llm_value_f, target_rounding, floor))
-    )
+    return math.isclose(
+        target_value_f, float_round(llm_value_f, target_rounding, ceil)
+    ) or math.isclose(target_value_f, float_round(llm_value_f, target_rounding, floor))
 
 
 def get_program_output_match(target_value: str | float, llm_value: str | float) -> bool:
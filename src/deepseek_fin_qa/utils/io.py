@@ -0,0 +1,200 @@
+import json
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Self, TextIO
+
+from pydantic import BaseModel
+
+from deepseek_fin_qa.log import LOG
+
+
+def iter_jsonl(
+    path: str | Path, start: int = 0, end: int | None = None
+) -> Iterator[Any]:
+    """Iterate over the records of a JSONL file.
+
+    A truncated last line, e.g. left behind by a crash, is skipped. A byte range
+    can be given to read only a part of the file, in which case the lines starting
+    within the range are read, so that adjacent ranges do not overlap.
+
+    Args:
+        path (str | Path): Path to the JSONL file.
+        start (int, optional): Byte offset to start reading at. Defaults to 0.
+        end (int | None, optional): Byte offset to stop reading at. Defaults to
+            None, which reads until the end of the file.
+
+    Yields:
+        The parsed records.
+
+    """
+    with Path(path).open("rb") as f:
+        if start > 0:
+            # Skip the line started in the previous range
+            f.seek(start - 1)
+            f.readline()
+
+        while end is None or f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                LOG.warning(f"Skipping malformed line in {path}")
+
+
+def split_file(path: str | Path, chunk_size: int) -> list[tuple[int, int]]:
+    """Split a file into byte ranges of roughly equal size, see `iter_jsonl`."""
+    size = Path(path).stat().st_size
+    return [
+        (start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)
+    ] or [(0, 0)]
+
+
+# Characters that can follow a complete item of a JSON array
+ITEM_DELIMITERS = frozenset(",] \t\r\n")
+
+
+class _ChunkedBuffer:
+    """Text buffer filled from a file one chunk at a time."""
+
+    def __init__(self, file: TextIO, chunk_size: int) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> None:
+        """Drop the consumed text and read the next chunk."""
+        chunk = self.file.read(self.chunk_size)
+        self.eof = not chunk
+        self.text = self.text[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character, or "" at the end of file."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.text) or self.eof:
+                return self.text[self.pos : self.pos + 1]
+            self.fill()
+
+
+def iter_json_array(path: str | Path, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Iterate over the items of a top-level JSON array without loading the file.
+
+    The file is read in chunks and every item is decoded as soon as it has been
+    read completely, so only one item is held in memory at a time.
+
+    Args:
+        path (str | Path): Path to the JSON file.
+        chunk_size (int, optional): Number of characters read at a time.
+            Defaults to 65536.
+
+    Yields:
+        The parsed items of the array.
+
+    """
+    decoder = json.JSONDecoder()
+
+    with Path(path).open("r") as f:
+        buffer = _ChunkedBuffer(f, chunk_size)
+
+        if buffer.peek() != "[":
+            msg = f"Expected a JSON array in {path}"
+            raise ValueError(msg)
+        buffer.pos += 1
+
+        separator = buffer.peek()
+        while separator != "]":
+            try:
+                item, end = decoder.raw_decode(buffer.text, buffer.pos)
+            except json.JSONDecodeError:
+                if buffer.eof:
+                    raise
+                # The item is not complete yet, read another chunk
+                buffer.fill()
+                continue
+
+            if not buffer.eof and (
+                end == len(buffer.text) or buffer.text[end] not in ITEM_DELIMITERS
+            ):
+                # A number may continue in the next chunk, e.g. 12 of 123
+                buffer.fill()
+                continue
+
+            buffer.pos = end
+            yield item
+
+            separator = buffer.peek()
+            if separator not in {",", "]"}:
+                msg = f"Expected ',' or ']' in {path}, got {separator!r}"
+                raise ValueError(msg)
+            if separator == ",":
+                buffer.pos += 1
+                buffer.peek()
+
+
+class JSONLWriter:
+    """Writer streaming pydantic models into a JSONL file, one line per model."""
+
+    def __init__(self, path: str | Path, *, append: bool = False) -> None:
+        """Initialize the JSONLWriter.
+
+        Args:
+            path (str | Path): Path to the output file.
+            append (bool, optional): Append to an existing file instead of
+                overwriting it. Defaults to False.
+
+        """
+        self.path = Path(path)
+
+        if append and self.path.exists():
+            self._truncate_partial_line()
+        self.file = self.path.open("a" if append else "w")
+
+    def _truncate_partial_line(self) -> None:
+        """Drop an incomplete last line, so that appended records stay valid."""
+        with self.path.open("rb+") as f:
+            end = pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                # Scan backwards for the last newline
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                if pos + step == end and chunk.endswith(b"\n"):
+                    return
+                if (index := chunk.rfind(b"\n")) != -1:
+                    f.truncate(pos + index + 1)
+                    return
+            f.truncate(0)
+
+    def write(self, model: BaseModel) -> None:
+        """Write a model as a single line and flush it to disk."""
+        self.file.write(model.model_dump_json() + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Close the output file."""
+        self.file.close()
+
+    def __enter__(self) -> Self:
+        """Enter the context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close the output file when leaving the context manager."""
+        self.close()
@@ -0,0 +1,334 @@
+import json
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from deepseek_fin_qa.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.utils.cache import CacheStats
+
+THINK_REGEX = re.compile(r"<think>(.*?)(?:</think>|$)", re.DOTALL)
+
+# Quantiles of the chat latency exported to Prometheus
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+# Summary values exported to Prometheus: summary key, name, type and help text
+PROMETHEUS_METRICS = [
+    ("turns", "finqa_turns_total", "counter", "Answered questions."),
+    ("requests", "finqa_chat_requests_total", "counter", "Chat requests sent."),
+    (
+        "chat_seconds",
+        "finqa_chat_seconds_total",
+        "counter",
+        "Time spent in chat requests.",
+    ),
+    ("prompt_tokens", "finqa_prompt_tokens_total", "counter", "Prompt tokens sent."),
+    (
+        "completion_tokens",
+        "finqa_completion_tokens_total",
+        "counter",
+        "Completion tokens received.",
+    ),
+    (
+        "reasoning_tokens",
+        "finqa_reasoning_tokens_total",
+        "counter",
+        "Estimated tokens in <think> blocks.",
+    ),
+    (
+        "parse_failures",
+        "finqa_parse_failures_total",
+        "counter",
+        "Responses that could not be parsed.",
+    ),
+    (
+        "deduplicated_requests",
+        "finqa_deduplicated_requests_total",
+        "counter",
+        "Requests answered by an identical request in flight.",
+    ),
+    (
+        "deduplicated_tokens",
+        "finqa_deduplicated_tokens_total",
+        "counter",
+        "Prompt and completion tokens not sent thanks to deduplication.",
+    ),
+    (
+        "tokens_per_second",
+        "finqa_tokens_per_second",
+        "gauge",
+        "Completion tokens per second of chat time.",
+    ),
+]
+
+
+def reasoning_tokens(response: str) -> int:
+    """Return the estimated number of tokens inside the <think> block."""
+    match = THINK_REGEX.search(response)
+    return estimate_tokens(match.group(1)) if match else 0
+
+
+def reported_usage(response: object) -> tuple[int | None, int | None]:
+    """Return the prompt and completion tokens reported by the backend, if any.
+
+    OpenAI compatible backends report the usage in the additional kwargs of the
+    chat response, Ollama in the usage of the raw response.
+    """
+    usage = getattr(response, "additional_kwargs", None) or {}
+    if "completion_tokens" not in usage:
+        raw = getattr(response, "raw", None)
+        usage = (raw.get("usage") if isinstance(raw, dict) else None) or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+@dataclass(slots=True)
+class TurnMetrics:
+    """Measurements of a single question of a conversation."""
+
+    document: str | None
+    turn: int
+    cached: bool
+    seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+    reasoning_tokens: int
+    parsed: bool
+    early_stop: str | None = None
+    deduplicated: bool = False
+    sample: int | None = None
+
+    @property
+    def requested(self) -> bool:
+        """Return whether the response was requested from the backend."""
+        return not (self.cached or self.deduplicated)
+
+
+@dataclass
+class RunMetrics:
+    """Measurements of all chat requests and cache lookups of a run.
+
+    Completion tokens are the ones reported by the backend, or estimated from the
+    response text when the backend does not report them. The totals are kept up
+    to date, so the live summary is cheap to compute. The cache lookups are the
+    ones counted by the cache itself in `cache_stats`, None without a cache.
+    """
+
+    turns: list[TurnMetrics] = field(default_factory=list)
+    requests: int = 0
+    chat_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    reasoning_tokens: int = 0
+    parse_failures: int = 0
+    deduplicated_requests: int = 0
+    deduplicated_tokens: int = 0
+    deduplicated_seconds: float = 0.0
+    answer_stops: int = 0
+    budget_stops: int = 0
+    votes: int = 0
+    vote_samples: int = 0
+    quorum_votes: int = 0
+    cache_stats: "CacheStats | None" = None
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record_vote(self, samples: int, *, quorum: bool) -> None:
+        """Record a question answered by a vote over the given number of samples."""
+        with self._lock:
+            self.votes += 1
+            self.vote_samples += samples
+            self.quorum_votes += quorum
+
+    def record_turn(self, turn: TurnMetrics) -> None:
+        """Record an answered question."""
+        with self._lock:
+            self.turns.append(turn)
+            self.reasoning_tokens += turn.reasoning_tokens
+            self.parse_failures += not turn.parsed
+            self.answer_stops += turn.early_stop == "answer"
+            self.budget_stops += turn.early_stop == "budget"
+            if turn.deduplicated:
+                # Shared the response of an identical request in flight
+                self.deduplicated_requests += 1
+                self.deduplicated_tokens += turn.prompt_tokens + turn.completion_tokens
+                self.deduplicated_seconds += turn.seconds
+            elif not turn.cached:
+                self.requests += 1
+                self.chat_seconds += turn.seconds
+                self.prompt_tokens += turn.prompt_tokens
+                self.completion_tokens += turn.completion_tokens
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Return the completion tokens per second of chat time."""
+        return self.completion_tokens / self.chat_seconds if self.chat_seconds else 0.0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Return the fraction of cache lookups that were hits."""
+        return self.cache_stats.hit_ratio if self.cache_stats else 0.0
+
+    @property
+    def parse_failure_rate(self) -> float:
+        """Return the fraction of responses that could not be parsed."""
+        return self.parse_failures / len(self.turns) if self.turns else 0.0
+
+    def early_stop_savings(self) -> dict[str, float]:
+        """Estimate the tokens and chat time saved by cutting responses short.
+
+        Responses cut because the reasoning exceeded the budget are compared with
+        the mean length of the responses that were not, the time is estimated from
+        the completion tokens per second. Cutting after the answer only saves the
+        few tokens the model would have added, which are not counted.
+        """
+        with self._lock:
+            requests = [turn for turn in self.turns if turn.requested]
+        full = [t.completion_tokens for t in requests if t.early_stop != "budget"]
+        if not full:
+            return {"tokens": 0.0, "seconds": 0.0}
+
+        mean_tokens = sum(full) / len(full)
+        tokens = sum(
+            max(0.0, mean_tokens - turn.completion_tokens)
+            for turn in requests
+            if turn.early_stop == "budget"
+        )
+        tokens_per_second = self.tokens_per_second
+        return {
+            "tokens": tokens,
+            "seconds": tokens / tokens_per_second if tokens_per_second else 0.0,
+        }
+
+    def latency_quantiles(self) -> dict[str, float]:
+        """Return the quantiles of the chat request latency."""
+        with self._lock:
+            latencies = [turn.seconds for turn in self.turns if turn.requested]
+        return {
+            str(q): float(np.quantile(latencies, q)) if latencies else 0.0
+            for q in LATENCY_QUANTILES
+        }
+
+    def summary(self) -> dict[str, Any]:
+        """Return the aggregated measurements."""
+        return {
+            "turns": len(self.turns),
+            "requests": self.requests,
+            "chat_seconds": self.chat_seconds,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "latency_quantiles": self.latency_quantiles(),
+            "parse_failures": self.parse_failures,
+            "parse_failure_rate": self.parse_failure_rate,
+            "deduplicated_requests": self.deduplicated_requests,
+            "deduplicated_tokens": self.deduplicated_tokens,
+            "deduplicated_seconds": self.deduplicated_seconds,
+            "early_stop": {
+                "answer": self.answer_stops,
+                "budget": self.budget_stops,
+                "saved": self.early_stop_savings(),
+            },
+            "voting": {
+                "questions": self.votes,
+                "samples": self.vote_samples,
+                "mean_samples": self.vote_samples / self.votes if self.votes else 0.0,
+                "quorum": self.quorum_votes,
+            },
+            "cache": self._cache_summary(),
+        }
+
+    def _cache_summary(self) -> dict[str, float]:
+        """Return the lookups counted by the cache, hits include memory hits."""
+        stats = self.cache_stats
+        if stats is None:
+            return {"hits": 0, "misses": 0, "hit_ratio": 0.0, "seconds": 0.0}
+        return {
+            "hits": stats.memory_hits + stats.hits,
+            "misses": stats.misses,
+            "hit_ratio": stats.hit_ratio,
+            "seconds": stats.lookup_seconds,
+        }
+
+    def postfix(self) -> dict[str, str]:
+        """Return a short live summary for the progress bar."""
+        mean_latency = self.chat_seconds / self.requests if self.requests else 0.0
+        return {
+            "tok/s": f"{self.tokens_per_second:.1f}",
+            "latency": f"{mean_latency:.1f}s",
+            "hit": f"{self.cache_hit_ratio:.0%}",
+            "fail": f"{self.parse_failure_rate:.0%}",
+        }
+
+    def to_json(self) -> str:
+        """Return the summary and the measurements of every turn as JSON."""
+        with self._lock:
+            turns = [asdict(turn) for turn in self.turns]
+        return json.dumps({"summary": self.summary(), "turns": turns})
+
+    def to_prometheus(self, labels: dict[str, str] | None = None) -> str:
+        """Return the summary in the Prometheus text exposition format."""
+        summary = self.summary()
+        label_text = ",".join(
+            f'{name}="{value}"' for name, value in (labels or {}).items()
+        )
+
+        def sample(name: str, value: float, extra: str = "") -> str:
+            all_labels = ",".join(filter(None, [label_text, extra]))
+            return (
+                f"{name}{{{all_labels}}} {value}" if all_labels else f"{name} {value}"
+            )
+
+        lines = []
+        for key, name, kind, help_text in PROMETHEUS_METRICS:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines.append(sample(name, summary[key]))
+
+        lines += [
+            "# HELP finqa_cache_lookups_total Cache lookups by result.",
+            "# TYPE finqa_cache_lookups_total counter",
+        ]
+        cache = summary["cache"]
+        for result, count in (("hit", cache["hits"]), ("miss", cache["misses"])):
+            lines.append(
+                sample("finqa_cache_lookups_total", count, f'result="{result}"')
+            )
+
+        lines += [
+            "# HELP finqa_early_stops_total Streamed responses cut short by reason.",
+            "# TYPE finqa_early_stops_total counter",
+        ]
+        for reason in ("answer", "budget"):
+            lines.append(
+                sample(
+                    "finqa_early_stops_total",
+                    summary["early_stop"][reason],
+                    f'reason="{reason}"',
+                )
+            )
+
+        lines += [
+            "# HELP finqa_chat_latency_seconds Latency of the chat requests.",
+            "# TYPE finqa_chat_latency_seconds summary",
+        ]
+        lines += [
+            sample("finqa_chat_latency_seconds", value, f'quantile="{q}"')
+            for q, value in summary["latency_quantiles"].items()
+        ]
+        lines.append(sample("finqa_chat_latency_seconds_sum", summary["chat_seconds"]))
+        lines.append(sample("finqa_chat_latency_seconds_count", summary["requests"]))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str | Path, labels: dict[str, str] | None = None) -> None:
+        """Write the metrics as JSON, or as Prometheus text for other suffixes."""
+        path = Path(path)
+        if path.suffix == ".json":
+            path.write_text(self.to_json())
+        else:
+            path.write_text(self.to_prometheus(labels))
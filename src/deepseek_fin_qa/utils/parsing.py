@@ -0,0 +1,171 @@
+import json
+import re
+from typing import Any
+
+THINK_START = "<think>"
+THINK_END = "</think>"
+
+# Characters that change the state of the scanner outside of a JSON string, a
+# single character class is much faster to search for than the tags themselves
+MARKER_REGEX = re.compile(r"[<{}\"]")
+STRING_REGEX = re.compile(r"[\"\\]")
+
+TRAILING_COMMA_REGEX = re.compile(r",\s*([}\]])")
+BARE_VALUE_REGEX = re.compile(r"(:\s*)([^\s\"{\[][^,}\]\n]*)")
+
+
+def _quote_bare_value(match: re.Match[str]) -> str:
+    """Quote a bare value that is not a JSON literal, e.g. 12.5%."""
+    separator, value = match.groups()
+    value = value.strip()
+    try:
+        json.loads(value)
+    except ValueError:
+        return separator + json.dumps(value)
+    return separator + value
+
+
+def loads_lenient(text: str) -> dict[str, Any] | None:
+    """Decode a JSON object, repairing common malformations of LLM output.
+
+    Trailing commas are dropped, bare values that are not JSON literals, like
+    `12.5%`, are quoted and single quotes are accepted if there are no double
+    quotes.
+
+    Args:
+        text (str): The text of the object, including the braces.
+
+    Returns:
+        dict[str, Any] | None: The decoded object, None if it can not be repaired.
+
+    """
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        if '"' not in text:
+            text = text.replace("'", '"')
+        text = TRAILING_COMMA_REGEX.sub(r"\1", text)
+        text = BARE_VALUE_REGEX.sub(_quote_bare_value, text)
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return None
+    return obj if isinstance(obj, dict) else None
+
+
+class JSONObjectExtractor:
+    """Incremental extractor of the top-level JSON objects in reasoning output.
+
+    The text is scanned once, jumping between braces, quotes and <think> tags, so
+    it can be fed with streamed tokens and reports every object as soon as its
+    closing brace arrives. Objects inside the <think> block are kept apart, they
+    are only used when the model did not answer after its reasoning. Fenced
+    ```json blocks need no special casing, the object inside is found as well.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the JSONObjectExtractor."""
+        self.buffer = ""
+        self.pos = 0
+        self.in_think = False
+        self.think_closed = False
+        self.objects: list[str] = []
+        self.think_objects: list[str] = []
+
+        # State of the object being scanned
+        self.start: int | None = None
+        self.depth = 0
+        self.in_string = False
+
+    def feed(self, chunk: str) -> list[str]:
+        """Scan the next chunk of text.
+
+        Args:
+            chunk (str): The next chunk of the output.
+
+        Returns:
+            list[str]: The objects completed after the <think> block in this chunk.
+
+        """
+        self.buffer += chunk
+        n_objects = len(self.objects)
+        self._scan()
+
+        if self.start is None:
+            # Drop the scanned text, an incomplete tag at the end is not scanned yet
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        return self.objects[n_objects:]
+
+    def finish(self) -> list[str]:
+        """Finish the scan at the end of the output.
+
+        An object that was never closed, e.g. a stray brace in the text, is
+        skipped and the text after its opening brace is scanned again.
+
+        Returns:
+            list[str]: The objects completed after the <think> block.
+
+        """
+        n_objects = len(self.objects)
+        while self.start is not None:
+            self.pos = self.start + 1
+            self.start = None
+            self.depth = 0
+            self.in_string = False
+            self._scan()
+        return self.objects[n_objects:]
+
+    def _scan(self) -> None:  # noqa: C901, PLR0912
+        """Scan the buffer from the current position as far as possible."""
+        buffer = self.buffer
+        while True:
+            if self.in_string:
+                match = STRING_REGEX.search(buffer, self.pos)
+                if match is None:
+                    self.pos = len(buffer)
+                    return
+                if match.group() == "\\":
+                    if match.end() == len(buffer):
+                        # Wait for the escaped character
+                        self.pos = match.start()
+                        return
+                    self.pos = match.end() + 1
+                    continue
+                self.in_string = False
+                self.pos = match.end()
+                continue
+
+            match = MARKER_REGEX.search(buffer, self.pos)
+            if match is None:
+                self.pos = len(buffer)
+                return
+            self.pos = match.end()
+            marker = match.group()
+
+            if marker == "<":
+                tag = buffer[match.start() : match.start() + len(THINK_END)]
+                if tag.startswith(THINK_START) or tag == THINK_END:
+                    # Objects do not span the <think> tags
+                    self.in_think = tag.startswith(THINK_START)
+                    self.think_closed |= tag == THINK_END
+                    self.start = None
+                    self.depth = 0
+                elif THINK_END.startswith(tag) or THINK_START.startswith(tag):
+                    # Wait for the rest of a tag split between chunks
+                    self.pos = match.start()
+                    return
+            elif marker == "{":
+                if self.start is None:
+                    self.start = match.start()
+                self.depth += 1
+            elif self.start is None:
+                continue  # Braces and quotes outside of an object
+            elif marker == '"':
+                self.in_string = True
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    text = buffer[self.start : match.end()]
+                    (self.think_objects if self.in_think else self.objects).append(text)
+                    self.start = None
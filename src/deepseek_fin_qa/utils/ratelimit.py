@@ -0,0 +1,166 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+from deepseek_fin_qa.log import LOG
+
+
+class TokenBucket:
+    """Token bucket refilled at a constant rate up to its capacity.
+
+    Reservations may overdraw the bucket, the caller then waits until the balance
+    is refilled. This queues concurrent callers fairly and lets requests larger
+    than the capacity through instead of blocking forever.
+    """
+
+    def __init__(self, capacity: float, rate: float, now: float) -> None:
+        """Initialize the TokenBucket.
+
+        Args:
+            capacity (float): Maximum number of tokens in the bucket.
+            rate (float): Tokens added per second.
+            now (float): Current time in seconds.
+
+        """
+        self.capacity = capacity
+        self.rate = rate
+        self.balance = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.balance = min(
+            self.capacity, self.balance + (now - self.updated) * self.rate
+        )
+        self.updated = max(self.updated, now)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take tokens from the bucket and return the seconds to wait for them."""
+        self._refill(now)
+        self.balance -= amount
+        return max(0.0, -self.balance / self.rate)
+
+    def refund(self, amount: float, now: float) -> None:
+        """Return tokens to the bucket, a negative amount takes extra tokens."""
+        self._refill(now)
+        self.balance = min(self.capacity, self.balance + amount)
+
+
+class RateLimiter:
+    """Rate limiter for requests-per-minute and tokens-per-minute budgets."""
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the RateLimiter.
+
+        Args:
+            requests_per_minute (float | None, optional): Request budget. Defaults
+                to None, which does not limit the requests.
+            tokens_per_minute (float | None, optional): Token budget. Defaults to
+                None, which does not limit the tokens.
+            clock (Callable[[], float], optional): Monotonic clock in seconds.
+
+        """
+        self.clock = clock
+        now = clock()
+        self.requests = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60, now)
+            if requests_per_minute
+            else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60, now)
+            if tokens_per_minute
+            else None
+        )
+        self.paused_until = now
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: float) -> float:
+        """Reserve a request of `tokens` tokens and return the seconds to wait."""
+        with self.lock:
+            now = self.clock()
+            wait = max(0.0, self.paused_until - now)
+            if self.requests:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def acquire(self, tokens: float) -> None:
+        """Wait until a request of `tokens` tokens fits in the budgets."""
+        if wait := self.reserve(tokens):
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: float) -> None:
+        """Wait until a request of `tokens` tokens fits in the budgets."""
+        if wait := self.reserve(tokens):
+            await asyncio.sleep(wait)
+
+    def correct(self, estimated: float, actual: float) -> None:
+        """Correct the token budget once the actual usage of a request is known."""
+        if self.tokens:
+            with self.lock:
+                self.tokens.refund(estimated - actual, self.clock())
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all requests, e.g. after the server reported a rate limit."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """Exponential backoff with full jitter."""
+
+    max_retries: int = 6
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Return the seconds to wait before retrying a failed attempt.
+
+        A delay requested by the server takes precedence over the backoff.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))  # noqa: S311
+
+
+def retry_after(headers: dict[str, str] | None) -> float | None:
+    """Parse the delay requested by the Retry-After headers of a response.
+
+    Args:
+        headers (dict[str, str] | None): The response headers, case insensitive.
+
+    Returns:
+        float | None: The delay in seconds, if the server requested one.
+
+    """
+    if not headers:
+        return None
+
+    if (value := headers.get("retry-after-ms")) is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+
+    if (value := headers.get("retry-after")) is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        LOG.warning(f"Ignoring invalid Retry-After header: {value}")
+        return None
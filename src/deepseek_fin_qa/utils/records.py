@@ -0,0 +1,135 @@
+import json
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from deepseek_fin_qa.utils.evaluation import program_output
+from deepseek_fin_qa.utils.io import iter_jsonl
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.schemas.qa import QA, FinQA
+
+
+@dataclass(slots=True)
+class QARecord:
+    """Answered question reduced to what scoring and aggregation need.
+
+    Loading answered outputs into the pydantic models validates and keeps the
+    whole document, its context and three models per question. A record holds
+    only the document key, the turn index and the answers as plain strings.
+    The program outputs are evaluated on first use with the memoised
+    `program_output` and cached on the record, the normalised values are
+    memoised by string in `deepseek_fin_qa.utils.scoring`.
+    """
+
+    document: str
+    turn: int
+    target_value: str
+    target_program: str
+    llm_value: str | None = None
+    llm_program: str | None = None
+    _program_outputs: tuple[float | str, float | str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def answered(self) -> bool:
+        """Return whether the question has an LLM answer."""
+        return self.llm_value is not None
+
+    @property
+    def program_outputs(self) -> tuple[float | str, float | str] | None:
+        """Return the outputs of the target and LLM programs, None if unanswered."""
+        if self._program_outputs is None and self.llm_program is not None:
+            self._program_outputs = (
+                program_output(self.target_program),
+                program_output(self.llm_program),
+            )
+        return self._program_outputs
+
+
+def answer_value(value: str | float) -> str:
+    """Return an answer value as a string, the same way as `str(Answer.value)`."""
+    return value if isinstance(value, str) else str(float(value))
+
+
+def records_from_dict(data: Mapping[str, Any], document: str) -> list[QARecord]:
+    """Create the records of a serialised FinQA document.
+
+    Args:
+        data (Mapping[str, Any]): The document as written by `model_dump_json`.
+        document (str): The key of the document.
+
+    Returns:
+        list[QARecord]: One record per question, in turn order.
+
+    """
+    records = []
+    for turn, qa in enumerate(data["qa_list"]):
+        target = qa["target_answer"]
+        record = QARecord(
+            document=document,
+            turn=turn,
+            target_value=answer_value(target.get("value", "nan")),
+            target_program=target.get("program", "nan"),
+        )
+        if (llm := qa.get("llm_answer")) is not None:
+            record.llm_value = answer_value(llm.get("value", "nan"))
+            record.llm_program = llm.get("program", "nan")
+        records.append(record)
+    return records
+
+
+def record_from_qa(qa: "QA", document: str = "", turn: int = 0) -> QARecord:
+    """Create the record of a question already loaded as a model."""
+    return QARecord(
+        document=document,
+        turn=turn,
+        target_value=str(qa.target_answer.value),
+        target_program=qa.target_answer.program,
+        llm_value=None if qa.llm_answer is None else str(qa.llm_answer.value),
+        llm_program=None if qa.llm_answer is None else qa.llm_answer.program,
+    )
+
+
+def records_from_fin_qas(fin_qas: Iterable["FinQA"]) -> Iterator[QARecord]:
+    """Create the records of FinQA documents already loaded as models.
+
+    Documents without an id are keyed by their position in the data.
+    """
+    for i, fin_qa in enumerate(fin_qas):
+        document = fin_qa.id or str(i)
+        for turn, qa in enumerate(fin_qa):
+            yield record_from_qa(qa, document, turn)
+
+
+def iter_answered_records(
+    path: str | Path, start: int = 0, end: int | None = None
+) -> Iterator[QARecord]:
+    """Iterate over the records of an answered output file, without pydantic.
+
+    The counterpart of `FinQADataset.iter_answered` for scoring: JSONL files are
+    read lazily, optionally only a byte range of them, see `iter_jsonl`. JSON
+    files are loaded at once. Documents without an id are keyed by their
+    position in the file, or in the byte range.
+
+    Args:
+        path (str | Path): Path to the output file of `process_data`.
+        start (int, optional): Byte offset to start reading a JSONL file at.
+            Defaults to 0.
+        end (int | None, optional): Byte offset to stop reading a JSONL file at.
+            Defaults to None.
+
+    Yields:
+        QARecord: The records, in file order.
+
+    """
+    if Path(path).suffix == ".jsonl":
+        documents = iter_jsonl(path, start, end)
+    else:
+        with Path(path).open("r") as f:
+            documents = json.load(f)["finqa_list"]
+
+    for i, data in enumerate(documents):
+        yield from records_from_dict(data, data.get("id") or str(i))
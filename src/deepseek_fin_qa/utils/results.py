@@ -0,0 +1,261 @@
+import hashlib
+import json
+import math
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import TYPE_CHECKING, Self
+
+import numpy as np
+
+from deepseek_fin_qa.log import LOG
+from deepseek_fin_qa.schemas.metrics import Accuracy
+from deepseek_fin_qa.schemas.qa import Answer, FinQA, FinQADataset
+from deepseek_fin_qa.utils.scoring import score_batch
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.utils.metrics import TurnMetrics
+
+# Columns stored in the JSON index, the others are stored in the NPZ file
+STRING_COLUMNS = (
+    "document",
+    "target_value",
+    "target_program",
+    "llm_value",
+    "llm_program",
+)
+
+
+def question_hash(question: str) -> int:
+    """Return a 64-bit hash of a question, to check that a rejoin matches."""
+    return int.from_bytes(hashlib.blake2b(question.encode(), digest_size=8).digest())
+
+
+@dataclass(frozen=True)
+class Results:
+    """Columnar per-question results of a run, one row per question.
+
+    Only the answers, scores and measurements are stored. The documents are
+    referenced by id, so the unchanged contexts of the source dataset are not
+    duplicated, `rejoin` attaches the answers to the source documents again.
+    """
+
+    source: str | None
+    document: np.ndarray
+    turn: np.ndarray
+    question_hash: np.ndarray
+    target_value: np.ndarray
+    target_program: np.ndarray
+    llm_value: np.ndarray
+    llm_program: np.ndarray
+    answered: np.ndarray
+    execution: np.ndarray
+    program: np.ndarray
+    seconds: np.ndarray
+    prompt_tokens: np.ndarray
+    completion_tokens: np.ndarray
+
+    def __len__(self) -> int:
+        """Return the number of questions."""
+        return len(self.turn)
+
+    @classmethod
+    def from_fin_qas(
+        cls,
+        fin_qas: Iterable[FinQA],
+        turns: Iterable["TurnMetrics"] = (),
+        source: str | None = None,
+    ) -> Self:
+        """Collect the results of answered FinQA data.
+
+        Args:
+            fin_qas (Iterable[FinQA]): The answered documents.
+            turns (Iterable[TurnMetrics], optional): The measurements of the run,
+                the samples of a voted answer are added up. Defaults to none.
+            source (str | None, optional): Path to the source dataset.
+                Defaults to None.
+
+        Returns:
+            Results: The results, in the order of the documents.
+
+        """
+        columns: defaultdict[str, list] = defaultdict(list)
+        keys = []
+        missing_ids = 0
+        for i, fin_qa in enumerate(fin_qas):
+            document = fin_qa.id or str(i)
+            missing_ids += fin_qa.id is None
+            scores = score_batch(fin_qa.qa_list)
+            for turn, qa in enumerate(fin_qa):
+                keys.append((fin_qa.id, turn))
+                columns["document"].append(document)
+                columns["turn"].append(turn)
+                columns["question_hash"].append(question_hash(qa.question))
+                columns["target_value"].append(str(qa.target_answer.value))
+                columns["target_program"].append(qa.target_answer.program)
+                columns["llm_value"].append(
+                    "" if qa.llm_answer is None else str(qa.llm_answer.value)
+                )
+                columns["llm_program"].append(
+                    "" if qa.llm_answer is None else qa.llm_answer.program
+                )
+            columns["answered"].extend(scores.answered.tolist())
+            columns["execution"].extend(scores.execution.tolist())
+            columns["program"].extend(scores.program.tolist())
+
+        # The measurements are only complete once the documents are answered
+        usage: defaultdict[tuple[str | None, int], list[float]] = defaultdict(
+            lambda: [0.0, 0, 0]
+        )
+        for turn in turns:
+            measured = usage[turn.document, turn.turn]
+            measured[0] += turn.seconds
+            measured[1] += turn.prompt_tokens
+            measured[2] += turn.completion_tokens
+        for key in keys:
+            seconds, prompt_tokens, completion_tokens = usage.get(key, (0.0, 0, 0))
+            columns["seconds"].append(seconds)
+            columns["prompt_tokens"].append(prompt_tokens)
+            columns["completion_tokens"].append(completion_tokens)
+
+        if missing_ids:
+            LOG.warning(
+                f"{missing_ids} documents without an id are keyed by their position "
+                "in the data, they are only rejoined to the source documents at the "
+                "same position."
+            )
+
+        dtypes = {
+            "turn": np.int16,
+            "question_hash": np.uint64,
+            "answered": bool,
+            "execution": bool,
+            "program": bool,
+            "seconds": np.float32,
+            "prompt_tokens": np.int32,
+            "completion_tokens": np.int32,
+        }
+        return cls(
+            source=source,
+            **{
+                name: np.array(columns[name], dtype=dtypes.get(name, np.str_))
+                for name in cls.column_names()
+            },
+        )
+
+    @classmethod
+    def column_names(cls) -> list[str]:
+        """Return the names of the per-question columns."""
+        return [field.name for field in fields(cls) if field.name != "source"]
+
+    def save(self, path: str | Path) -> None:
+        """Save the results as an NPZ file and a JSON index next to it.
+
+        The numeric columns are stored in the NPZ file, the ids, values and
+        programs in the JSON index, e.g. `results.index.json` for `results.npz`.
+        """
+        path = Path(path)
+        np.savez_compressed(
+            path,
+            **{
+                name: getattr(self, name)
+                for name in self.column_names()
+                if name not in STRING_COLUMNS
+            },
+        )
+        index = {"source": self.source} | {
+            name: getattr(self, name).tolist() for name in STRING_COLUMNS
+        }
+        path.with_suffix(".index.json").write_text(json.dumps(index))
+
+    @classmethod
+    def load(cls, path: str | Path) -> Self:
+        """Load results saved with `save`."""
+        path = Path(path)
+        index = json.loads(path.with_suffix(".index.json").read_text())
+        with np.load(path) as arrays:
+            numeric = {name: arrays[name] for name in arrays.files}
+        return cls(
+            source=index["source"],
+            **numeric,
+            **{name: np.array(index[name], dtype=np.str_) for name in STRING_COLUMNS},
+        )
+
+    def select(self, mask: np.ndarray) -> Self:
+        """Return the rows selected by a boolean mask or an array of indices."""
+        return type(self)(
+            source=self.source,
+            **{name: getattr(self, name)[mask] for name in self.column_names()},
+        )
+
+    @property
+    def failed(self) -> np.ndarray:
+        """Return the mask of the questions not answered or answered wrongly."""
+        return ~(self.answered & self.execution)
+
+    def failures(self) -> Self:
+        """Return the questions not answered or answered wrongly."""
+        return self.select(self.failed)
+
+    @property
+    def accuracy(self) -> Accuracy:
+        """Return the mean accuracy of the answered questions."""
+        n = int(self.answered.sum())
+        if n == 0:
+            return Accuracy(execution=math.nan, program=math.nan)
+        return Accuracy(
+            execution=int(self.execution[self.answered].sum()) / n,
+            program=int(self.program[self.answered].sum()) / n,
+        )
+
+    def rejoin(self, source: str | None = None) -> Iterator[FinQA]:
+        """Attach the answers to the documents of the source dataset.
+
+        Only the documents with a row in the results are yielded, with only the
+        questions of those rows, e.g. the failures of a run.
+
+        Args:
+            source (str | None, optional): Path to the source dataset. Defaults
+                to the source the results were saved with.
+
+        Documents are matched by id, the documents without an id by their position
+        in the source dataset, as loaded by `FinQADataset.iter_file`. A warning is
+        logged for the documents of the results not found in the source.
+
+        Yields:
+            FinQA: The answered documents, in the order of the source dataset.
+
+        """
+        source = source or self.source
+        if source is None:
+            msg = "The results do not reference a source dataset."
+            raise ValueError(msg)
+
+        rows: defaultdict[str, list[int]] = defaultdict(list)
+        for row, document in enumerate(self.document.tolist()):
+            rows[document].append(row)
+
+        matched = set()
+        for fin_qa in FinQADataset.iter_file(source):
+            if fin_qa.id not in rows:
+                continue
+            matched.add(fin_qa.id)
+            qa_list = []
+            for row in rows[fin_qa.id]:
+                qa = fin_qa.qa_list[self.turn[row]]
+                if question_hash(qa.question) != self.question_hash[row]:
+                    LOG.warning(
+                        f"Question {self.turn[row]} of {fin_qa.id} changed in the "
+                        "source dataset since the run."
+                    )
+                if self.answered[row]:
+                    qa.llm_answer = Answer(
+                        value=str(self.llm_value[row]),
+                        program=str(self.llm_program[row]),
+                    )
+                qa_list.append(qa)
+            yield fin_qa.model_copy(update={"qa_list": qa_list})
+
+        if missing := len(rows.keys() - matched):
+            LOG.warning(f"{missing} documents of the results are not in {source}.")
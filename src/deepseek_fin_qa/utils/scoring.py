@@ -0,0 +1,331 @@
+import functools
+import itertools
+import math
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from deepseek_fin_qa.schemas.metrics import Accuracy, Score, ScoreReport
+from deepseek_fin_qa.utils.evaluation import get_execution_match, str_to_float
+from deepseek_fin_qa.utils.records import (
+    QARecord,
+    record_from_qa,
+    records_from_fin_qas,
+)
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.schemas.qa import QA, FinQA
+
+# Relative tolerance used by math.isclose
+REL_TOL = 1e-9
+
+# Powers of ten that are exactly representable as floats
+POWERS_OF_TEN = np.array([float(10**i) for i in range(23)])
+
+
+@dataclass(frozen=True)
+class TargetValue:
+    """Target value normalised for execution matching."""
+
+    is_bool: bool
+    is_percentage: bool
+    value: float | None
+    rounding: int
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def normalise_target_value(target_value: str) -> TargetValue:
+    """Normalise a target value the same way as `get_execution_match`."""
+    if target_value in ["yes", "no"]:
+        return TargetValue(is_bool=True, is_percentage=False, value=None, rounding=0)
+
+    is_percentage = target_value.endswith("%")
+    if is_percentage:
+        target_value = target_value.strip("-")
+    target_value = target_value.replace("%", "").replace(",", "").replace(" ", "")
+
+    rounding = len(target_value.split(".")[1]) if "." in target_value else 0
+    value = str_to_float(target_value)
+
+    return TargetValue(
+        is_bool=False,
+        is_percentage=is_percentage,
+        value=None if math.isnan(value) else value,
+        rounding=rounding,
+    )
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def normalise_llm_value(llm_value: str, *, is_percentage: bool) -> float | None:
+    """Normalise an LLM value the same way as `get_execution_match`."""
+    if is_percentage:
+        llm_value = llm_value.strip("-")
+    llm_value = llm_value.replace("%", "").replace(",", "").replace(" ", "")
+
+    value = str_to_float(llm_value)
+    return None if math.isnan(value) else value
+
+
+def isclose(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Element-wise `math.isclose` with its default tolerances."""
+    with np.errstate(invalid="ignore", over="ignore"):
+        tolerance = REL_TOL * np.maximum(np.abs(a), np.abs(b))
+        return (a == b) | (
+            np.isfinite(a) & np.isfinite(b) & (np.abs(a - b) <= tolerance)
+        )
+
+
+@dataclass(frozen=True)
+class BatchScore:
+    """Scores for a batch of QA pairs."""
+
+    execution: np.ndarray
+    program: np.ndarray
+    answered: np.ndarray
+
+    def __len__(self) -> int:
+        """Return the number of scored QA pairs."""
+        return len(self.answered)
+
+    @cached_property
+    def scores(self) -> list[Score]:
+        """Return the score of every QA pair."""
+        return [
+            Score(execution=execution, program=program)
+            for execution, program in zip(
+                self.execution.tolist(), self.program.tolist(), strict=True
+            )
+        ]
+
+    @property
+    def accuracy(self) -> Accuracy:
+        """Return the mean accuracy of the answered QA pairs."""
+        n = int(self.answered.sum())
+        if n == 0:
+            return Accuracy(execution=math.nan, program=math.nan)
+
+        return Accuracy(
+            execution=int(self.execution[self.answered].sum()) / n,
+            program=int(self.program[self.answered].sum()) / n,
+        )
+
+
+def _score_execution(
+    target_values: Sequence[str], llm_values: Sequence[str | None]
+) -> np.ndarray:
+    """Vectorised `get_execution_match`, None marks an unanswered question."""
+    n = len(target_values)
+    execution = np.zeros(n, dtype=bool)
+    numeric = np.zeros(n, dtype=bool)
+    target = np.zeros(n)
+    llm = np.zeros(n)
+    rounding = np.zeros(n, dtype=int)
+
+    for i, (target_value, llm_value) in enumerate(
+        zip(target_values, llm_values, strict=True)
+    ):
+        if llm_value is None:
+            continue
+
+        normalised = normalise_target_value(target_value)
+
+        # Handle bool values
+        if normalised.is_bool:
+            llm_bool = llm_value.replace("false", "no").replace("true", "yes")
+            execution[i] = target_value == llm_bool
+            continue
+
+        llm_f = normalise_llm_value(llm_value, is_percentage=normalised.is_percentage)
+        if normalised.value is None or llm_f is None:
+            execution[i] = normalised.value is None and llm_f is None
+            continue
+
+        if normalised.rounding >= len(POWERS_OF_TEN) or not math.isfinite(
+            llm_f * 10.0**normalised.rounding
+        ):
+            # Leave the edge cases to the scalar implementation
+            execution[i] = get_execution_match(target_value, llm_value)
+            continue
+
+        numeric[i] = True
+        target[i] = normalised.value
+        llm[i] = llm_f
+        rounding[i] = normalised.rounding
+
+    # The rounding in dataset is not consistent
+    # so we need to check multiple rounding options
+    scale = POWERS_OF_TEN[rounding[numeric]]
+    scaled = llm[numeric] * scale
+    execution[numeric] = isclose(target[numeric], np.ceil(scaled) / scale) | isclose(
+        target[numeric], np.floor(scaled) / scale
+    )
+    return execution
+
+
+def _score_program(
+    outputs: Sequence[tuple[float | str, float | str] | None],
+) -> np.ndarray:
+    """Vectorised `get_program_output_match` for pairs of target and LLM outputs.
+
+    None marks an unanswered question.
+    """
+    n = len(outputs)
+    program = np.zeros(n, dtype=bool)
+    numeric = np.zeros(n, dtype=bool)
+    target = np.zeros(n)
+    llm = np.zeros(n)
+
+    for i, pair in enumerate(outputs):
+        if pair is None:
+            continue
+
+        target_output, llm_output = pair
+        if isinstance(target_output, str) or isinstance(llm_output, str):
+            program[i] = target_output == llm_output
+            continue
+
+        numeric[i] = True
+        target[i] = target_output
+        llm[i] = llm_output
+
+    # Check if the values are equal, accounting for percentage formatting
+    with np.errstate(over="ignore"):
+        target, llm = target[numeric], llm[numeric]
+        program[numeric] = (
+            isclose(target, llm)
+            | isclose(target, llm * 100)
+            | isclose(target * 100, llm)
+        )
+    return program
+
+
+def score_batch(qas: Sequence["QA"]) -> BatchScore:
+    """Score a batch of QA pairs at once, as records, see `score_records`.
+
+    Args:
+        qas (Sequence[QA]): The QA pairs to score.
+
+    Returns:
+        BatchScore: The per-question scores.
+
+    """
+    return score_records([record_from_qa(qa) for qa in qas])
+
+
+def score_records(records: Sequence[QARecord]) -> BatchScore:
+    """Score a batch of records at once.
+
+    Every value and program is normalised once, with the results memoised across
+    calls, and the numeric comparisons are done on NumPy arrays. The results are
+    the same as scoring every pair with `get_execution_match` and
+    `get_program_output_match`. The program outputs are cached on the records,
+    so scoring the same records again does not evaluate their programs again.
+
+    Args:
+        records (Sequence[QARecord]): The records to score.
+
+    Returns:
+        BatchScore: The per-question scores.
+
+    """
+    llm_values = [record.llm_value for record in records]
+    return BatchScore(
+        execution=_score_execution(
+            [record.target_value for record in records], llm_values
+        ),
+        program=_score_program([record.program_outputs for record in records]),
+        answered=np.array([value is not None for value in llm_values], dtype=bool),
+    )
+
+
+@dataclass
+class Tally:
+    """Number of matching answers out of the answered questions."""
+
+    execution: int = 0
+    program: int = 0
+    n: int = 0
+
+    def update(self, other: "Tally") -> None:
+        """Add the counts of another tally."""
+        self.execution += other.execution
+        self.program += other.program
+        self.n += other.n
+
+    @property
+    def accuracy(self) -> Accuracy:
+        """Return the mean accuracy."""
+        if self.n == 0:
+            return Accuracy(execution=math.nan, program=math.nan)
+        return Accuracy(
+            execution=self.execution / self.n, program=self.program / self.n
+        )
+
+
+@dataclass
+class ScoreTally:
+    """Tallies for the whole data, every turn index and every document.
+
+    Tallies can be merged, so the data can be scored in parallel chunks.
+    """
+
+    total: Tally = field(default_factory=Tally)
+    turns: defaultdict[int, Tally] = field(default_factory=lambda: defaultdict(Tally))
+    documents: defaultdict[str, Tally] = field(
+        default_factory=lambda: defaultdict(Tally)
+    )
+
+    def update(self, other: "ScoreTally") -> None:
+        """Merge the counts of another score tally."""
+        self.total.update(other.total)
+        for turn, tally in other.turns.items():
+            self.turns[turn].update(tally)
+        for document, tally in other.documents.items():
+            self.documents[document].update(tally)
+
+    @property
+    def report(self) -> ScoreReport:
+        """Return the accuracy breakdown."""
+        return ScoreReport(
+            accuracy=self.total.accuracy,
+            n=self.total.n,
+            turns={turn: self.turns[turn].accuracy for turn in sorted(self.turns)},
+            documents={
+                document: tally.accuracy for document, tally in self.documents.items()
+            },
+        )
+
+
+def tally_scores(fin_qas: Iterable["FinQA"], batch_size: int = 4096) -> ScoreTally:
+    """Score answered FinQA data per document and per turn index.
+
+    Documents without an id are keyed by their position in the data.
+    """
+    return tally_records(records_from_fin_qas(fin_qas), batch_size)
+
+
+def tally_records(records: Iterable[QARecord], batch_size: int = 4096) -> ScoreTally:
+    """Score records per document and per turn index, in batches of `batch_size`."""
+    tally = ScoreTally()
+    records = iter(records)
+    while batch := list(itertools.islice(records, batch_size)):
+        scores = score_records(batch)
+        for record, execution, program, answered in zip(
+            batch,
+            scores.execution.tolist(),
+            scores.program.tolist(),
+            scores.answered.tolist(),
+            strict=True,
+        ):
+            if not answered:
+                continue
+            score = Tally(execution=execution, program=program, n=1)
+            tally.total.update(score)
+            tally.turns[record.turn].update(score)
+            tally.documents[record.document].update(score)
+
+    return tally
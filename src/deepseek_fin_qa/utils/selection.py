@@ -0,0 +1,152 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from deepseek_fin_qa.utils.evaluation import TABLE_FORMATS
+from deepseek_fin_qa.utils.tokens import count_tokens
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.schemas.qa import FinQA
+
+TERM_REGEX = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+# BM25 term frequency saturation and length normalisation
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Weight of the terms of earlier questions, follow-up questions refer back to them
+PREVIOUS_QUESTION_WEIGHT = 0.5
+
+
+def terms(text: str) -> list[str]:
+    """Return the lowercase words and numbers of a text."""
+    return TERM_REGEX.findall(text.lower().replace(",", ""))
+
+
+def bm25_scores(query: dict[str, float], documents: list[list[str]]) -> list[float]:
+    """Score documents against weighted query terms with Okapi BM25.
+
+    Args:
+        query (dict[str, float]): The query terms and their weights.
+        documents (list[list[str]]): The terms of every document.
+
+    Returns:
+        list[float]: The score of every document.
+
+    """
+    if not documents:
+        return []
+
+    n = len(documents)
+    mean_length = sum(map(len, documents)) / n or 1.0
+    document_frequency = Counter(
+        term for document in documents for term in set(document)
+    )
+    idf = {
+        term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for term, df in document_frequency.items()
+        if term in query
+    }
+
+    scores = []
+    for document in documents:
+        frequencies = Counter(document)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(document) / mean_length)
+        scores.append(
+            sum(
+                weight * idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                for term, weight in query.items()
+                if (tf := frequencies.get(term))
+            )
+        )
+    return scores
+
+
+@dataclass(slots=True)
+class ContextSelection:
+    """Context of a document reduced to the parts most relevant to a question."""
+
+    fin_qa: "FinQA"
+    tokens: int
+    total_tokens: int
+
+    @property
+    def retained(self) -> float:
+        """Return the fraction of the context tokens that was kept."""
+        return self.tokens / self.total_tokens if self.total_tokens else 1.0
+
+
+def select_context(
+    fin_qa: "FinQA", turn: int, budget: int, table_format: str = "markdown"
+) -> ContextSelection:
+    """Keep the sentences and table rows most relevant to a question.
+
+    The sentences of the text and the rows of the table are scored against the
+    question of the turn, and with a lower weight the earlier questions, with
+    BM25. The best ones are kept, in their original order, as long as their
+    tokens fit the budget. The header of the table is always kept with the rows.
+    Rows are charged at their size in the rendered table, with the separators
+    and padding of the table format, so the rendered context fits the budget.
+
+    Args:
+        fin_qa (FinQA): The document.
+        turn (int): The index of the question.
+        budget (int): Maximum number of tokens of the rendered context.
+        table_format (str, optional): One of `TABLE_FORMATS`. Defaults to
+            "markdown".
+
+    Returns:
+        ContextSelection: The document with the selected context, and the tokens
+            of the selected and of the whole context.
+
+    """
+    pre = [line for line in fin_qa.pre_text.split("\n") if line.strip()]
+    post = [line for line in fin_qa.post_text.split("\n") if line.strip()]
+    rows = fin_qa.table[1:]
+    units = pre + post + [" ".join(map(str, row)) for row in rows]
+
+    # Tokens never span lines, so a row costs its table less the header alone
+    render = TABLE_FORMATS[table_format]
+    header_tokens = count_tokens(render(fin_qa.table[:1]))
+    tokens = [count_tokens(unit) for unit in pre + post] + [
+        count_tokens(render([fin_qa.table[0], row])) - header_tokens for row in rows
+    ]
+    total_tokens = sum(tokens) + header_tokens
+    if total_tokens <= budget:
+        return ContextSelection(fin_qa, total_tokens, total_tokens)
+
+    query: dict[str, float] = {}
+    for i, qa in enumerate(fin_qa.qa_list[: turn + 1]):
+        weight = 1.0 if i == turn else PREVIOUS_QUESTION_WEIGHT
+        for term in terms(qa.question):
+            query[term] = max(query.get(term, 0.0), weight)
+    scores = bm25_scores(query, [terms(unit) for unit in units])
+
+    # Greedily keep the best units, skipping the ones that do not fit any more,
+    # the first kept row also pays for the header
+    kept = set()
+    used = 0
+    first_row = len(pre) + len(post)
+    for i in sorted(range(len(units)), key=lambda i: (-scores[i], i)):
+        cost = tokens[i]
+        if i >= first_row and header_tokens:
+            cost += header_tokens
+        if used + cost <= budget:
+            kept.add(i)
+            used += cost
+            if i >= first_row:
+                header_tokens = 0
+
+    kept_rows = [row for i, row in enumerate(rows, first_row) if i in kept]
+    selected = fin_qa.model_copy(
+        update={
+            "pre_text": "\n".join(line for i, line in enumerate(pre) if i in kept),
+            "post_text": "\n".join(
+                line for i, line in enumerate(post, len(pre)) if i in kept
+            ),
+            "table": [fin_qa.table[0], *kept_rows] if kept_rows else [],
+        }
+    )
+    return ContextSelection(selected, used, total_tokens)
@@ -0,0 +1,25 @@
+import functools
+import re
+
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text.
+
+    Words, numbers and punctuation marks are counted as one token each, which is
+    close enough to the model tokenizers to compare prompts without loading them.
+    Use it for text that is only counted once, e.g. responses and streamed
+    chunks, so that it does not evict the prompts memoised by `count_tokens`.
+    """
+    return len(TOKEN_REGEX.findall(text))
+
+
+@functools.lru_cache(maxsize=1 << 12)
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text, see `estimate_tokens`.
+
+    The counts are memoised, as every turn of a conversation counts the earlier
+    messages again.
+    """
+    return estimate_tokens(text)
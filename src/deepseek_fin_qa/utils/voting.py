@@ -0,0 +1,99 @@
+import math
+from typing import TYPE_CHECKING
+
+from deepseek_fin_qa.utils.evaluation import (
+    get_execution_match,
+    get_program_output_match,
+)
+
+if TYPE_CHECKING:
+    from deepseek_fin_qa.schemas.qa import Answer
+
+
+def answers_agree(answer: "Answer", other: "Answer") -> bool:
+    """Check if two answers are equivalent, by their program outputs or values.
+
+    The first answer takes the place of the target answer in the match functions,
+    so the other value is rounded to its precision.
+    """
+    output = answer.program_output
+    if isinstance(output, float) and not math.isnan(output):
+        return get_program_output_match(output, other.program_output)
+    return get_execution_match(str(answer.value), str(other.value))
+
+
+class Ballot:
+    """Majority vote over the sampled answers to a question.
+
+    Samples are drawn until a quorum of them agree or all samples are drawn.
+    `launch` hands out the samples to draw next, never more than could still be
+    needed to reach the quorum, so no sample is wasted once the vote is decided.
+    """
+
+    def __init__(self, samples: int, quorum: int) -> None:
+        """Initialize the ballot.
+
+        Args:
+            samples (int): Maximum number of samples to draw.
+            quorum (int): Number of agreeing answers that decide the vote.
+
+        """
+        self.samples = samples
+        self.quorum = min(quorum, samples)
+        self.launched = 0
+        self.counted = 0
+        # Groups of agreeing answers as lists of sample indices, the first sample
+        # of a group is the answer the others were compared with
+        self.groups: list[list[int]] = []
+        self.answers: dict[int, Answer] = {}
+
+    @property
+    def votes(self) -> int:
+        """Return the number of votes of the leading answer."""
+        return max(map(len, self.groups), default=0)
+
+    @property
+    def done(self) -> bool:
+        """Return whether a quorum agrees or all samples are counted."""
+        return self.votes >= self.quorum or self.counted == self.samples
+
+    def launch(self, in_flight: int) -> list[int]:
+        """Return the indices of the samples to draw next.
+
+        Args:
+            in_flight (int): Number of samples drawn but not counted yet.
+
+        Returns:
+            list[int]: The new sample indices, possibly none.
+
+        """
+        count = min(self.samples - self.launched, self.quorum - self.votes - in_flight)
+        indices = list(range(self.launched, self.launched + max(count, 0)))
+        self.launched += len(indices)
+        return indices
+
+    def add(self, sample: int, answer: "Answer | None") -> None:
+        """Count the answer of a sample, unparsed answers do not vote."""
+        self.counted += 1
+        if answer is None:
+            return
+
+        self.answers[sample] = answer
+        for group in self.groups:
+            if answers_agree(self.answers[group[0]], answer):
+                group.append(sample)
+                break
+        else:
+            self.groups.append([sample])
+
+    @property
+    def winner(self) -> int | None:
+        """Return the sample of the answer with the most votes, if any.
+
+        Ties are broken by the lowest sample index, which keeps the vote
+        independent of the order in which the samples arrived.
+        """
+        if not self.groups:
+            return None
+        group = max(self.groups, key=lambda group: (len(group), -min(group)))
+        return min(group)
@@ -0,0 +1,147 @@
+import shutil
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from deepseek_fin_qa.schemas.qa import FinQA
+from deepseek_fin_qa.utils.io import JSONLWriter, iter_jsonl
+
+
+class WorkQueue:
+    """Queue of FinQA documents on disk, shared by worker processes.
+
+    The documents are split into small tasks, one JSONL file each, that the
+    workers claim one at a time as soon as they are free, so faster workers take
+    over more of the work. Tasks move between directories with atomic renames:
+    `pending/` to `claimed/` when a worker takes one, which only one worker can
+    succeed in, and their answers appear in `done/` only once complete. Tasks
+    claimed by a worker that died, or abandoned because some of their documents
+    failed, are put back with `requeue_claimed`. An abandoned task keeps count
+    of its failed attempts in its name, e.g. `000003.2.jsonl`. The queue itself
+    is written in a temporary directory and renamed into place once all tasks
+    are written.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialize the WorkQueue.
+
+        Args:
+            path (str | Path): The directory of the queue.
+
+        """
+        self.path = Path(path)
+        self.pending = self.path / "pending"
+        self.claimed = self.path / "claimed"
+        self.done = self.path / "done"
+
+    def exists(self) -> bool:
+        """Return whether the queue has been created."""
+        return self.path.is_dir()
+
+    def create(self, fin_qas: Iterable[FinQA], task_size: int) -> int:
+        """Split the documents into tasks of `task_size` documents.
+
+        The tasks are written in a temporary directory, left over from an
+        interrupted call if need be, which is renamed to the queue directory
+        once complete, so an existing queue always has all of its tasks.
+
+        Returns:
+            int: The number of tasks.
+
+        """
+        staging = WorkQueue(self.path.with_name(f"{self.path.name}.tmp"))
+        shutil.rmtree(staging.path, ignore_errors=True)
+        for directory in (staging.pending, staging.claimed, staging.done):
+            directory.mkdir(parents=True)
+
+        n_tasks = 0
+        writer = None
+        for i, fin_qa in enumerate(fin_qas):
+            if i % task_size == 0:
+                if writer is not None:
+                    self._publish(writer)
+                writer = JSONLWriter(staging.pending / f"{n_tasks:06d}.jsonl.tmp")
+                n_tasks += 1
+            writer.write(fin_qa)
+        if writer is not None:
+            self._publish(writer)
+
+        staging.path.rename(self.path)
+        return n_tasks
+
+    @staticmethod
+    def _publish(writer: JSONLWriter) -> None:
+        """Close a task written under a temporary name and make it visible."""
+        writer.close()
+        writer.path.rename(writer.path.with_suffix(""))
+
+    def claim(self) -> str | None:
+        """Claim the first pending task, None when there is none left."""
+        for path in sorted(self.pending.glob("*.jsonl")):
+            try:
+                path.rename(self.claimed / path.name)
+            except FileNotFoundError:
+                continue  # Claimed by another worker in the meantime
+            return path.stem
+        return None
+
+    def read(self, task: str) -> Iterator[FinQA]:
+        """Iterate over the documents of a claimed task."""
+        for data in iter_jsonl(self.claimed / f"{task}.jsonl"):
+            yield FinQA.model_validate(data)
+
+    def writer(self, task: str) -> JSONLWriter:
+        """Return a writer for the answers of a claimed task."""
+        return JSONLWriter(self.done / f"{task}.jsonl.tmp")
+
+    @staticmethod
+    def attempts(task: str) -> int:
+        """Return the number of earlier failed attempts of a task."""
+        return int(task.partition(".")[2] or 0)
+
+    def complete(self, task: str) -> None:
+        """Publish the answers of a task written with `writer`."""
+        index = task.partition(".")[0]
+        (self.done / f"{task}.jsonl.tmp").rename(self.done / f"{index}.jsonl")
+        (self.claimed / f"{task}.jsonl").unlink()
+
+    def abandon(self, task: str) -> None:
+        """Drop the answers of a task and count the failed attempt.
+
+        The task stays claimed until it is requeued.
+        """
+        (self.done / f"{task}.jsonl.tmp").unlink(missing_ok=True)
+        index = task.partition(".")[0]
+        (self.claimed / f"{task}.jsonl").rename(
+            self.claimed / f"{index}.{self.attempts(task) + 1}.jsonl"
+        )
+
+    def requeue_claimed(self) -> int:
+        """Put the claimed tasks back, e.g. after the workers were interrupted.
+
+        Returns:
+            int: The number of requeued tasks.
+
+        """
+        tasks = list(self.claimed.glob("*.jsonl"))
+        for path in tasks:
+            (self.done / f"{path.stem}.jsonl.tmp").unlink(missing_ok=True)
+            path.rename(self.pending / path.name)
+        return len(tasks)
+
+    def remaining(self) -> int:
+        """Return the number of pending and claimed tasks."""
+        return sum(
+            1
+            for directory in (self.pending, self.claimed)
+            for _ in directory.glob("*.jsonl")
+        )
+
+    def completed(self) -> list[Path]:
+        """Return the answer files of the completed tasks, in dataset order."""
+        return sorted(self.done.glob("*.jsonl"))
+
+    def iter_answered(self) -> Iterator[FinQA]:
+        """Iterate over the answered documents of all completed tasks in order."""
+        for path in self.completed():
+            for data in iter_jsonl(path):
+                yield FinQA.model_validate(data)
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+import tqdm
+
+from deepseek_fin_qa.schemas.qa import QA, Answer, FinQA
+from deepseek_fin_qa.settings import settings
+
+# Keep tqdm from starting its monitor thread, the cache tests fork processes and
+# forking a process with running threads is not safe
+tqdm.tqdm.monitor_interval = 0
+
+
+@pytest.fixture
+def fake_backend(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Use the fake backend with a cache inside the temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "backend", "fake")
+
+
+def make_fin_qa(  # noqa: PLR0913
+    n_turns: int = 2,
+    *,
+    questions: list[str] | None = None,
+    pre_text: str = "",
+    post_text: str = "",
+    table: list[list[str]] | None = None,
+    id: str | None = None,  # noqa: A002
+) -> FinQA:
+    """Create a FinQA document with unanswered questions.
+
+    The questions default to "Question {i}?" for `n_turns` turns, all with the
+    target answer 0.
+    """
+    if questions is None:
+        questions = [f"Question {i}?" for i in range(n_turns)]
+    return FinQA(
+        id=id,
+        pre_text=pre_text,
+        post_text=post_text,
+        table=[] if table is None else table,
+        qa_list=[
+            QA(question=question, target_answer=Answer(value="0", program="0"))
+            for question in questions
+        ],
+    )
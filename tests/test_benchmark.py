@@ -0,0 +1,65 @@
+import json
+from dataclasses import asdict
+from pathlib import Path
+
+from deepseek_fin_qa.schemas.qa import FinQADataset
+from scripts.benchmark import (
+    BenchmarkResult,
+    find_regressions,
+    make_raw_dataset,
+    run_benchmarks,
+)
+
+
+def test_make_raw_dataset(tmp_path: Path) -> None:
+    """Test that the synthetic dataset loads with the expected size."""
+    raw = make_raw_dataset(n_questions=10, turns=4)
+    assert len(raw) == 3
+
+    path = tmp_path / "dataset.json"
+    path.write_text(json.dumps(raw))
+    dataset = FinQADataset.from_file(str(path))
+    assert sum(len(fin_qa) for fin_qa in dataset) == 10
+    # The target values are the outputs of the programs
+    for fin_qa in dataset:
+        for qa in fin_qa:
+            qa.llm_answer = qa.target_answer
+            assert qa.score.execution
+
+
+def test_run_benchmarks(tmp_path: Path) -> None:
+    """Test that every benchmark runs and regressions are detected."""
+    results = {"40": run_benchmarks(40, tmp_path, rounds=1)}
+
+    assert set(results["40"]) == {
+        "evaluate_program",
+        "get_execution_match",
+        "parse",
+        "list_to_markdown_table",
+        "from_file",
+        "cache_set",
+        "cache_get",
+        "process_data",
+        "load_answered_models",
+        "load_answered_records",
+        "tally_models",
+        "tally_records",
+    }
+    assert all(result.per_second > 0 for result in results["40"].values())
+    assert results["40"]["load_answered_records"].peak_bytes > 0
+
+    # Test case 1: no regression against itself
+    baseline = {
+        size: {name: asdict(result) for name, result in benchmarks.items()}
+        for size, benchmarks in results.items()
+    }
+    assert find_regressions(results, baseline, threshold=0.2) == []
+
+    # Test case 2: half the throughput of the baseline is a regression
+    slower = {"40": {"parse": BenchmarkResult(items=40, seconds=2.0)}}
+    baseline = {"40": {"parse": asdict(BenchmarkResult(items=40, seconds=1.0))}}
+    assert len(find_regressions(slower, baseline, threshold=0.2)) == 1
+    assert find_regressions(slower, baseline, threshold=0.6) == []
+
+    # Test case 3: benchmarks missing from the baseline are skipped
+    assert find_regressions(slower, {}, threshold=0.2) == []
@@ -0,0 +1,311 @@
+import fnmatch
+import json
+import multiprocessing
+import socketserver
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import ClassVar
+
+import pytest
+from llama_index.core.llms import ChatMessage
+
+from deepseek_fin_qa.models.fake import FakeModel
+from deepseek_fin_qa.schemas.qa import Answer, FinQADataset
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.cache import (
+    CACHE_BACKENDS,
+    CACHE_KEY_VERSION,
+    ChatCache,
+    JSONLChatCache,
+    MemoryChatCache,
+    RedisError,
+    cache_key,
+    legacy_query,
+    open_cache,
+)
+from scripts.rekey_cache import rekey_cache
+from tests.test_qa import write_dataset
+
+
+def write_entries(backend: str, path: str, worker: int, n: int) -> None:
+    """Write cache entries from a separate process."""
+    cache = open_cache(Path(path), backend)
+    for i in range(n):
+        cache.set(f"query-{worker}-{i}", f"value-{worker}-{i}")
+    cache.close()
+
+
+@pytest.mark.parametrize("backend", list(CACHE_BACKENDS))
+def test_cache_roundtrip(backend: str, tmp_path: Path) -> None:
+    """Test that values survive reopening the cache."""
+    cache = open_cache(tmp_path / "model", backend)
+    assert cache.get("query") is None
+
+    cache.set("query", "value")
+    cache.set("query", "new value")
+    assert cache.get("query") == "new value"
+    cache.close()
+
+    cache = open_cache(tmp_path / "model", backend)
+    assert cache.get("query") == "new value"
+    assert len(cache) == 1
+
+
+@pytest.mark.parametrize("backend", ["jsonl", "sqlite", "blob"])
+def test_cache_concurrent_writers(backend: str, tmp_path: Path) -> None:
+    """Test that several writer processes do not lose entries."""
+    path = str(tmp_path / "model")
+    processes = [
+        multiprocessing.Process(target=write_entries, args=(backend, path, worker, 50))
+        for worker in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    cache = open_cache(Path(path), backend)
+    assert len(cache) == 200
+    assert cache.get("query-3-49") == "value-3-49"
+
+
+class RedisStandIn(socketserver.StreamRequestHandler):
+    """Minimal stand-in for a Redis server, keeping the data in memory."""
+
+    data: ClassVar[dict[str, str]] = {}
+
+    def read_command(self) -> list[str] | None:
+        """Read a command sent as an array of bulk strings."""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    @staticmethod
+    def encode(reply: str | int | list | None) -> bytes:
+        """Encode a reply."""
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(map(RedisStandIn.encode, reply))
+        encoded = reply.encode()
+        return b"$%d\r\n%b\r\n" % (len(encoded), encoded)
+
+    def handle(self) -> None:
+        """Answer the commands of a connection."""
+        while (args := self.read_command()) is not None:
+            match args:
+                case ["GET", key]:
+                    reply = self.encode(self.data.get(key))
+                case ["MGET", *keys]:
+                    reply = self.encode([self.data.get(key) for key in keys])
+                case ["SET", key, value]:
+                    self.data[key] = value
+                    reply = b"+OK\r\n"
+                case ["SCAN", _, "MATCH", pattern, "COUNT", _]:
+                    keys = [key for key in self.data if fnmatch.fnmatch(key, pattern)]
+                    reply = self.encode(["0", keys])
+                case _:
+                    reply = f"-ERR unknown command {args[0]}\r\n".encode()
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def redis_url() -> Iterator[str]:
+    """Run the Redis stand-in and return its URL."""
+    RedisStandIn.data.clear()
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RedisStandIn)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_cache(redis_url: str, tmp_path: Path) -> None:
+    """Test that workers share values through a Redis compatible server."""
+    caches = [open_cache(tmp_path / "model", "redis", redis_url) for _ in range(4)]
+
+    def write(worker: int) -> None:
+        for i in range(50):
+            caches[worker].set(f"query-{worker}-{i}", f"value-{worker}-{i}")
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Test case 1: values written by one worker are read by the others
+    assert caches[0].get("query-3-49") == "value-3-49"
+    assert caches[3].get("query-0-0") == "value-0-0"
+    assert caches[1].get("missing") is None
+    assert len(caches[2]) == 200
+    assert dict(caches[2].items())[ChatCache.key("query-1-7")] == "value-1-7"
+
+    # Test case 2: the connection is reopened after it was closed
+    caches[0].close()
+    assert caches[0].get("query-2-2") == "value-2-2"
+
+    # Test case 3: error replies are raised
+    with pytest.raises(RedisError):
+        caches[0]._command("FLUSHALL")  # noqa: SLF001
+
+
+def test_memory_cache(tmp_path: Path) -> None:
+    """Test the LRU eviction and the lookup counters of the memory front."""
+    backend = open_cache(tmp_path / "model", "sqlite")
+    entry_size = len(ChatCache.key("query-0")) + len("value-0")
+    cache = MemoryChatCache(backend, max_bytes=3 * entry_size)
+
+    for i in range(4):
+        cache.set(f"query-{i}", f"value-{i}")
+
+    # Test case 1: the least recently used value was evicted
+    assert cache.get("query-1") == "value-1"
+    assert cache.get("query-0") == "value-0"
+    assert cache.stats.memory_hits == 1
+    assert cache.stats.hits == 1
+
+    # Test case 2: the value evicted when query-0 was read back
+    assert cache.get("query-2") == "value-2"
+    assert cache.stats.hits == 2
+
+    # Test case 3: misses are counted and the latency is measured
+    assert cache.get("missing") is None
+    assert cache.stats.misses == 1
+    assert cache.stats.lookups == 4
+    assert cache.stats.hit_ratio == 0.75
+    assert cache.stats.mean_lookup_seconds > 0
+    assert len(cache) == 4
+
+
+def test_jsonl_cache_compact(tmp_path: Path) -> None:
+    """Test that compaction drops overwritten and corrupted records."""
+    cache = JSONLChatCache(tmp_path / "model.jsonl")
+    for i in range(10):
+        cache.set("query", f"value-{i}")
+    with cache.path.open("a") as file:
+        file.write('{"key": "truncated\n')
+
+    cache.compact()
+    assert len(cache.path.read_text().splitlines()) == 1
+    assert JSONLChatCache(cache.path).get("query") == "value-9"
+
+
+def test_jsonl_cache_truncated_tail(tmp_path: Path) -> None:
+    """Test that a record appended after a truncated one is not lost."""
+    cache = JSONLChatCache(tmp_path / "model.jsonl")
+    cache.set("first", "value-1")
+    with cache.path.open("a") as file:
+        file.write('{"key": "truncated", "va')
+
+    JSONLChatCache(cache.path).set("second", "value-2")
+    reloaded = JSONLChatCache(cache.path)
+    assert reloaded.get("first") == "value-1"
+    assert reloaded.get("second") == "value-2"
+    assert reloaded.get("truncated") is None
+
+
+def test_open_cache_migrates_json(tmp_path: Path) -> None:
+    """Test the one-shot migration from the legacy JSON cache."""
+    legacy = {ChatCache.key(f"query-{i}"): f"value-{i}" for i in range(5)}
+    (tmp_path / "model.json").write_text(json.dumps(legacy))
+
+    cache = open_cache(tmp_path / "model", "sqlite")
+    assert len(cache) == 5
+    assert cache.get("query-2") == "value-2"
+    assert (tmp_path / "model.sqlite").exists()
+
+
+def test_cache_key() -> None:
+    """Test that equivalent requests share the canonical cache key."""
+    messages = [("system", "Answer the question."), ("user", "Context:\n  Revenue")]
+    key = cache_key(messages, "model", {"temperature": 0})
+
+    # Test case 1: keys are versioned and ignore whitespace changes
+    assert key.startswith(f"v{CACHE_KEY_VERSION}-")
+    assert key == cache_key(
+        [("system", "Answer the question. "), ("user", "Context:\n\tRevenue\n")],
+        "model",
+        {"temperature": 0},
+    )
+
+    # Test case 2: contents, roles, model and parameters change the key
+    assert key != cache_key(messages[:1], "model", {"temperature": 0})
+    assert key != cache_key(
+        [("user", m) for _, m in messages], "model", {"temperature": 0}
+    )
+    assert key != cache_key(messages, "other", {"temperature": 0})
+    assert key != cache_key(messages, "model", {"temperature": 1})
+
+    # Test case 3: the legacy query matches the repr of the chat messages
+    chat_messages = [
+        ChatMessage(role=role, content=content) for role, content in messages
+    ]
+    assert legacy_query(messages) == str(chat_messages)
+
+
+def test_rekey_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that responses cached under legacy keys are moved to canonical keys."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=3)
+    dataset = list(FinQADataset.iter_file(str(src)))
+    cache = str(tmp_path / "cache")
+
+    # Cache the conversations the way they were cached before the canonical keys
+    model = FakeModel("fake", cache=cache)
+    model._set_cached = lambda messages, response: model.cache.set(  # noqa: SLF001
+        str(messages), response
+    )
+    for fin_qa in dataset:
+        model.answer_questions(fin_qa)
+    model.cache.close()
+
+    monkeypatch.setattr(settings, "backend", "fake")
+    monkeypatch.setattr(settings, "model", "fake")
+    rekey_cache(str(src), cache=cache)
+
+    model = FakeModel("fake", cache=cache)
+    assert len(model.cache) == 12  # Legacy and canonical keys
+    model.cache.get = lambda query: pytest.fail(f"Legacy lookup of {query}")
+    model._chat = lambda _: pytest.fail("Cache miss")  # noqa: SLF001
+    for fin_qa in dataset:
+        assert model.replay_cached(fin_qa) == 2
+        assert model.answer_questions(fin_qa) == [Answer(value="0.00", program="0")] * 2
+
+
+def test_cache_miss_counts_one_lookup(tmp_path: Path) -> None:
+    """Test that a miss is looked up once, and counted once with legacy lookups."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=1)
+    (fin_qa,) = FinQADataset.iter_file(str(src))
+
+    # Test case 1: without legacy lookups every miss reaches the backend once
+    model = FakeModel("fake", cache=str(tmp_path / "cache"))
+    backend_lookups = []
+    get_key = model.cache.backend.get_key
+
+    def count_get_key(key: str) -> str | None:
+        backend_lookups.append(key)
+        return get_key(key)
+
+    model.cache.backend.get_key = count_get_key
+    model.answer_questions(fin_qa)
+    assert len(backend_lookups) == len(fin_qa)
+    assert model.cache.stats.lookups == model.cache.stats.misses == len(fin_qa)
+    assert model.metrics.summary()["cache"]["misses"] == len(fin_qa)
+
+    # Test case 2: legacy lookups are not counted as a second miss
+    model = FakeModel("fake", cache=str(tmp_path / "legacy"))
+    model.cache_legacy_lookup = True
+    model.answer_questions(fin_qa)
+    assert model.cache.stats.lookups == model.cache.stats.misses == len(fin_qa)
@@ -0,0 +1,188 @@
+import asyncio
+import time
+
+import pytest
+from llama_index.core.llms import ChatMessage, ChatResponse
+
+from deepseek_fin_qa.answering import aanswer_dataset, answer_dataset
+from deepseek_fin_qa.models.fake import FakeModel
+from deepseek_fin_qa.schemas.qa import FinQADataset
+from deepseek_fin_qa.utils.concurrency import SingleFlight, iterate_async, ordered_map
+from tests.conftest import make_fin_qa
+
+
+def make_dataset(n_docs: int, n_turns: int = 2) -> FinQADataset:
+    """Create a synthetic dataset."""
+    return FinQADataset(
+        finqa_list=[
+            make_fin_qa(
+                n_turns,
+                pre_text=f"Document {i}",
+                table=[["year", "value"], ["2020", str(i)]],
+            )
+            for i in range(n_docs)
+        ]
+    )
+
+
+def test_ordered_map() -> None:
+    """Test that results keep the input order and concurrency is bounded."""
+    running = 0
+    max_running = 0
+
+    async def work(i: int) -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01 * (i % 3))
+        running -= 1
+        return i
+
+    async def collect() -> list[int]:
+        return [i async for i in ordered_map(work, range(20), concurrency=4)]
+
+    assert asyncio.run(collect()) == list(range(20))
+    assert max_running == 4
+
+
+def test_ordered_map_order() -> None:
+    """Test that the calls of every window are started in the requested order."""
+    started = []
+
+    async def work(i: int) -> int:
+        started.append(i)
+        await asyncio.sleep(0.01)
+        return i
+
+    def order(batch: list[int]) -> list[int]:
+        return [2, 0, 1][: len(batch)]
+
+    async def collect() -> list[int]:
+        return [
+            i
+            async for i in ordered_map(
+                work, range(6), concurrency=2, window=3, order=order
+            )
+        ]
+
+    assert asyncio.run(collect()) == list(range(6))
+    assert started == [2, 0, 1, 5, 3, 4]
+
+
+def test_ordered_map_order_no_barrier() -> None:
+    """Test that a slow call does not hold back the calls of the next window."""
+    events = []
+
+    async def work(i: int) -> int:
+        events.append(("start", i))
+        await asyncio.sleep(0.05 if i == 0 else 0.001)
+        events.append(("end", i))
+        return i
+
+    async def collect() -> list[int]:
+        return [
+            i
+            async for i in ordered_map(
+                work,
+                range(6),
+                concurrency=2,
+                window=3,
+                order=lambda batch: list(range(len(batch))),
+            )
+        ]
+
+    # Test case 1: the next window starts while the first result is awaited
+    assert asyncio.run(collect()) == list(range(6))
+    assert events.index(("start", 3)) < events.index(("end", 0))
+
+
+def test_answer_dataset_streams() -> None:
+    """Test that answered documents are yielded without waiting for the window."""
+    dataset = make_dataset(n_docs=8)
+    model = FakeModel("fake", cache=None)
+
+    # Test case 1: the first document is yielded once its two turns are answered
+    results = answer_dataset(model, dataset)
+    assert next(results).pre_text == "Document 0"
+    assert model.usage.requests == 2
+    assert len(list(results)) == 7
+
+
+def test_aanswer_dataset() -> None:
+    """Test concurrent answering against a fake LLM with injected latency."""
+    dataset = make_dataset(n_docs=8)
+    model = FakeModel("fake", cache=None, latency=0.05)
+
+    start = time.perf_counter()
+    results = list(iterate_async(aanswer_dataset(model, dataset, concurrency=1)))
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = list(iterate_async(aanswer_dataset(model, dataset, concurrency=8)))
+    concurrent = time.perf_counter() - start
+
+    assert [fin_qa.pre_text for fin_qa in results] == [
+        f"Document {i}" for i in range(8)
+    ]
+    assert all(qa.llm_answer is not None for fin_qa in results for qa in fin_qa)
+    # 16 sequential turns vs. 2 turns per document answered side by side
+    assert concurrent < sequential / 4
+
+
+def test_single_flight() -> None:
+    """Test that concurrent calls with the same key are coalesced."""
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    calls = []
+
+    async def call(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        if key == "error":
+            raise ValueError(key)
+        return key.upper()
+
+    async def run(key: str) -> tuple[str, bool]:
+        return await single_flight.run(key, lambda: call(key))
+
+    async def main() -> list[tuple[str, bool]]:
+        return await asyncio.gather(run("a"), run("b"), run("a"), run("a"))
+
+    # Test case 1: one call per key in flight, the others share its result
+    assert asyncio.run(main()) == [("A", False), ("B", False), ("A", True), ("A", True)]
+    assert calls == ["a", "b"]
+    assert len(single_flight) == 0
+
+    # Test case 2: finished calls are not reused
+    assert asyncio.run(run("a")) == ("A", False)
+
+    # Test case 3: errors are raised by every waiting call
+    async def errors() -> list[object]:
+        return await asyncio.gather(run("error"), run("error"), return_exceptions=True)
+
+    assert [type(error) for error in asyncio.run(errors())] == [ValueError] * 2
+    with pytest.raises(ValueError, match="error"):
+        asyncio.run(run("error"))
+
+
+def test_aanswer_dataset_deduplicated() -> None:
+    """Test that identical documents answered concurrently share requests."""
+    dataset = make_dataset(n_docs=4)
+    dataset.finqa_list += [fin_qa.model_copy() for fin_qa in dataset]
+    model = FakeModel("fake", cache=None, latency=0.05)
+    requests = []
+    achat = model._achat  # noqa: SLF001
+
+    async def counted(messages: list[ChatMessage]) -> ChatResponse:
+        requests.append(messages[-1].content)
+        return await achat(messages)
+
+    model._achat = counted  # noqa: SLF001
+    results = list(iterate_async(aanswer_dataset(model, dataset, concurrency=8)))
+
+    assert all(qa.llm_answer is not None for fin_qa in results for qa in fin_qa)
+    assert len(requests) == 8
+    assert len(set(requests)) == 8
+    summary = model.metrics.summary()
+    assert summary["requests"] == 8
+    assert summary["deduplicated_requests"] == 8
+    assert summary["deduplicated_tokens"] > 0
@@ -0,0 +1,128 @@
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import pytest
+
+from deepseek_fin_qa.schemas.qa import FinQA, FinQADataset
+from deepseek_fin_qa.utils.workqueue import WorkQueue
+from scripts import distribute as distribute_module
+from scripts.distribute import MAX_TASK_ATTEMPTS, distribute, run_worker
+from tests.test_qa import write_dataset
+
+
+def test_work_queue(tmp_path: Path) -> None:
+    """Test claiming, completing and requeueing the tasks of a work queue."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=5)
+    queue = WorkQueue(tmp_path / "queue")
+    assert not queue.exists()
+
+    # Test case 1: the documents are split into tasks claimed one at a time
+    assert queue.create(FinQADataset.iter_file(str(src)), task_size=2) == 3
+    assert queue.exists()
+    first, second = queue.claim(), queue.claim()
+    assert (first, second) == ("000000", "000001")
+    assert [fin_qa.id for fin_qa in queue.read(second)] == ["doc-2", "doc-3"]
+
+    # Test case 2: answers are only visible once the task is complete
+    with queue.writer(second) as writer:
+        for fin_qa in queue.read(second):
+            writer.write(fin_qa)
+    assert queue.completed() == []
+    queue.complete(second)
+    assert [path.stem for path in queue.completed()] == ["000001"]
+    assert queue.remaining() == 2
+
+    # Test case 3: tasks of interrupted workers are claimed again
+    assert queue.requeue_claimed() == 1
+    assert [queue.claim(), queue.claim(), queue.claim()] == ["000000", "000002", None]
+
+
+def test_work_queue_interrupted_create(tmp_path: Path) -> None:
+    """Test that a queue only exists once all of its tasks are written."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=5)
+    queue = WorkQueue(tmp_path / "queue")
+
+    def interrupted() -> Iterator[FinQA]:
+        for i, fin_qa in enumerate(FinQADataset.iter_file(str(src))):
+            if i == 3:
+                raise KeyboardInterrupt
+            yield fin_qa
+
+    # Test case 1: an interrupted creation leaves no queue behind
+    with pytest.raises(KeyboardInterrupt):
+        queue.create(interrupted(), task_size=2)
+    assert not queue.exists()
+
+    # Test case 2: creating the queue again writes all tasks
+    assert queue.create(FinQADataset.iter_file(str(src)), task_size=2) == 3
+    assert queue.remaining() == 3
+    assert not (tmp_path / "queue.tmp").exists()
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_run_worker_failed_documents(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a task with a failed document is not completed."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=4)
+    queue = WorkQueue(tmp_path / "queue")
+    queue.create(FinQADataset.iter_file(str(src)), task_size=2)
+
+    def answer_dataset(_: object, fin_qas: Iterable[FinQA]) -> Iterator[FinQA | None]:
+        for fin_qa in fin_qas:
+            yield None if fin_qa.id == "doc-1" else fin_qa
+
+    monkeypatch.setattr(distribute_module, "answer_dataset", answer_dataset)
+    run_worker(str(queue.path), "http://host-a", "fake", "fake", 1)
+
+    # Test case 1: only the task without failures is done, the other one is kept
+    assert [path.stem for path in queue.completed()] == ["000001"]
+    assert queue.remaining() == 1
+
+    # Test case 2: the next run requeues the whole task, counting the attempt
+    assert queue.requeue_claimed() == 1
+    task = queue.claim()
+    assert queue.attempts(task) == 1
+    assert [fin_qa.id for fin_qa in queue.read(task)] == ["doc-0", "doc-1"]
+
+    # Test case 3: the last attempt completes the task without the failed document
+    assert queue.requeue_claimed() == 1
+    for _ in range(MAX_TASK_ATTEMPTS - 1):
+        run_worker(str(queue.path), "http://host-a", "fake", "fake", 1)
+        queue.requeue_claimed()
+    assert queue.remaining() == 0
+    assert [path.stem for path in queue.completed()] == ["000000", "000001"]
+    assert [fin_qa.id for fin_qa in queue.iter_answered()] == [
+        "doc-0",
+        "doc-2",
+        "doc-3",
+    ]
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_distribute(tmp_path: Path) -> None:
+    """Test answering a dataset with several workers and merging their answers."""
+    src = tmp_path / "dataset.json"
+    out = tmp_path / "out.jsonl"
+    write_dataset(src, n_docs=5)
+
+    distribute(
+        str(src),
+        str(out),
+        base_url=["http://host-a", "http://host-b"],
+        task_size=2,
+        concurrency=2,
+    )
+
+    # Test case 1: the merged output keeps the dataset order
+    answered = list(FinQADataset.iter_answered(str(out)))
+    assert [fin_qa.id for fin_qa in answered] == [f"doc-{i}" for i in range(5)]
+    assert FinQADataset(finqa_list=answered).score.execution == 0.5
+
+    # Test case 2: running again merges the finished tasks of the queue again
+    out.unlink()
+    distribute(str(src), str(out), base_url=["http://host-a"])
+    assert len(list(FinQADataset.iter_answered(str(out)))) == 5
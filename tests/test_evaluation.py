@@ -1,10 +1,15 @@
 import math
 
 from deepseek_fin_qa.utils.evaluation import (
+    TABLE_FORMATS,
+    compile_program,
     evaluate_program,
     get_execution_match,
     get_program_output_match,
+    list_to_compact_markdown_table,
+    list_to_csv_table,
     list_to_markdown_table,
+    list_to_tsv_table,
     str_to_float,
 )
 
@@ -26,6 +31,33 @@ def test_evaluate_program() -> None:
     result = evaluate_program(code)
     assert result == "yes"
 
+    # Test case 4: Intermediate results are not rounded through strings
+    code = "multiply(divide(3,100000),2)"
+    result = evaluate_program(code)
+    assert math.isclose(result, 6e-05)
+
+    # Test case 5: Identical sub-expressions
+    code = "divide(subtract(5,3),subtract(5,3))"
+    result = evaluate_program(code)
+    assert result == 1
+
+    # Test case 6: Malformed program falls back to best-effort evaluation
+    code = "subtract(100,50), divide(#0,50)"
+    result = evaluate_program(code)
+    assert result == 50
+
+
+def test_compile_program() -> None:
+    """Test parsing of programs into a tree."""
+    # Test case 1: Nested program
+    result = compile_program("add(5,subtract(10,-3))")
+    assert result == ("add", 5.0, ("subtract", 10.0, -3.0))
+
+    # Test case 2: Malformed programs
+    assert compile_program("") is None
+    assert compile_program("add(1,2),3") is None
+    assert compile_program("table_max(x)") is None
+
 
 def test_list_to_markdown_table() -> None:
     """Test conversion of a list of lists into a Markdown table."""
@@ -41,6 +73,27 @@ def test_list_to_markdown_table() -> None:
     assert result == expected_output
 
 
+def test_table_formats() -> None:
+    """Test the compact renderings of a table."""
+    data = [["", "2019", "2020"], ["net  revenue ", "1,000", "1,200"], ["cash"]]
+
+    # Test case 1: cells are trimmed and short rows padded to the header
+    assert list_to_compact_markdown_table(data) == (
+        "||2019|2020|\n|-|-|-|\n|net revenue|1,000|1,200|\n|cash|||\n"
+    )
+
+    # Test case 2: CSV quotes cells with commas, TSV does not need to
+    assert list_to_csv_table(data) == (
+        ',2019,2020\nnet revenue,"1,000","1,200"\ncash,,\n'
+    )
+    assert list_to_tsv_table(data) == (
+        "\t2019\t2020\nnet revenue\t1,000\t1,200\ncash\t\t\n"
+    )
+
+    # Test case 3: every format renders an empty table as nothing
+    assert all(render([]) == "" for render in TABLE_FORMATS.values())
+
+
 def test_get_execution_match() -> None:
     """Test matching of execution values."""
     # Test case 1: Matching string values
@@ -0,0 +1,143 @@
+import json
+from pathlib import Path
+
+import pytest
+from llama_index.core.llms import ChatMessage, ChatResponse
+
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.cache import CacheStats
+from deepseek_fin_qa.utils.metrics import (
+    RunMetrics,
+    TurnMetrics,
+    reasoning_tokens,
+    reported_usage,
+)
+from scripts.qa import process_data
+from tests.test_qa import write_dataset
+
+
+def make_turn(*, cached: bool = False, parsed: bool = True) -> TurnMetrics:
+    """Create the measurements of a turn."""
+    return TurnMetrics(
+        document="doc-0",
+        turn=0,
+        cached=cached,
+        seconds=0.0 if cached else 2.0,
+        prompt_tokens=0 if cached else 100,
+        completion_tokens=0 if cached else 50,
+        reasoning_tokens=40,
+        parsed=parsed,
+    )
+
+
+def test_reasoning_tokens() -> None:
+    """Test counting the tokens of the <think> block."""
+    # Test case 1: closed block
+    assert reasoning_tokens("<think>\none two three\n</think>{}") == 3
+
+    # Test case 2: unclosed block, e.g. a truncated response
+    assert reasoning_tokens("<think>one two") == 2
+
+    # Test case 3: no block
+    assert reasoning_tokens('{"value": "1"}') == 0
+
+
+def test_reported_usage() -> None:
+    """Test reading the token usage reported by the backends."""
+    message = ChatMessage(role="assistant", content="")
+
+    # Test case 1: OpenAI compatible backends
+    response = ChatResponse(
+        message=message,
+        additional_kwargs={"prompt_tokens": 10, "completion_tokens": 5},
+    )
+    assert reported_usage(response) == (10, 5)
+
+    # Test case 2: Ollama
+    response = ChatResponse(
+        message=message, raw={"usage": {"prompt_tokens": 7, "completion_tokens": 3}}
+    )
+    assert reported_usage(response) == (7, 3)
+
+    # Test case 3: nothing reported
+    assert reported_usage(ChatResponse(message=message)) == (None, None)
+    assert reported_usage("response") == (None, None)
+
+
+def test_run_metrics() -> None:
+    """Test the aggregation and export of the run metrics."""
+    metrics = RunMetrics(cache_stats=CacheStats(hits=1, misses=1, lookup_seconds=0.02))
+    metrics.record_turn(make_turn())
+    metrics.record_turn(make_turn(parsed=False))
+    metrics.record_turn(make_turn(cached=True))
+
+    summary = metrics.summary()
+    assert summary["turns"] == 3
+    assert summary["requests"] == 2
+    assert summary["completion_tokens"] == 100
+    assert summary["reasoning_tokens"] == 120
+    assert summary["tokens_per_second"] == 25
+    assert summary["latency_quantiles"]["0.5"] == 2
+    assert summary["parse_failure_rate"] == pytest.approx(1 / 3)
+    assert summary["cache"]["hit_ratio"] == 0.5
+    assert metrics.postfix() == {
+        "tok/s": "25.0",
+        "latency": "2.0s",
+        "hit": "50%",
+        "fail": "33%",
+    }
+
+    prometheus = metrics.to_prometheus(labels={"model": "fake"})
+    assert "# TYPE finqa_chat_requests_total counter" in prometheus
+    assert 'finqa_chat_requests_total{model="fake"} 2' in prometheus
+    assert 'finqa_cache_lookups_total{model="fake",result="miss"} 1' in prometheus
+    assert 'finqa_chat_latency_seconds{model="fake",quantile="0.99"} 2.0' in prometheus
+
+
+def test_early_stop_savings() -> None:
+    """Test the estimate of the tokens and time saved by early stops."""
+    metrics = RunMetrics()
+
+    # Test case 1: nothing to compare with
+    assert metrics.early_stop_savings() == {"tokens": 0.0, "seconds": 0.0}
+
+    # Test case 2: budget stops are compared with the mean complete response
+    metrics.record_turn(make_turn())
+    metrics.record_turn(make_turn())
+    metrics.record_turn(
+        TurnMetrics(
+            document="doc-0",
+            turn=1,
+            cached=False,
+            seconds=1.0,
+            prompt_tokens=100,
+            completion_tokens=20,
+            reasoning_tokens=15,
+            parsed=True,
+            early_stop="budget",
+        )
+    )
+    metrics.record_turn(make_turn(cached=True))
+    assert metrics.early_stop_savings() == {"tokens": 30, "seconds": 30 / 24}
+    assert metrics.summary()["early_stop"]["budget"] == 1
+    assert 'finqa_early_stops_total{reason="budget"} 1' in metrics.to_prometheus()
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_process_data_metrics(tmp_path: Path) -> None:
+    """Test that a run writes its metrics."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=3)
+
+    process_data(str(src), str(tmp_path / "output.json"), metrics="metrics.json")
+    report = json.loads((tmp_path / "metrics.json").read_text())
+    assert report["summary"]["requests"] == 6
+    assert report["summary"]["cache"]["misses"] == 6
+    assert [turn["turn"] for turn in report["turns"]] == [0, 1] * 3
+
+    # The second run is answered from the cache
+    process_data(str(src), str(tmp_path / "output.json"), metrics="metrics.prom")
+    prometheus = (tmp_path / "metrics.prom").read_text()
+    labels = f'backend="fake",model="{settings.model}"'
+    assert f"finqa_chat_requests_total{{{labels}}} 0" in prometheus
+    assert f'finqa_cache_lookups_total{{{labels},result="hit"}} 6' in prometheus
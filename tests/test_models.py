@@ -0,0 +1,396 @@
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import openai
+import pytest
+from llama_index.core.llms import ChatMessage, ChatResponse
+
+from deepseek_fin_qa.answering import aanswer_dataset, answer_dataset
+from deepseek_fin_qa.models.base import EarlyStopDetector, ReasoningOutputParser
+from deepseek_fin_qa.models.fake import FAKE_RESPONSE, FakeModel
+from deepseek_fin_qa.models.groq import GroqModel
+from deepseek_fin_qa.models.ollama import MIN_CONTEXT_WINDOW, OllamaModel
+from deepseek_fin_qa.prompts import FINQA_ANSWER_NOW_PROMPT
+from deepseek_fin_qa.schemas.qa import Answer, FinQA
+from deepseek_fin_qa.settings import settings
+from deepseek_fin_qa.utils.concurrency import iterate_async
+from deepseek_fin_qa.utils.ratelimit import RateLimiter
+from deepseek_fin_qa.utils.tokens import count_tokens
+from tests.conftest import make_fin_qa
+
+
+@pytest.fixture
+def fin_qa() -> FinQA:
+    """Create a FinQA document with three turns."""
+    return make_fin_qa(
+        3,
+        pre_text="Revenue grew strongly. " * 50,
+        table=[["year", "revenue"], ["2019", "100"], ["2020", "150"]],
+    )
+
+
+def test_answer_questions(fin_qa: FinQA) -> None:
+    """Test that every turn is answered and parsed."""
+    model = FakeModel("fake", cache=None)
+    answers = model.answer_questions(fin_qa)
+
+    assert answers == [Answer(value="0.00", program="0")] * 3
+    assert model.usage.requests == 3
+    assert model.usage.savings == 0
+
+
+def test_answer_questions_context_once(fin_qa: FinQA) -> None:
+    """Test that the context is only sent with the first question."""
+    model = FakeModel("fake", cache=None)
+    model.context_mode = "once"
+    requests = []
+    model._chat = lambda messages: requests.append(list(messages)) or "{}"  # noqa: SLF001
+
+    model.answer_questions(fin_qa)
+
+    user_messages = [m.content for m in requests[-1] if m.role == "user"]
+    assert fin_qa.pre_text in user_messages[0]
+    assert all(fin_qa.pre_text not in message for message in user_messages[1:])
+    assert model.usage.prompt_tokens < model.usage.full_context_prompt_tokens
+    assert model.usage.savings > 0.1
+
+
+type Respond = Callable[[dict], tuple[int, dict[str, str], dict]]
+
+
+@contextlib.contextmanager
+def stub_server(respond: Respond) -> Iterator[tuple[str, list[dict]]]:
+    """Run a stub HTTP server recording the JSON payloads of POST requests."""
+    payloads: list[dict] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            payloads.append(payload)
+            status, headers, response = respond(payload)
+            body = json.dumps(response).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", payloads
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def ollama_server() -> Iterator[tuple[str, list[dict]]]:
+    """Run a stub Ollama server recording the chat request payloads."""
+
+    def respond(payload: dict) -> tuple[int, dict[str, str], dict]:
+        return (
+            200,
+            {},
+            {
+                "model": payload["model"],
+                "message": {"role": "assistant", "content": FAKE_RESPONSE},
+                "done": True,
+            },
+        )
+
+    with stub_server(respond) as server:
+        yield server
+
+
+def test_ollama_request_options(
+    fin_qa: FinQA,
+    ollama_server: tuple[str, list[dict]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the keep alive, context window and token cap sent to Ollama."""
+    base_url, payloads = ollama_server
+    monkeypatch.setattr(settings, "base_url", base_url)
+    monkeypatch.setattr(settings, "keep_alive", "1h")
+    monkeypatch.setattr(settings, "num_predict", 1024)
+    model = OllamaModel("deepseek-r1:14b", cache=None)
+
+    # Test case 1: short prompts fit the smallest context window
+    fin_qa.pre_text = "Revenue grew."
+    assert model.answer_questions(fin_qa) == [Answer(value="0.00", program="0")] * 3
+    assert len(payloads) == 3
+    for payload in payloads:
+        assert payload["keep_alive"] == "1h"
+        assert payload["options"]["num_ctx"] == MIN_CONTEXT_WINDOW
+        assert payload["options"]["num_predict"] == 1024
+        assert payload["options"]["temperature"] == 0
+
+    # Test case 2: the context window grows with the prompt length
+    fin_qa.pre_text = "Revenue grew strongly. " * 2000
+    model.answer_questions(fin_qa)
+    prompt_tokens = sum(
+        count_tokens(message["content"]) for message in payloads[-1]["messages"]
+    )
+    assert payloads[-1]["options"]["num_ctx"] >= prompt_tokens + 1024
+
+    # Test case 3: the context window never shrinks
+    fin_qa.pre_text = "Revenue grew."
+    model.answer_questions(fin_qa)
+    assert payloads[-1]["options"]["num_ctx"] == payloads[-4]["options"]["num_ctx"]
+
+    # Test case 4: the context window is capped
+    monkeypatch.setattr(settings, "max_context_window", 4096)
+    model = OllamaModel("deepseek-r1:14b", cache=None)
+    fin_qa.pre_text = "Revenue grew strongly. " * 2000
+    model.answer_questions(fin_qa)
+    assert payloads[-1]["options"]["num_ctx"] == 4096
+
+
+def test_ollama_request_order(
+    ollama_server: tuple[str, list[dict]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that documents sharing a prompt prefix are sent one after another."""
+    base_url, payloads = ollama_server
+    monkeypatch.setattr(settings, "base_url", base_url)
+    model = OllamaModel("deepseek-r1:14b", cache=None)
+    dataset = [
+        make_fin_qa(questions=["Q?"], pre_text=pre_text)
+        for pre_text in ["Report B", "Report A", "Report B", "Report A"]
+    ]
+
+    results = list(answer_dataset(model, dataset))
+
+    assert [fin_qa.pre_text for fin_qa in results] == [
+        "Report B",
+        "Report A",
+        "Report B",
+        "Report A",
+    ]
+    sent = [payload["messages"][-1]["content"] for payload in payloads]
+    assert ["Report A" in content for content in sent] == [True, True, False, False]
+
+    # Test case 2: the concurrent path starts the requests in the same order
+    payloads.clear()
+    results = list(iterate_async(aanswer_dataset(model, dataset, concurrency=1)))
+    assert [fin_qa.pre_text for fin_qa in results] == [
+        "Report B",
+        "Report A",
+        "Report B",
+        "Report A",
+    ]
+    sent = [payload["messages"][-1]["content"] for payload in payloads]
+    assert ["Report A" in content for content in sent] == [True, True, False, False]
+
+    # Test case 3: the question comes first by default, as in the baseline prompt
+    assert sent[0].index("Q?") < sent[0].index("Report A")
+
+    # Test case 4: the context first prompt puts the shared context first
+    payloads.clear()
+    model.prompt_order = "context_first"
+    list(answer_dataset(model, dataset))
+    sent = payloads[0]["messages"][-1]["content"]
+    assert sent.index("Report A") < sent.index("Q?")
+
+
+def test_groq_retries(
+    fin_qa: FinQA, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test that rate limited and failed requests are retried turn by turn."""
+    # Every second request is rate limited, the fourth one fails on the server
+    statuses = iter([200, 429, 200, 503, 429, 200])
+    error = {"error": {"message": "Slow down", "type": "rate_limit"}}
+
+    def respond(payload: dict) -> tuple[int, dict[str, str], dict]:
+        status = next(statuses)
+        if status != HTTPStatus.OK:
+            return status, {"retry-after-ms": "10"}, error
+        return (
+            200,
+            {},
+            {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": payload["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": FAKE_RESPONSE},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 10,
+                    "completion_tokens": 10,
+                    "total_tokens": 20,
+                },
+            },
+        )
+
+    monkeypatch.setattr(settings, "api_key", "test")
+    monkeypatch.setattr(settings, "retry_base_delay", 0.01)
+    monkeypatch.setattr(settings, "requests_per_minute", 6000)
+    with stub_server(respond) as (base_url, payloads):
+        monkeypatch.setattr(settings, "base_url", base_url)
+        model = GroqModel("deepseek-r1-distill-llama-70b", cache=None)
+        answers = model.answer_questions(fin_qa)
+
+    assert answers == [Answer(value="0.00", program="0")] * 3
+    assert len(payloads) == 6
+    # Only the failed turns are sent again
+    assert [len(payload["messages"]) for payload in payloads] == [2, 4, 4, 6, 6, 6]
+    assert caplog.text.count("retrying in 0.0s") == 3
+
+    # Test case 2: the error is raised when the retries are exhausted
+    statuses = iter([429] * 3)
+    monkeypatch.setattr(settings, "max_retries", 2)
+    with stub_server(respond) as (base_url, payloads):
+        monkeypatch.setattr(settings, "base_url", base_url)
+        model = GroqModel("deepseek-r1-distill-llama-70b", cache=None)
+        with pytest.raises(openai.RateLimitError):
+            model.answer_questions(fin_qa)
+    assert len(payloads) == 3
+
+    # Test case 3: failed attempts leave the token budget unchanged
+    statuses = iter([503, 200, 200, 200])
+    with stub_server(respond) as (base_url, payloads):
+        monkeypatch.setattr(settings, "base_url", base_url)
+        model = GroqModel("deepseek-r1-distill-llama-70b", cache=None)
+        model.limiter = RateLimiter(tokens_per_minute=100_000, clock=lambda: 0.0)
+        model.answer_questions(fin_qa)
+    assert len(payloads) == 4
+    assert model.limiter.tokens.balance == 100_000 - 3 * 20
+
+
+def test_answer_questions_cached(fin_qa: FinQA, tmp_path: Path) -> None:
+    """Test that responses are cached, starting from an empty cache."""
+    model = FakeModel("fake", cache=str(tmp_path))
+    model.answer_questions(fin_qa)
+    assert len(model.cache) == 3
+
+    model._chat = lambda _: pytest.fail("Cache miss")  # noqa: SLF001
+    assert model.answer_questions(fin_qa) == [Answer(value="0.00", program="0")] * 3
+
+
+class StreamingStub:
+    """Stand-in LLM streaming its responses one character at a time."""
+
+    def __init__(self, responses: list[str]) -> None:
+        """Initialize the StreamingStub with the responses to send in turn."""
+        self.responses = iter(responses)
+        self.requests: list[Sequence[ChatMessage]] = []
+        self.streamed = 0
+
+    def stream_chat(self, messages: Sequence[ChatMessage]) -> Iterator[ChatResponse]:
+        """Stream the next response, counting the characters sent."""
+        self.requests.append(messages)
+        text = next(self.responses)
+        for i, char in enumerate(text):
+            self.streamed += 1
+            yield ChatResponse(
+                message=ChatMessage(role="assistant", content=text[: i + 1]),
+                delta=char,
+            )
+
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage]
+    ) -> AsyncIterator[ChatResponse]:
+        """Stream the next response using the async API."""
+        chunks = self.stream_chat(messages)
+
+        async def gen() -> AsyncIterator[ChatResponse]:
+            for chunk in chunks:
+                yield chunk
+
+        return gen()
+
+
+def test_answer_questions_early_stop(
+    fin_qa: FinQA, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test cutting streamed responses after the answer or the reasoning budget."""
+    monkeypatch.setattr(settings, "early_stop", True)
+    monkeypatch.setattr(settings, "think_token_budget", 20)
+    answer = Answer(value="0.00", program="0")
+
+    # Test case 1: the generation stops as soon as the answer is complete
+    model = FakeModel("fake", cache=None)
+    model.model = StreamingStub([FAKE_RESPONSE + "\n\nLet me double check."] * 3)
+    assert model.answer_questions(fin_qa) == [answer] * 3
+    assert model.model.streamed == 3 * len(FAKE_RESPONSE)
+    assert model.metrics.answer_stops == 3
+
+    # Test case 2: long reasoning is cut and the answer is asked for
+    reasoning = "<think>\n" + "Let me think again. " * 10
+    model = FakeModel("fake", cache=None)
+    model.model = StreamingStub(
+        [reasoning, FAKE_RESPONSE, FAKE_RESPONSE, FAKE_RESPONSE]
+    )
+    assert model.answer_questions(fin_qa) == [answer] * 3
+    follow_up = model.model.requests[1]
+    assert follow_up[-2].content.endswith("</think>")
+    assert follow_up[-1].content == FINQA_ANSWER_NOW_PROMPT
+    assert len(follow_up[-2].content) < len(reasoning)
+    assert model.metrics.budget_stops == 1
+    assert model.metrics.answer_stops == 2
+
+    # Test case 3: the async API stops the same way
+    model = FakeModel("fake", cache=None)
+    model.model = StreamingStub(
+        [reasoning, FAKE_RESPONSE, FAKE_RESPONSE, FAKE_RESPONSE]
+    )
+    assert asyncio.run(model.aanswer_questions(fin_qa)) == [answer] * 3
+    assert model.metrics.budget_stops == 1
+
+    # Test case 4: an object in reasoning without an opening tag is not the answer
+    draft = 'Maybe {"value": "1.00", "program": "1"}?\n</think>\n'
+    response = draft + '{"value": "0.00", "program": "0"}'
+    model = FakeModel("fake", cache=None)
+    model.model = StreamingStub([response + " Done."] * 3)
+    assert model.answer_questions(fin_qa) == [answer] * 3
+    assert model.model.streamed == 3 * len(response)
+
+
+def test_early_stop_token_counts() -> None:
+    """Test that streamed chunks are not memoised by the prompt token counter."""
+    detector = EarlyStopDetector(ReasoningOutputParser(Answer), think_token_budget=50)
+    count_tokens.cache_clear()
+    for i in range(20):
+        chunk = f"<think>\nstep {i} " if i == 0 else f"step {i} "
+        detector.feed(ChatResponse(message=ChatMessage(role="assistant"), delta=chunk))
+    assert detector.think_tokens == 3 + 40  # The opening tag and two per step
+    assert count_tokens.cache_info().currsize == 0
+
+
+def test_lazy_imports(tmp_path: Path) -> None:
+    """Test that scoring does not import llama-index or configure logging."""
+    # Test case 1: the backends are only imported when they are used
+    code = (
+        "import sys\n"
+        "import scripts.score\n"
+        "from deepseek_fin_qa.models import MODEL_BACKENDS\n"
+        "assert list(MODEL_BACKENDS) == ['ollama', 'groq', 'fake']\n"
+        "assert not any(name.startswith('llama_index') for name in sys.modules)\n"
+        "assert MODEL_BACKENDS['fake'].__name__ == 'FakeModel'\n"
+        "assert 'llama_index.llms.groq' not in sys.modules\n"
+    )
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).parents[1])}
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True)  # noqa: S603
+
+    # Test case 2: importing the package does not create the log directory
+    assert not (tmp_path / "logs").exists()
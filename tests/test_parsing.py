@@ -0,0 +1,75 @@
+from deepseek_fin_qa.models.base import ReasoningOutputParser
+from deepseek_fin_qa.schemas.qa import Answer
+from deepseek_fin_qa.utils.parsing import JSONObjectExtractor, loads_lenient
+
+
+def test_loads_lenient() -> None:
+    """Test the repair of malformed JSON objects."""
+    # Test case 1: valid JSON is decoded as is
+    assert loads_lenient('{"value": 1.5, "program": "add(1, 2)"}') == {
+        "value": 1.5,
+        "program": "add(1, 2)",
+    }
+
+    # Test case 2: trailing commas, bare values and single quotes are repaired
+    assert loads_lenient('{"value": 12.5%, "program": "divide(1, 8)",}') == {
+        "value": "12.5%",
+        "program": "divide(1, 8)",
+    }
+    assert loads_lenient("{'value': 3, 'program': 'add(1, 2)'}") == {
+        "value": 3,
+        "program": "add(1, 2)",
+    }
+
+    # Test case 3: text that is not an object is rejected
+    assert loads_lenient("{value}") is None
+    assert loads_lenient("[1, 2]") is None
+
+
+def test_json_object_extractor() -> None:
+    """Test the incremental extraction of objects from streamed tokens."""
+    text = (
+        '<think>Maybe {"value": "1"}? A brace { and a "quote".</think>\n'
+        'Answer:\n```json\n{"value": "2", "program": "add(1, \\"}\\")"}\n```\nDone.'
+    )
+
+    # Test case 1: objects are reported as soon as their closing brace arrives
+    extractor = JSONObjectExtractor()
+    completed = [extractor.feed(char) for char in text]
+    answer = '{"value": "2", "program": "add(1, \\"}\\")"}'
+    assert completed[text.index(answer) + len(answer) - 1] == [answer]
+    assert extractor.objects == [answer]
+    assert extractor.think_objects == ['{"value": "1"}']
+
+    # Test case 2: the buffer does not grow while no object is open
+    assert len(extractor.buffer) < len("</think>")
+
+    # Test case 3: objects after a stray brace are found at the end of the output
+    extractor = JSONObjectExtractor()
+    assert extractor.feed('</think> a { b {"value": "3"} c') == []
+    assert extractor.finish() == ['{"value": "3"}']
+
+
+def test_reasoning_output_parser() -> None:
+    """Test parsing the answer from the output of a reasoning model."""
+    parser = ReasoningOutputParser(Answer)
+
+    # Test case 1: the last object after the reasoning is used
+    text = (
+        '<think>First {"value": "1", "program": "1"}</think>'
+        '{"value": "2", "program": "2"} or rather {"value": "3", "program": "3"}'
+    )
+    assert parser.parse(text) == Answer(value="3", program="3")
+
+    # Test case 2: malformed objects and numbers for the program are repaired
+    assert parser.parse('</think>{"value": 12.5%, "program": 12.5,}') == Answer(
+        value="12.5%", program="12.5"
+    )
+
+    # Test case 3: the reasoning is only used if there is no answer after it
+    assert parser.parse('<think>So {"value": "4", "program": "4"} is it') == Answer(
+        value="4", program="4"
+    )
+
+    # Test case 4: output without an answer is not parsed
+    assert parser.parse("<think>No idea {</think> Sorry.") is None
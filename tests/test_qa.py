@@ -0,0 +1,113 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from deepseek_fin_qa.schemas.qa import FinQADataset
+from deepseek_fin_qa.utils.io import iter_json_array
+from scripts.context_tokens import count_context_tokens
+from scripts.qa import process_data
+
+
+def write_dataset(path: Path, n_docs: int) -> None:
+    """Write a synthetic ConvFinQA-shaped dataset."""
+    data = [
+        {
+            "id": f"doc-{i}",
+            "pre_text": [f"Document {i}"],
+            "post_text": [],
+            "table_ori": [["year", "value"], ["2020", str(i)]],
+            "qa_0": {"question": "Q0?", "answer": "0.00", "program_re": "0"},
+            "qa_1": {"question": "Q1?", "answer": "1", "program_re": "add(1,0)"},
+        }
+        for i in range(n_docs)
+    ]
+    path.write_text(json.dumps(data))
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_process_data_resume(tmp_path: Path) -> None:
+    """Test that a resumed run only answers the missing documents."""
+    src = tmp_path / "dataset.json"
+    out = tmp_path / "output.jsonl"
+    write_dataset(src, n_docs=4)
+
+    process_data(str(src), str(out))
+    lines = out.read_text().splitlines()
+    assert len(lines) == 4
+
+    # Simulate a crash after the second document, in the middle of the third
+    out.write_text("\n".join(lines[:2]) + "\n" + lines[2][:10])
+    process_data(str(src), str(out), resume=True)
+
+    ids = [fin_qa.id for fin_qa in FinQADataset.iter_answered(str(out))]
+    assert ids == ["doc-0", "doc-1", "doc-2", "doc-3"]
+
+
+def test_iter_file(tmp_path: Path) -> None:
+    """Test lazy loading from JSON and JSONL files with offset, limit and shards."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=10)
+    jsonl_src = tmp_path / "dataset.jsonl"
+    jsonl_src.write_text(
+        "\n".join(json.dumps(record) for record in json.loads(src.read_text()))
+    )
+
+    dataset = FinQADataset.from_file(str(src))
+    assert [fin_qa.id for fin_qa in dataset] == [f"doc-{i}" for i in range(10)]
+    assert list(FinQADataset.iter_file(str(jsonl_src))) == dataset.finqa_list
+
+    fin_qas = FinQADataset.iter_file(str(src), limit=3, offset=2)
+    assert [fin_qa.id for fin_qa in fin_qas] == ["doc-2", "doc-3", "doc-4"]
+
+    shards = [
+        [fin_qa.id for fin_qa in FinQADataset.iter_file(str(src), shard=(i, 3))]
+        for i in range(3)
+    ]
+    assert shards[1] == ["doc-1", "doc-4", "doc-7"]
+    assert sorted(id_ for shard in shards for id_ in shard) == sorted(
+        fin_qa.id for fin_qa in dataset
+    )
+
+
+def test_iter_json_array(tmp_path: Path) -> None:
+    """Test streaming a JSON array with items split across chunks."""
+    data = [{"text": "x" * i, "nested": [1, {"a": "]"}]} for i in range(50)]
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(data, indent=2))
+
+    assert list(iter_json_array(path, chunk_size=7)) == data
+
+    path.write_text(" [ ] ")
+    assert list(iter_json_array(path)) == []
+
+    # Numbers split across chunks are not decoded as shorter numbers
+    numbers = [123456, -7.25e3, 0, 98765.4321, 1, 22]
+    path.write_text(json.dumps(numbers, separators=(",", ":")))
+    for chunk_size in range(1, 10):
+        assert list(iter_json_array(path, chunk_size=chunk_size)) == numbers
+
+
+def test_render_context(tmp_path: Path) -> None:
+    """Test that contexts are rendered once per table format and kept current."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=2)
+    fin_qa = next(FinQADataset.iter_file(str(src)))
+
+    # Test case 1: the rendered context is reused
+    assert fin_qa.context is fin_qa.render_context("markdown")
+    assert "| year | value |" in fin_qa.context
+    assert "year,value\n2020,0" in fin_qa.render_context("csv")
+    assert set(fin_qa.contexts) == {"markdown", "csv"}
+
+    # Test case 2: changing the data renders the context again
+    fin_qa.pre_text = "Changed"
+    assert "Changed" in fin_qa.context
+    copy = fin_qa.model_copy(update={"table": [["year"], ["2021"]]})
+    assert "2021" in copy.context
+    assert "2021" not in fin_qa.context
+    assert copy.model_dump().keys() == fin_qa.model_dump().keys()
+
+    # Test case 3: compact formats need fewer tokens
+    tokens = count_context_tokens(list(FinQADataset.iter_file(str(src))))
+    assert tokens["tsv"] < tokens["csv"] < tokens["markdown"]
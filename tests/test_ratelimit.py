@@ -0,0 +1,80 @@
+from email.utils import formatdate
+
+import pytest
+
+from deepseek_fin_qa.utils.ratelimit import Backoff, RateLimiter, retry_after
+
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self) -> None:
+        """Start the clock at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_rate_limiter() -> None:
+    """Test the request and token budgets of the rate limiter."""
+    clock = FakeClock()
+
+    # Test case 1: requests within the budget do not wait
+    limiter = RateLimiter(requests_per_minute=2, clock=clock)
+    assert limiter.reserve(0) == 0
+    assert limiter.reserve(0) == 0
+
+    # Test case 2: the next request waits for the bucket to refill
+    assert limiter.reserve(0) == pytest.approx(30)
+    assert limiter.reserve(0) == pytest.approx(60)
+    clock.now = 60
+    assert limiter.reserve(0) == pytest.approx(30)
+
+    # Test case 3: tokens are limited separately, large requests still pass
+    limiter = RateLimiter(tokens_per_minute=100, clock=clock)
+    assert limiter.reserve(80) == 0
+    assert limiter.reserve(40) == pytest.approx(12)
+    assert limiter.reserve(200) == pytest.approx(132)
+
+    # Test case 4: reported usage refunds the estimate
+    limiter = RateLimiter(tokens_per_minute=100, clock=clock)
+    limiter.reserve(100)
+    limiter.correct(estimated=100, actual=50)
+    assert limiter.reserve(50) == 0
+
+    # Test case 5: a pause holds back all requests
+    limiter = RateLimiter(clock=clock)
+    limiter.pause(5)
+    assert limiter.reserve(0) == pytest.approx(5)
+
+
+def test_backoff() -> None:
+    """Test the backoff delays."""
+    backoff = Backoff(base_delay=1, max_delay=10)
+
+    # Test case 1: jittered exponential delays up to the maximum
+    for attempt in range(6):
+        assert 0 <= backoff.delay(attempt) <= min(10, 2**attempt)
+
+    # Test case 2: the server delay takes precedence
+    assert backoff.delay(0, retry_after=3) == 3
+    assert backoff.delay(0, retry_after=100) == 10
+
+
+def test_retry_after() -> None:
+    """Test parsing of the Retry-After headers."""
+    # Test case 1: missing headers
+    assert retry_after(None) is None
+    assert retry_after({}) is None
+
+    # Test case 2: delay in seconds or milliseconds
+    assert retry_after({"retry-after": "2"}) == 2
+    assert retry_after({"retry-after-ms": "1500", "retry-after": "2"}) == 1.5
+
+    # Test case 3: HTTP date
+    assert 0 <= retry_after({"retry-after": formatdate(usegmt=True)}) <= 1
+
+    # Test case 4: invalid values are ignored
+    assert retry_after({"retry-after": "soon"}) is None
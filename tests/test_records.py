@@ -0,0 +1,106 @@
+import json
+import random
+from pathlib import Path
+
+from deepseek_fin_qa.schemas.qa import Answer, FinQADataset
+from deepseek_fin_qa.utils.evaluation import program_output
+from deepseek_fin_qa.utils.records import (
+    QARecord,
+    iter_answered_records,
+    records_from_fin_qas,
+)
+from deepseek_fin_qa.utils.scoring import (
+    score_batch,
+    score_records,
+    tally_records,
+    tally_scores,
+)
+from tests.conftest import make_fin_qa
+from tests.test_scoring import PROGRAMS, VALUES
+
+
+def make_dataset(n_docs: int = 30, seed: int = 0) -> FinQADataset:
+    """Create answered documents with random values and programs."""
+    rng = random.Random(seed)  # noqa: S311
+    dataset = FinQADataset(
+        finqa_list=[
+            make_fin_qa(rng.randrange(1, 5), id=None if i % 7 == 0 else f"doc-{i}")
+            for i in range(n_docs)
+        ]
+    )
+    for qa in (qa for fin_qa in dataset for qa in fin_qa):
+        qa.target_answer = Answer(
+            value=rng.choice(VALUES), program=rng.choice(PROGRAMS)
+        )
+        if rng.random() > 0.1:
+            qa.llm_answer = Answer(
+                value=rng.choice(VALUES), program=rng.choice(PROGRAMS)
+            )
+    return dataset
+
+
+def test_iter_answered_records(tmp_path: Path) -> None:
+    """Test loading records from output files without the pydantic models."""
+    dataset = make_dataset()
+    expected = list(records_from_fin_qas(dataset))
+    json_path = tmp_path / "output.json"
+    json_path.write_text(dataset.model_dump_json())
+    jsonl_path = tmp_path / "output.jsonl"
+    jsonl_path.write_text(
+        "".join(fin_qa.model_dump_json() + "\n" for fin_qa in dataset)
+    )
+
+    # Test case 1: JSON and JSONL outputs give the records of the loaded models
+    assert list(iter_answered_records(json_path)) == expected
+    assert list(iter_answered_records(jsonl_path)) == expected
+    assert expected[0] == QARecord(
+        document="0",
+        turn=0,
+        target_value=str(dataset.finqa_list[0].qa_list[0].target_answer.value),
+        target_program=dataset.finqa_list[0].qa_list[0].target_answer.program,
+        llm_value=expected[0].llm_value,
+        llm_program=expected[0].llm_program,
+    )
+
+    # Test case 2: numbers are converted like the str | float answer value
+    data = {"qa_list": [{"target_answer": {"value": 5}, "llm_answer": None}]}
+    jsonl_path.write_text(json.dumps(data) + "\n")
+    (record,) = iter_answered_records(jsonl_path)
+    assert record.target_value == str(Answer(value=5).value) == "5.0"
+    assert record.target_program == "nan"
+    assert not record.answered
+
+
+def test_score_records_matches_models() -> None:
+    """Test that records are scored and tallied the same as the pydantic models."""
+    dataset = make_dataset()
+    records = list(records_from_fin_qas(dataset))
+
+    # Test case 1: the per-question scores are the same
+    scores = score_records(records)
+    assert scores.scores == dataset.score_batch().scores
+    assert scores.scores == [qa.score for fin_qa in dataset for qa in fin_qa]
+    assert scores.answered.tolist() == [record.answered for record in records]
+
+    # Test case 2: the tallies are the same, whatever the batch size
+    expected = tally_scores(dataset).report
+    assert tally_records(records, batch_size=7).report == expected
+    assert (
+        tally_records(records).report.accuracy
+        == score_batch([qa for fin_qa in dataset for qa in fin_qa]).accuracy
+    )
+    assert dataset.score == tally_records(records).total.accuracy
+
+    # Test case 3: records evaluate their programs with the memoised helper
+    program_output.cache_clear()
+    record = QARecord(
+        document="0",
+        turn=0,
+        target_value="1",
+        target_program="add(1, 2)",
+        llm_value="3",
+        llm_program="add(1, 2)",
+    )
+    assert record.program_outputs == (3.0, 3.0)
+    assert Answer(program="add(1, 2)").program_output == 3.0
+    assert program_output.cache_info().hits == 2
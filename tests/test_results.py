@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from deepseek_fin_qa.schemas.qa import FinQADataset
+from deepseek_fin_qa.utils.results import Results, question_hash
+from scripts.qa import process_data
+from tests.test_qa import write_dataset
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_results(tmp_path: Path) -> None:
+    """Test writing, loading, filtering and rejoining columnar results."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=5)
+    process_data(str(src), str(tmp_path / "out.npz"))
+
+    # Test case 1: every question is a row, without the contexts of the documents
+    results = Results.load(tmp_path / "out.npz")
+    assert len(results) == 10
+    assert results.document.tolist()[:3] == ["doc-0", "doc-0", "doc-1"]
+    assert results.turn.tolist()[:3] == [0, 1, 0]
+    assert results.question_hash[1] == question_hash("Q1?")
+    assert results.llm_value.tolist()[:2] == ["0.00", "0.00"]
+    assert results.accuracy.execution == 0.5
+    assert (results.prompt_tokens > 0).all()
+    assert "Document 1" not in (tmp_path / "out.index.json").read_text()
+
+    # Test case 2: the failures are filtered without loading the documents
+    failures = results.failures()
+    assert failures.turn.tolist() == [1] * 5
+    assert np.array_equal(results.select(results.turn == 0).failed, [False] * 5)
+
+    # Test case 3: the failures are rejoined to the source documents
+    rejoined = list(failures.select(np.array([0, 2])).rejoin())
+    assert [fin_qa.id for fin_qa in rejoined] == ["doc-0", "doc-2"]
+    assert rejoined[1].pre_text == "Document 2"
+    assert [qa.question for qa in rejoined[1]] == ["Q1?"]
+    assert rejoined[1].qa_list[0].llm_answer.value == "0.00"
+    assert not rejoined[1].qa_list[0].score.execution
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_results_rejoin_without_ids(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test rejoining the results of documents without an id by position."""
+    src = tmp_path / "dataset.json"
+    write_dataset(src, n_docs=4)
+    data = json.loads(src.read_text())
+    del data[1]["id"]
+    data[2]["id"] = None
+    src.write_text(json.dumps(data))
+
+    # Test case 1: documents without an id are keyed by their position in the source
+    process_data(str(src), str(tmp_path / "out.npz"), offset=1)
+    results = Results.load(tmp_path / "out.npz")
+    assert results.document.tolist()[::2] == ["1", "2", "doc-3"]
+    rejoined = list(results.rejoin())
+    assert [fin_qa.pre_text for fin_qa in rejoined] == [
+        f"Document {i}" for i in range(1, 4)
+    ]
+
+    # Test case 2: results of documents loaded without an id are rejoined by position
+    fin_qas = list(FinQADataset.iter_file(str(src)))
+    for fin_qa in fin_qas:
+        fin_qa.id = None
+    results = Results.from_fin_qas(fin_qas, source=str(src))
+    assert "4 documents without an id" in caplog.text
+    rejoined = list(results.rejoin())
+    assert [fin_qa.pre_text for fin_qa in rejoined] == ["Document 1", "Document 2"]
+
+    # Test case 3: the documents not found in the source are reported
+    assert "2 documents of the results are not in" in caplog.text
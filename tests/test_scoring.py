@@ -0,0 +1,148 @@
+import math
+import random
+from pathlib import Path
+
+import numpy as np
+
+from deepseek_fin_qa.schemas.metrics import Score
+from deepseek_fin_qa.schemas.qa import QA, Answer, FinQA, FinQADataset
+from deepseek_fin_qa.utils.evaluation import (
+    evaluate_program,
+    get_execution_match,
+    get_program_output_match,
+    strip_program,
+)
+from deepseek_fin_qa.utils.scoring import isclose, score_batch
+from scripts.score import score_files
+
+VALUES = [
+    "yes", "no", "true", "false", "4.3%", "-4.3%", "4.34562", "4.39562", "14.10%",
+    "0.141", "1,000", "1000", "$30million", "", "nan", "-12.5", "12.50", "0", "0.0",
+    "100", "1.00", "0.01%", 12.5, 0.5, -3.0,
+]  # fmt: skip
+PROGRAMS = [
+    "divide(subtract(150,100),100)", "0.5", "50", "greater(10,5)", "greater(1,5)",
+    "multiply(add(3,4),5)", "35", "nan", "", "add(1,2),3", "subtract(const_100,1)",
+    "divide(1,3)", "33.33333333333333",
+]  # fmt: skip
+
+
+def test_isclose() -> None:
+    """Test that the vectorised isclose matches math.isclose."""
+    a = np.array([1.0, 1.0, math.inf, math.inf, math.nan, 0.0, 1e-10, 1e308])
+    b = np.array([1.0 + 1e-10, 1.1, math.inf, -math.inf, math.nan, 0.0, 0.0, -1e308])
+    expected = [math.isclose(x, y) for x, y in zip(a, b, strict=True)]
+    assert isclose(a, b).tolist() == expected
+
+
+def test_score_batch_matches_scalar() -> None:
+    """Test that batch scoring gives the same results as the scalar matches."""
+    rng = random.Random(0)  # noqa: S311
+    qas = [
+        QA(
+            question="?",
+            target_answer=Answer(
+                value=rng.choice(VALUES), program=rng.choice(PROGRAMS)
+            ),
+            llm_answer=(
+                Answer(value=rng.choice(VALUES), program=rng.choice(PROGRAMS))
+                if rng.random() > 0.1
+                else None
+            ),
+        )
+        for _ in range(2000)
+    ]
+
+    expected = [
+        Score(
+            execution=get_execution_match(
+                str(qa.target_answer.value), str(qa.llm_answer.value)
+            ),
+            program=get_program_output_match(
+                evaluate_program(strip_program(qa.target_answer.program)),
+                evaluate_program(strip_program(qa.llm_answer.program)),
+            ),
+        )
+        if qa.llm_answer
+        else Score(execution=False, program=False)
+        for qa in qas
+    ]
+
+    batch = score_batch(qas)
+    assert batch.scores == expected
+    assert [qa.score for qa in qas if qa.llm_answer] == [
+        score for qa, score in zip(qas, expected, strict=True) if qa.llm_answer
+    ]
+
+    dataset = FinQADataset(
+        finqa_list=[FinQA(pre_text="", post_text="", table=[], qa_list=qas)]
+    )
+    answered = [score for qa, score in zip(qas, expected, strict=True) if qa.llm_answer]
+    assert dataset.score.execution == sum(s.execution for s in answered) / len(answered)
+    assert dataset.score.program == sum(s.program for s in answered) / len(answered)
+    assert dataset.score_batch().accuracy == dataset.score
+
+
+def test_score_failing_programs() -> None:
+    """Test that programs failing to evaluate only fail their own question."""
+    qas = [
+        QA(
+            question="?",
+            target_answer=Answer(value="1", program="1"),
+            llm_answer=Answer(value="1", program=program),
+        )
+        for program in ["divide(1,0)", "exp(10,1000)", "add(1, 0)"]
+    ]
+
+    # Test case 1: the failing programs score as program mismatches
+    scores = score_batch(qas)
+    assert scores.program.tolist() == [False, False, True]
+    assert scores.execution.tolist() == [True, True, True]
+    assert [qa.score for qa in qas] == scores.scores
+
+    # Test case 2: a failing target program does not match a failing LLM program
+    qa = QA(
+        question="?",
+        target_answer=Answer(value="1", program="divide(1,0)"),
+        llm_answer=Answer(value="1", program="divide(1,0)"),
+    )
+    assert not qa.score.program
+
+
+def test_score_files(tmp_path: Path) -> None:
+    """Test parallel rescoring of JSON and chunked JSONL output files."""
+    dataset = FinQADataset(
+        finqa_list=[
+            FinQA(
+                id=f"doc-{i}",
+                pre_text="",
+                post_text="",
+                table=[],
+                qa_list=[
+                    QA(
+                        question="?",
+                        target_answer=Answer(value="1", program="1"),
+                        llm_answer=Answer(value=str(i % (turn + 2)), program="1"),
+                    )
+                    for turn in range(3)
+                ],
+            )
+            for i in range(50)
+        ]
+    )
+    json_path = tmp_path / "output.json"
+    json_path.write_text(dataset.model_dump_json())
+    jsonl_path = tmp_path / "output.jsonl"
+    jsonl_path.write_text(
+        "".join(fin_qa.model_dump_json() + "\n" for fin_qa in dataset)
+    )
+
+    tallies = score_files([str(json_path), str(jsonl_path)], workers=2, chunk_size=500)
+    reports = [tally.report for tally in tallies.values()]
+
+    assert reports[0] == reports[1]
+    assert reports[0].accuracy == dataset.score
+    assert reports[0].n == 150
+    assert list(reports[0].documents) == [f"doc-{i}" for i in range(50)]
+    assert reports[0].turns[0].execution == 0.5
+    assert reports[0].turns[1].execution == 17 / 50
@@ -0,0 +1,129 @@
+import pytest
+
+from deepseek_fin_qa.models.fake import FakeModel
+from deepseek_fin_qa.schemas.qa import FinQA
+from deepseek_fin_qa.utils import selection as selection_module
+from deepseek_fin_qa.utils.evaluation import TABLE_FORMATS
+from deepseek_fin_qa.utils.selection import bm25_scores, select_context, terms
+from deepseek_fin_qa.utils.tokens import count_tokens
+from tests.conftest import make_fin_qa
+
+
+def make_report(questions: list[str]) -> FinQA:
+    """Create a FinQA document with unrelated sentences and table rows."""
+    return make_fin_qa(
+        questions=questions,
+        pre_text=(
+            "the company operates retail stores in europe .\n"
+            "net revenue increased to $ 1,200 million in 2019 .\n"
+            "the board approved a new dividend policy ."
+        ),
+        post_text="employees received stock options during the year .",
+        table=[
+            ["", "2019", "2018"],
+            ["net revenue", "1200", "1000"],
+            ["operating expenses", "800", "700"],
+            ["depreciation", "50", "40"],
+        ],
+    )
+
+
+def test_bm25_scores() -> None:
+    """Test ranking documents by their overlap with weighted query terms."""
+    documents = [terms("net revenue in 2019"), terms("stock options"), []]
+
+    # Test case 1: matching documents score above unrelated and empty ones
+    scores = bm25_scores({"revenue": 1.0, "2019": 1.0}, documents)
+    assert scores[0] > scores[1] == scores[2] == 0
+
+    # Test case 2: the query weights change the ranking
+    scores = bm25_scores({"revenue": 0.1, "options": 1.0}, documents)
+    assert scores[1] > scores[0]
+
+    # Test case 3: numbers are matched without thousands separators
+    assert terms("$ 1,200.5 Million") == ["1200.5", "million"]
+
+
+def test_select_context() -> None:
+    """Test keeping the most relevant context within a token budget."""
+    fin_qa = make_report(["what was the change in net revenue from 2018 to 2019?"])
+
+    # Test case 1: a context within the budget is kept unchanged
+    selection = select_context(fin_qa, 0, 10_000)
+    assert selection.fin_qa is fin_qa
+    assert selection.retained == 1
+
+    # Test case 2: the relevant sentence and row are kept, with the table header
+    selection = select_context(fin_qa, 0, 40)
+    assert selection.tokens <= 40 < selection.total_tokens
+    assert "net revenue increased" in selection.fin_qa.pre_text
+    assert "dividend" not in selection.fin_qa.pre_text
+    assert selection.fin_qa.table[:2] == fin_qa.table[:2]
+    assert ["depreciation", "50", "40"] not in selection.fin_qa.table
+    assert 0 < selection.retained < 1
+
+    # Test case 3: the kept parts stay in their original order
+    selection = select_context(fin_qa, 0, 30)
+    lines = selection.fin_qa.pre_text.split("\n")
+    assert lines == [line for line in fin_qa.pre_text.split("\n") if line in lines]
+
+    # Test case 4: earlier questions are taken into account for follow-ups
+    fin_qa = make_report(["how many stock options were granted?", "and in 2018?"])
+    assert "stock options" in select_context(fin_qa, 1, 25).fin_qa.post_text
+
+
+def test_select_context_table_formats() -> None:
+    """Test that the rendered context fits the budget in every table format."""
+    fin_qa = make_report(["what was the change in net revenue from 2018 to 2019?"])
+
+    for table_format in TABLE_FORMATS:
+        # Test case 1: the whole context is charged at its rendered size
+        full = select_context(fin_qa, 0, 10_000, table_format)
+        assert full.total_tokens == count_tokens(fin_qa.render_context(table_format))
+
+        # Test case 2: the selected context fits the budget once rendered
+        for budget in range(10, full.total_tokens):
+            selection = select_context(fin_qa, 0, budget, table_format)
+            rendered = selection.fin_qa.render_context(table_format)
+            assert count_tokens(rendered) == selection.tokens <= budget
+
+
+def test_answer_questions_context_budget() -> None:
+    """Test that the model only sends the selected context."""
+    fin_qa = make_report(["what was the change in net revenue from 2018 to 2019?"])
+    model = FakeModel("fake", cache=None)
+    model.context_token_budget = 20
+    requests = []
+    model._chat = lambda messages: requests.append(list(messages)) or "{}"  # noqa: SLF001
+
+    model.answer_questions(fin_qa)
+
+    user_message = next(m.content for m in requests[0] if m.role == "user")
+    assert "net revenue increased" in user_message
+    assert "dividend" not in user_message
+    assert 0 < model.usage.context_retained < 1
+    assert fin_qa.pre_text.count("\n") == 2
+
+
+def test_answer_questions_selects_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the context is selected once per turn."""
+    fin_qa = make_report(["what was the revenue in 2019?", "and in 2018?"])
+    model = FakeModel("fake", cache=None)
+    model.context_token_budget = 20
+    model._chat = lambda _: "{}"  # noqa: SLF001
+    calls = []
+    monkeypatch.setattr(
+        selection_module,
+        "bm25_scores",
+        lambda *args: calls.append(args) or bm25_scores(*args),
+    )
+
+    # Test case 1: one selection per question when every question has a context
+    model.answer_questions(fin_qa)
+    assert len(calls) == 2
+
+    # Test case 2: one selection per conversation in the "once" context mode
+    calls.clear()
+    model.context_mode = "once"
+    model.answer_questions(fin_qa)
+    assert len(calls) == 1
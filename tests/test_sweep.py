@@ -0,0 +1,124 @@
+import json
+from pathlib import Path
+
+import pytest
+import typer
+
+from deepseek_fin_qa.models.fake import FakeModel
+from deepseek_fin_qa.schemas.qa import Answer, FinQA
+from scripts import sweep as sweep_module
+from scripts.sweep import SweepRun, parse_runs, sweep
+from tests.test_qa import write_dataset
+
+
+def test_parse_runs() -> None:
+    """Test expanding the matrix of models and prompt settings."""
+    # Test case 1: model names may contain colons
+    assert parse_runs(["ollama:deepseek-r1:14b"], ["every_turn", "once"]) == [
+        SweepRun("ollama", "deepseek-r1:14b", "every_turn"),
+        SweepRun("ollama", "deepseek-r1:14b", "once"),
+    ]
+    assert SweepRun("ollama", "deepseek-r1:14b", "once", "csv").name == (
+        "ollama-deepseek-r1-14b-once-csv"
+    )
+
+    # Test case 2: table formats and numbers of samples are dimensions of the matrix
+    assert len(parse_runs(["fake:a", "fake:b"], ["once"], ["csv", "tsv"])) == 4
+    runs = parse_runs(["fake:a"], ["once"], ["csv"], [1, 5])
+    assert [run.name for run in runs] == ["fake-a-once-csv", "fake-a-once-csv-n5"]
+    runs = parse_runs(["fake:a"], ["once"], ["csv"], None, ["context_first"])
+    assert [run.name for run in runs] == ["fake-a-once-csv-context_first"]
+
+    # Test case 3: unknown backends, variants and table formats are rejected
+    with pytest.raises(typer.BadParameter, match="Invalid model"):
+        parse_runs(["openai:gpt"], None)
+    with pytest.raises(typer.BadParameter, match="Invalid variant"):
+        parse_runs(["fake:a"], ["few_shot"])
+    with pytest.raises(typer.BadParameter, match="Invalid table format"):
+        parse_runs(["fake:a"], None, ["html"])
+    with pytest.raises(typer.BadParameter, match="Invalid number of samples"):
+        parse_runs(["fake:a"], None, None, [0])
+    with pytest.raises(typer.BadParameter, match="Invalid prompt order"):
+        parse_runs(["fake:a"], None, None, None, ["question_last"])
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_sweep(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that every run answers the shared dataset and is compared."""
+    src = tmp_path / "dataset.json"
+    out_dir = tmp_path / "sweep"
+    write_dataset(src, n_docs=3)
+
+    # Runs of different models must not overlap on a model switching backend
+    monkeypatch.setattr(sweep_module, "MODEL_SWITCHING_BACKENDS", {"fake"})
+    active: dict[str, int] = {}
+    overlaps = []
+    aanswer_questions = FakeModel.aanswer_questions
+
+    async def tracked(self: FakeModel, fin_qa: FinQA) -> list[Answer | None]:
+        active[self.model_name] = active.get(self.model_name, 0) + 1
+        overlaps.append(sum(count > 0 for count in active.values()) > 1)
+        try:
+            return await aanswer_questions(self, fin_qa)
+        finally:
+            active[self.model_name] -= 1
+
+    monkeypatch.setattr(FakeModel, "aanswer_questions", tracked)
+
+    sweep(
+        str(src),
+        str(out_dir),
+        model=["fake:a", "fake:b"],
+        variant=["every_turn", "once"],
+        table_format=["tsv"],
+        concurrency=["fake=8"],
+        price=["a=1/2"],
+    )
+
+    # Test case 1: every run writes its answers and metrics
+    for name in ["fake-a-every_turn-tsv", "fake-a-once-tsv", "fake-b-every_turn-tsv"]:
+        assert len((out_dir / f"{name}.jsonl").read_text().splitlines()) == 3
+        assert (out_dir / f"{name}.metrics.json").exists()
+    assert not any(overlaps)
+
+    # Test case 2: the runs are compared in the order of the matrix
+    results = json.loads((out_dir / "sweep.json").read_text())
+    assert [result["name"] for result in results] == [
+        "fake-a-every_turn-tsv",
+        "fake-a-once-tsv",
+        "fake-b-every_turn-tsv",
+        "fake-b-once-tsv",
+    ]
+    assert all(result["accuracy"]["execution"] == 0.5 for result in results)
+    assert all(result["answered"] == 6 for result in results)
+    assert results[0]["cost"] > 0
+    assert results[2]["cost"] is None
+
+    table = (out_dir / "sweep.md").read_text().splitlines()
+    assert len(table) == 6
+    assert table[2].startswith(
+        "| fake | a | every_turn | tsv | question_first | 1 | 50.00% |"
+    )
+
+
+@pytest.mark.usefixtures("fake_backend")
+def test_sweep_failing_programs(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that answers with programs failing to evaluate do not stop a sweep."""
+    src = tmp_path / "dataset.json"
+    out_dir = tmp_path / "sweep"
+    write_dataset(src, n_docs=2)
+
+    async def divide_by_zero(_: FakeModel, fin_qa: FinQA) -> list[Answer | None]:
+        return [Answer(value="1", program="divide(1,0)")] * len(fin_qa)
+
+    monkeypatch.setattr(FakeModel, "aanswer_questions", divide_by_zero)
+
+    sweep(str(src), str(out_dir), model=["fake:a"])
+
+    # Test case 1: the run is compared, its programs scored as mismatches
+    (result,) = json.loads((out_dir / "sweep.json").read_text())
+    assert result["answered"] == 4
+    assert result["accuracy"]["program"] == 0
+    assert (out_dir / "sweep.md").exists()
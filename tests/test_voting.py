@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import threading
+from pathlib import Path
+
+from llama_index.core.llms import ChatMessage
+
+from deepseek_fin_qa.models.fake import FakeModel
+from deepseek_fin_qa.schemas.qa import Answer
+from deepseek_fin_qa.utils.voting import Ballot, answers_agree
+from tests.conftest import make_fin_qa
+
+RESPONSE_A = '<think>\nOkay.\n</think>\n{"value": "1.0", "program": "add(1, 0)"}'
+RESPONSE_B = '<think>\nOkay.\n</think>\n{"value": "2", "program": "add(1, 1)"}'
+
+
+def test_answers_agree() -> None:
+    """Test comparing answers by program output and value."""
+    # Test case 1: equal program outputs agree whatever the values
+    assert answers_agree(
+        Answer(value="1", program="add(1, 0)"), Answer(value="x", program="1")
+    )
+    assert not answers_agree(
+        Answer(value="1", program="add(1, 0)"), Answer(value="1", program="2")
+    )
+
+    # Test case 2: without a program the values are compared, rounded
+    assert answers_agree(Answer(value="12.3%"), Answer(value="12.34"))
+    assert not answers_agree(Answer(value="yes"), Answer(value="no"))
+
+
+def test_ballot() -> None:
+    """Test drawing samples until a quorum agrees."""
+    a, b = Answer(value="1"), Answer(value="2")
+
+    # Test case 1: only the quorum is drawn at first and nothing more if it agrees
+    ballot = Ballot(samples=5, quorum=3)
+    assert ballot.launch(0) == [0, 1, 2]
+    for sample in [2, 0, 1]:
+        ballot.add(sample, a)
+    assert ballot.done
+    assert ballot.winner == 0
+
+    # Test case 2: disagreeing and unparsed answers draw more samples
+    ballot = Ballot(samples=5, quorum=3)
+    assert ballot.launch(0) == [0, 1, 2]
+    ballot.add(0, b)
+    assert ballot.launch(2) == []
+    ballot.add(1, None)
+    assert ballot.launch(1) == [3]
+    ballot.add(2, a)
+    ballot.add(3, a)
+    assert ballot.launch(0) == [4]
+    ballot.add(4, b)
+    assert ballot.done
+    assert ballot.votes == 2
+
+    # Test case 3: ties go to the answer of the lowest sample
+    assert ballot.winner == 0
+
+    # Test case 4: there is no winner without any parsed answer
+    ballot = Ballot(samples=1, quorum=1)
+    ballot.launch(0)
+    ballot.add(0, None)
+    assert ballot.done
+    assert ballot.winner is None
+
+
+def test_answer_questions_voting(tmp_path: Path) -> None:
+    """Test answering by a majority vote over samples cached individually."""
+    responses = itertools.cycle([RESPONSE_A, RESPONSE_B, RESPONSE_A, RESPONSE_A])
+    requests = []
+    lock = threading.Lock()
+
+    def chat(messages: list[ChatMessage]) -> str:
+        with lock:
+            requests.append(list(messages))
+            return next(responses)
+
+    model = FakeModel("fake", cache=str(tmp_path))
+    model.samples = 5
+    model.quorum = 3
+    model._chat = chat  # noqa: SLF001
+
+    # Test case 1: the majority answer wins and the vote stops at the quorum
+    answers = model.answer_questions(make_fin_qa(pre_text="Revenue was 1."))
+    assert answers == [Answer(value="1.0", program="add(1, 0)")] * 2
+    assert len(requests) == 8
+    assert requests[-1][-2].content == RESPONSE_A
+    summary = model.metrics.summary()
+    assert summary["voting"] == {
+        "questions": 2,
+        "samples": 8,
+        "mean_samples": 4.0,
+        "quorum": 2,
+    }
+    assert summary["requests"] == 8
+
+    # Test case 2: every sample is cached, so the vote is replayed without requests
+    model = FakeModel("fake", cache=str(tmp_path))
+    model.samples = 5
+    model.quorum = 3
+    model._chat = chat  # noqa: SLF001
+    assert model.answer_questions(make_fin_qa(pre_text="Revenue was 1.")) == answers
+    assert len(requests) == 8
+    assert model.metrics.summary()["cache"]["hits"] == 8
+
+
+def test_aanswer_questions_voting() -> None:
+    """Test that the async samples are drawn concurrently up to the quorum."""
+    active = 0
+    peak = 0
+
+    async def achat(messages: list[ChatMessage]) -> str:  # noqa: ARG001
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return RESPONSE_A
+
+    model = FakeModel("fake", cache=None)
+    model.samples = 5
+    model.quorum = 3
+    model._achat = achat  # noqa: SLF001
+
+    answers = asyncio.run(
+        model.aanswer_questions(make_fin_qa(pre_text="Revenue was 1."))
+    )
+    assert answers == [Answer(value="1.0", program="add(1, 0)")] * 2
+    assert peak == 3
+    assert model.metrics.summary()["voting"]["samples"] == 6